@@ -1,8 +1,12 @@
 import datetime
 import flask
 from flask import jsonify, request
-from db_operations import db_queries
-from datetime import datetime, timedelta
+from utilities import model_registry
+from db_operations import db_queries, db_pool
+from datetime import datetime
+
+# The API only serves data from the database, hence the BERT model never needs to be loaded by this process.
+model_registry.disable_model_loading()
 
 app = flask.Flask(__name__)
 
@@ -91,11 +95,9 @@ def get_sentiment_score():
     # Fetch the ticker parameter value received in the GET request and split if there are multiple values.
     args = request.args.get('ticker')
     tickers = args.split(',')
-    response = {}
 
-    # For each ticker passed in the GET request get the sentiment score.
-    for ticker in tickers:
-        response[ticker] = db_queries.get_sentiment_stats(ticker, datetime.now())[1]
+    # Get the sentiment score of all tickers passed in the GET request in a single query.
+    response = db_queries.get_sentiment_scores(tickers, datetime.now())
 
     # Convert to JSON format and add the headers required by browsers.
     response = jsonify(response)
@@ -120,13 +122,9 @@ def get_historical_score():
     ticker = request.args.get('ticker')
     period = int(request.args.get('period'))
 
-    results = []
-    # For each time unit in the period retrieve the sentiment score and append the results array.
-    for time_unit in range(period):
-        date = datetime.now() - timedelta(days=time_unit)
-        results.append(db_queries.get_sentiment_stats(ticker, date)[1])
-    # The array is reversed as it eases operations on the frontend.
-    results = results[::-1]
+    # Retrieve the sentiment score of each day in the period in a single query. The array is ordered from the oldest to the
+    # most recent day as it eases operations on the frontend.
+    results = db_queries.get_historical_scores(ticker, datetime.now(), period)
 
     # Convert to JSON format and add the headers required by browsers.
     response = jsonify(results)
@@ -179,5 +177,21 @@ def get_polaritywords():
     return response
 
 
+@app.route('/getpoolstats', methods=['GET'])
+def get_pool_stats():
+    """ A function that serves the /getpoolstats endpoint. It retrieves the metrics of the database connection pool: the time
+        spent waiting for a connection and the utilization of the pool(see db_pool.ConnectionPool.stats).
+
+        Params:
+        none
+
+        Returns:
+        response: JSON response object containing the above described data.
+        """
+    response = jsonify(db_pool.get_pool().stats())
+    response.headers.add('Access-Control-Allow-Origin', '*')
+    return response
+
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,65 @@
+"""An accuracy regression check and latency benchmark of the inference backends(see utilities.model_registry.BACKENDS).
+   Every backend classifies the labelled headlines in project_datasets/bert_dataset.csv. The script fails if the accuracy of a
+   backend drops by more than the tolerance compared to the PyTorch fp32 model. The onnx backend requires the model to be
+   exported first: python -m utilities.inference_backends --export-onnx
+
+   Usage(from the repository root):
+   python -m benchmarks.backend_benchmark [--backends torch torch_int8 onnx] [--sample 1000] [--tolerance 0.01]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from utilities import encoder, model_registry
+
+dir = os.path.dirname(__file__)
+path = os.path.join(dir, '../project_datasets/bert_dataset.csv')
+
+
+def _evaluate(backend, headlines, labels):
+    """Classify each headline with the given backend and get the accuracy, the elapsed time and the logits."""
+    # Warm up the backend so that loading it is not part of the measurements
+    encoder.encode_documents([headlines[:1]], backend=backend)
+
+    start = time.time()
+    logits, _ = encoder.encode_documents([headlines], backend=backend)[0]
+    elapsed = time.time() - start
+
+    accuracy = float(np.mean(np.argmax(logits, axis=1) == labels))
+    return accuracy, elapsed, logits
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backends', nargs='+', default=list(model_registry.BACKENDS.keys()))
+    parser.add_argument('--sample', type=int, default=None, help='Only use a random sample of the headlines.')
+    parser.add_argument('--tolerance', type=float, default=0.01, help='The maximum accuracy drop allowed compared to the torch backend.')
+    args = parser.parse_args()
+
+    dataset = pd.read_csv(path, index_col=0)
+    if args.sample is not None:
+        dataset = dataset.sample(n=min(args.sample, len(dataset)), random_state=0)
+    headlines = list(dataset.headlines)
+    labels = dataset.sentiment.values
+
+    results = {}
+    for backend in ['torch'] + [backend for backend in args.backends if backend != 'torch']:
+        try:
+            results[backend] = _evaluate(backend, headlines, labels)
+        except (ImportError, FileNotFoundError) as error:
+            print('Skipping {}: {}'.format(backend, error))
+
+    reference_accuracy, reference_time, reference_logits = results['torch']
+    failed = False
+    print('{} headlines'.format(len(headlines)))
+    for backend, (accuracy, elapsed, logits) in results.items():
+        agreement = float(np.mean(np.argmax(logits, axis=1) == np.argmax(reference_logits, axis=1)))
+        print('{:<12} accuracy: {:.4f}  agreement with torch: {:.4f}  {:.2f}ms/headline  speedup: {:.2f}x'.format(
+            backend, accuracy, agreement, elapsed * 1000 / len(headlines), reference_time / elapsed))
+        if reference_accuracy - accuracy > args.tolerance:
+            print('{} accuracy dropped by more than {}'.format(backend, args.tolerance))
+            failed = True
+
+    sys.exit(1 if failed else 0)
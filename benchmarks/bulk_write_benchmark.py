@@ -0,0 +1,72 @@
+"""A benchmark of the database write path comparing one transaction per article(db_updates._write_entry) with the bulk writer
+   (see db_operations.bulk_writer.BulkWriter). Synthetic analysed articles are written into temporary copies of the tables, which
+   shadow the real tables for the benchmark connection only, hence the database is left untouched.
+
+   Usage(from the repository root, with the credentials in db_updates.open_connection configured):
+   python -m benchmarks.bulk_write_benchmark [--articles 2000] [--batch-size 100]
+"""
+import io
+import time
+import argparse
+import contextlib
+from datetime import datetime, timedelta
+from db_operations import db_updates, bulk_writer
+
+TABLES = ['entryinfo', 'sentiment', 'keyphrases', 'polaritywords', 'daily_ticker_sentiment']
+
+
+def _create_temporary_tables(connection, cursor):
+    """Create empty temporary copies(including identity, defaults and indexes) of the tables written by an update."""
+    for table in TABLES:
+        cursor.execute('DROP TABLE IF EXISTS pg_temp.{}'.format(table))
+        cursor.execute('CREATE TEMPORARY TABLE {0} (LIKE public.{0} INCLUDING ALL)'.format(table))
+    connection.commit()
+
+
+def _get_articles(num_articles, offset):
+    """Generate synthetic analysed articles with unique urls."""
+    tickers = db_updates.TICKER_CLASSES['stock_tickers'] + db_updates.TICKER_CLASSES['crypto_tickers']
+    classes = ['negative', 'neutral', 'positive']
+    entries = []
+    for index in range(offset, offset + num_articles):
+        article = {'headline': 'Headline {}'.format(index), 'ticker': tickers[index % len(tickers)],
+                   'url': 'https://example.com/article/{}'.format(index), 'time': datetime.now() - timedelta(days=index % 7)}
+        analysis = {'overall_sentiment': classes[index % 3], 'sentiment_prob': [0.2, 0.3, 0.5],
+                    'keyphrases': ['key phrase {}'.format(phrase) for phrase in range(7)],
+                    'polarity_words': ['good', 'not bad', 'weak'], 'polarity_sentiment': ['positive', 'positive', 'negative']}
+        entries.append((article, analysis))
+    return entries
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=bulk_writer.BATCH_SIZE)
+    args = parser.parse_args()
+
+    connection, cursor = db_updates.connect_to_db()
+    try:
+        _create_temporary_tables(connection, cursor)
+
+        # One transaction per article, its progress messages are discarded
+        start = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for article, analysis in _get_articles(args.articles, 0):
+                db_updates._write_entry(connection, cursor, article, analysis)
+        single_time = time.time() - start
+
+        start = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            with bulk_writer.BulkWriter(connection, cursor, batch_size=args.batch_size, flush_interval=float('inf')) as writer:
+                for article, analysis in _get_articles(args.articles, args.articles):
+                    writer.add(article, analysis)
+        bulk_time = time.time() - start
+
+        print('{} articles'.format(args.articles))
+        print('per article: {:.0f} articles/s'.format(args.articles / single_time))
+        print('bulk writer: {:.0f} articles/s(batch size {})  speedup: {:.1f}x  {}'.format(
+            args.articles / bulk_time, args.batch_size, single_time / bulk_time, writer.stats()))
+    finally:
+        connection.rollback()
+        cursor.close()
+        connection.close()
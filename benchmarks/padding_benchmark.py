@@ -0,0 +1,66 @@
+"""A benchmark comparing the inference throughput of padding every paragraph to MAX_TOKENS_LENGTH with dynamic padding of
+   length-bucketed batches(see utilities.encoder.encode_documents). The articles listed in project_datasets/articles_data.csv
+   are downloaded and split into topical paragraphs. If an article cannot be downloaded, its headline is used instead.
+
+   Usage(from the repository root):
+   python -m benchmarks.padding_benchmark [--headlines-only] [--batch-size 16]
+"""
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import requests
+from newspaper import fulltext
+from utilities import encoder, key_phrases, model_registry
+
+dir = os.path.dirname(__file__)
+path = os.path.join(dir, '../project_datasets/articles_data.csv')
+
+
+def _load_documents(headlines_only):
+    """Get the paragraphs of each article in articles_data.csv."""
+    articles = pd.read_csv(path, encoding='latin-1')
+    documents = []
+    for headline, url in zip(articles.Headline, articles.URL):
+        text = headline
+        if not headlines_only:
+            try:
+                response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=10)
+                if response.status_code == 200:
+                    text = fulltext(response.text)
+            except Exception:
+                pass
+        documents.append(key_phrases._get_paragraphs(text))
+    return documents
+
+
+def _run(documents, batch_size, dynamic_padding):
+    """Run all documents through the model and get the elapsed time and the outputs."""
+    start = time.time()
+    outputs = encoder.encode_documents(documents, batch_size=batch_size, dynamic_padding=dynamic_padding)
+    return time.time() - start, outputs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--headlines-only', action='store_true', help='Use the headlines instead of downloading the articles.')
+    parser.add_argument('--batch-size', type=int, default=encoder.PARAGRAPH_BATCH_SIZE)
+    args = parser.parse_args()
+
+    documents = _load_documents(args.headlines_only)
+    bert_tokenizer = model_registry.get_tokenizer()
+    paragraphs = [paragraph for document in documents for paragraph in document]
+    num_tokens = sum(len(ids) for ids in bert_tokenizer(paragraphs, truncation=True, max_length=encoder.MAX_TOKENS_LENGTH)['input_ids'])
+    print('{} articles, {} paragraphs, {} tokens'.format(len(documents), len(paragraphs), num_tokens))
+
+    # Warm up the model so that loading it is not part of the measurements
+    encoder.encode_documents(documents[:1])
+
+    max_length_time, max_length_outputs = _run(documents, args.batch_size, False)
+    dynamic_time, dynamic_outputs = _run(documents, args.batch_size, True)
+
+    max_difference = max(np.abs(a[0] - b[0]).max() for a, b in zip(max_length_outputs, dynamic_outputs) if len(a[0]) > 0)
+    print("padding='max_length': {:.2f}s, {:.0f} tokens/s".format(max_length_time, num_tokens / max_length_time))
+    print("dynamic padding:      {:.2f}s, {:.0f} tokens/s".format(dynamic_time, num_tokens / dynamic_time))
+    print('speedup: {:.2f}x, max logit difference: {:.2e}'.format(max_length_time / dynamic_time, max_difference))
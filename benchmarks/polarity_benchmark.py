@@ -0,0 +1,65 @@
+"""A micro-benchmark of polarity word extraction comparing the previous dataframe-based lookup with the compiled lexicon
+   (see utilities.polarity_words.get_sentiment_scores). Article-sized texts are built from the sentences in
+   project_datasets/bert_dataset.csv, each followed by sentences negating positive and negative lexicon words so that the
+   comparison covers negated words.
+
+   Usage(from the repository root):
+   python -m benchmarks.polarity_benchmark [--articles 20] [--sentences-per-article 30]
+"""
+import os
+import time
+import argparse
+import pandas as pd
+from utilities import polarity_words
+
+dir = os.path.dirname(__file__)
+path = os.path.join(dir, '../project_datasets/bert_dataset.csv')
+
+
+def _dataframe_sentiment_scores(tokens, lexicon_df):
+    """The previous implementation of polarity_words.get_sentiment_scores, kept as the baseline."""
+    words = [word.lower() for word in tokens if word.split("_NEG")[0].lower() in list(lexicon_df.word)]
+    sentiment = []
+    for index, word in enumerate(words):
+        if '_neg' in word:
+            if lexicon_df.query('@word.split("_neg")[0] in word').sentiment.all() == 'positive':
+                sentiment.append('negative')
+            else:
+                sentiment.append('positive')
+        else:
+            sentiment.append(lexicon_df.query('@word in word').sentiment.values[0])
+    words = ['not ' + word.split("_neg")[0] if "_neg" in word else word for word in words]
+    return words, sentiment
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--articles', type=int, default=20)
+    parser.add_argument('--sentences-per-article', type=int, default=30)
+    parser.add_argument('--negated-per-article', type=int, default=4)
+    args = parser.parse_args()
+
+    sentences = list(pd.read_csv(path, index_col=0).headlines)
+    lexicon = polarity_words.lexicon
+    negated_words = [word for pair in zip(lexicon[lexicon.sentiment == 'positive'].word, lexicon[lexicon.sentiment == 'negative'].word)
+                     for word in pair]
+    articles = []
+    for article_index, start in enumerate(range(0, args.articles * args.sentences_per_article, args.sentences_per_article)):
+        negated = negated_words[article_index * args.negated_per_article:(article_index + 1) * args.negated_per_article]
+        articles.append(' '.join(sentences[start:start + args.sentences_per_article] +
+                                 ['Analysts do not expect {} results.'.format(word) for word in negated]))
+    tokens = [polarity_words._neg_marking(article) for article in articles]
+
+    start = time.time()
+    baseline = [_dataframe_sentiment_scores(article_tokens, polarity_words.lexicon) for article_tokens in tokens]
+    baseline_time = time.time() - start
+
+    start = time.time()
+    compiled = [polarity_words.get_sentiment_scores(article_tokens, polarity_words.lexicon_index) for article_tokens in tokens]
+    compiled_time = time.time() - start
+
+    print('{} articles, {:.0f} tokens per article, {} negated polarity words'.format(
+        len(articles), sum(len(t) for t in tokens) / len(tokens), sum(word.startswith('not ') for words, _ in compiled for word in words)))
+    print('dataframe lookup: {:.2f}ms per article'.format(baseline_time * 1000 / len(articles)))
+    print('compiled lexicon: {:.3f}ms per article'.format(compiled_time * 1000 / len(articles)))
+    print('speedup: {:.0f}x, identical output: {}'.format(baseline_time / compiled_time, baseline == compiled))
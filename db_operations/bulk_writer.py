@@ -0,0 +1,229 @@
+import time
+from datetime import timedelta
+import numpy as np
+from psycopg2 import Error
+from psycopg2.extras import execute_values
+
+# The number of articles written to the database in a single transaction
+BATCH_SIZE=100
+
+# The maximum number of seconds an analysed article waits to be written when the batch does not fill up. The writer has no timer of its
+# own, the interval is enforced whenever the writer is polled(see BulkWriter.flush_if_due).
+FLUSH_INTERVAL=10.0
+
+# Adds the articles of each ticker and day to the daily sentiment rollup(see db_updates._update_daily_sentiment)
+ROLLUP_STATEMENT = 'INSERT INTO daily_ticker_sentiment (ticker,day,negative_count,neutral_count,positive_count,negative_prob_sum,positive_prob_sum) ' \
+                   'VALUES %s ON CONFLICT (ticker,day) DO UPDATE SET ' \
+                   'negative_count=daily_ticker_sentiment.negative_count+EXCLUDED.negative_count, ' \
+                   'neutral_count=daily_ticker_sentiment.neutral_count+EXCLUDED.neutral_count, ' \
+                   'positive_count=daily_ticker_sentiment.positive_count+EXCLUDED.positive_count, ' \
+                   'negative_prob_sum=daily_ticker_sentiment.negative_prob_sum+EXCLUDED.negative_prob_sum, ' \
+                   'positive_prob_sum=daily_ticker_sentiment.positive_prob_sum+EXCLUDED.positive_prob_sum'
+
+
+def get_rollup_days(timestamp):
+    """A function that retrieves the days of the daily sentiment rollup an article counts towards. The per day queries the rollup
+       replaced selected the articles with date_time BETWEEN the day AND the next day(both at midnight), hence an article stamped
+       exactly at midnight counts towards its own day and the previous one.
+
+       Params:
+       timestamp: datetime - The time the article was inserted(column date_time).
+
+       Returns:
+       days: list - The days(datetime.date) of the rollup rows the article is added to.
+       """
+    day = timestamp.date()
+    if timestamp.hour == 0 and timestamp.minute == 0 and timestamp.second == 0 and timestamp.microsecond == 0:
+        return [day - timedelta(days=1), day]
+    return [day]
+
+
+def _as_stored(probability):
+    """Get a probability as it is read back from a real column, i.e the shortest decimal that identifies its float4 value."""
+    return float(str(np.float32(probability)))
+
+
+def get_rollup_rows(entries):
+    """A function that aggregates analysed articles into one daily sentiment rollup row per ticker and day. A single insert cannot
+       update the same rollup row twice, hence the articles are aggregated before being written.
+
+       Params:
+       entries: list - (article, analysis) tuples(see db_updates._prepare_entry and article_analysis.analyse_article).
+
+       Returns:
+       rows: list - (ticker, day, negative_count, neutral_count, positive_count, negative_prob_sum, positive_prob_sum) tuples.
+       """
+    rollups = {}
+    for article, analysis in entries:
+        for day in get_rollup_days(article['time']):
+            rollup = rollups.setdefault((article['ticker'], day), [0, 0, 0, 0.0, 0.0])
+            # The probabilities are summed as they are read back from column sentiment_prob(real), i.e the shortest decimal of the
+            # float4 value, so that the rollup matches the per day queries it replaced and a backfill
+            if analysis['overall_sentiment'] == 'negative':
+                rollup[0] += 1
+                rollup[3] += _as_stored(analysis['sentiment_prob'][0])
+            elif analysis['overall_sentiment'] == 'neutral':
+                rollup[1] += 1
+            else:
+                rollup[2] += 1
+                rollup[4] += _as_stored(analysis['sentiment_prob'][2])
+
+    return [key + tuple(rollup) for key, rollup in rollups.items()]
+
+
+class BulkWriter:
+    """Collects analysed articles and writes them to the database in batches. Each table is written with a single multi-row
+       insert(psycopg2.extras.execute_values) per batch and the whole batch is committed in one transaction, rather than four
+       inserts and a commit per article. A batch is written once it holds batch_size articles or, when the writer is polled(see add
+       and flush_if_due), its oldest article has waited for flush_interval seconds. Callers waiting for articles poll flush_if_due
+       so that a partial batch is not held back while no article arrives. If writing a batch fails, its articles are written one at a time so that a single bad
+       article does not drop the rest of the batch.
+    """
+
+    def __init__(self, connection, cursor, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        """Params:
+           connection: psycopg2.extensions.connection - The established connection to the database.
+           cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+           batch_size: int - The number of articles written in a single transaction.
+           flush_interval: float - The number of seconds after which a partial batch is written when the writer is polled.
+        """
+        self.connection = connection
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.written = 0
+        self.duplicates = 0
+        self.failed = 0
+        # The urls of the articles that could not be written, their tickers' high-water marks must not move past them
+        self.failed_urls = set()
+        self.num_batches = 0
+        self.write_time = 0.0
+
+        self._pending = []
+        self._oldest = None
+
+    def add(self, article, analysis):
+        """A function that adds an analysed article to the current batch and writes the batch if it is due.
+
+           Params:
+           article: dict - The article(see db_updates._prepare_entry).
+           analysis: dict - The sentiment, key phrases and polarity words of the article(see article_analysis.analyse_article).
+
+           Returns:
+           None
+           """
+        if not self._pending:
+            self._oldest = time.time()
+        self._pending.append((article, analysis))
+
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        """A function that writes the current batch if its oldest article has waited for flush_interval seconds.
+
+           Params: None
+
+           Returns:
+           written: int - The number of articles written.
+           """
+        if not self._pending or time.time() - self._oldest < self.flush_interval:
+            return 0
+        return self.flush()
+
+    def flush(self):
+        """A function that writes all articles of the current batch.
+
+           Params: None
+
+           Returns:
+           written: int - The number of articles written.
+           """
+        if not self._pending:
+            return 0
+
+        entries, self._pending = self._pending, []
+        start = time.time()
+        # Duplicates are only counted once their batch is committed, hence the articles of a failed batch are not counted twice
+        try:
+            written, duplicates = self._write_batch(entries)
+            self.connection.commit()
+            self.duplicates += duplicates
+        except (Exception, Error) as error:
+            self.connection.rollback()
+            print('Something went wrong when writing a batch of {} articles, writing them one by one....'.format(len(entries)), error)
+            written = 0
+            for entry in entries:
+                try:
+                    entry_written, duplicates = self._write_batch([entry])
+                    self.connection.commit()
+                    written += entry_written
+                    self.duplicates += duplicates
+                except (Exception, Error) as error:
+                    self.connection.rollback()
+                    self.failed += 1
+                    self.failed_urls.add(entry[0]['url'])
+                    print('Something went wrong when writing {}....'.format(entry[0]['url']), error)
+
+        self.write_time += time.time() - start
+        self.num_batches += 1
+        self.written += written
+        print('WROTE {} ARTICLES'.format(written))
+        return written
+
+    def _write_batch(self, entries):
+        """Insert the articles of a batch into all tables without committing. Articles whose url is already in the database are skipped.
+           Returns the number of articles inserted and the number of articles skipped as duplicates."""
+
+        # Only the first article with a given url is kept, the url column being unique
+        unique_entries = list({article['url']: (article, analysis) for article, analysis in reversed(entries)}.values())[::-1]
+
+        # Update table entryinfo. Urls already in the database are skipped rather than failing the batch.
+        rows = execute_values(self.cursor, 'INSERT INTO entryinfo (ticker,headline,date_time,url) VALUES %s '
+                                           'ON CONFLICT (url) DO NOTHING RETURNING entryid,url',
+                              [(article['ticker'], article['headline'], article['time'], article['url']) for article, _ in unique_entries],
+                              fetch=True)
+        entry_ids = {url: entry_id for entry_id, url in rows}
+        inserted = [(entry_ids[article['url']], article, analysis) for article, analysis in unique_entries if article['url'] in entry_ids]
+        duplicates = len(entries) - len(inserted)
+
+        if not inserted:
+            return 0, duplicates
+
+        # Update tables sentiment, keyphrases and polaritywords
+        execute_values(self.cursor, 'INSERT INTO sentiment (entryid,overall_sent,sentiment_prob) VALUES %s',
+                       [(entry_id, analysis['overall_sentiment'], analysis['sentiment_prob']) for entry_id, _, analysis in inserted])
+        execute_values(self.cursor, 'INSERT INTO keyphrases (entryid,phrases) VALUES %s',
+                       [(entry_id, analysis['keyphrases']) for entry_id, _, analysis in inserted])
+        execute_values(self.cursor, 'INSERT INTO polaritywords (entryid,words,sentiment_class) VALUES %s',
+                       [(entry_id, analysis['polarity_words'], analysis['polarity_sentiment']) for entry_id, _, analysis in inserted])
+
+        # Update the daily sentiment rollup within the same transaction
+        execute_values(self.cursor, ROLLUP_STATEMENT, get_rollup_rows([(article, analysis) for _, article, analysis in inserted]))
+
+        return len(inserted), duplicates
+
+    def stats(self):
+        """A function that retrieves the writer metrics.
+
+           Params: None
+
+           Returns:
+           stats: dict - The number of articles written, skipped as duplicates and failed, the number of batches and the
+                         number of articles written per second spent writing.
+           """
+        return {'written': self.written, 'duplicates': self.duplicates, 'failed': self.failed, 'batches': self.num_batches,
+                'articles_per_second': self.written / self.write_time if self.write_time > 0 else 0.0}
+
+    def close(self):
+        """A function that writes the articles still in the current batch."""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,258 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import Error, extensions
+from db_operations import db_updates
+
+# The number of connections opened when the pool is created and the maximum number of connections open at the same time
+MIN_CONNECTIONS=1
+MAX_CONNECTIONS=10
+
+# The maximum number of seconds a checkout waits for a connection when all of them are in use
+CHECKOUT_TIMEOUT=30.0
+
+# Connections that were idle for longer than the below number of seconds are checked with a round trip before being handed out
+HEALTH_CHECK_INTERVAL=60.0
+
+# The pool shared by the process, created on first use by get_pool
+_pool=None
+_pool_lock=threading.Lock()
+
+
+class PoolTimeoutError(Error):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class ConnectionPool:
+    """A thread-safe pool of PostgreSQL connections. Connections are opened up to max_connections and reused between checkouts,
+       so the TCP and authentication setup is only paid once per connection instead of once per query. A checkout blocks while all
+       connections are in use. Before a connection is handed out it is checked for health and replaced if it was closed by the server.
+       The time spent waiting for a connection and the utilization of the pool are recorded(see stats).
+    """
+
+    def __init__(self, min_connections=MIN_CONNECTIONS, max_connections=MAX_CONNECTIONS, timeout=CHECKOUT_TIMEOUT,
+                 health_check_interval=HEALTH_CHECK_INTERVAL, connect=None):
+        """Params:
+           min_connections: int - The number of connections opened when the pool is created.
+           max_connections: int - The maximum number of connections open at the same time.
+           timeout: float - The maximum number of seconds a checkout waits for a connection.
+           health_check_interval: float - Idle connections older than this are checked with SELECT 1 before being handed out.
+           connect: callable - Opens a new connection. Defaults to db_updates.open_connection.
+        """
+        if min_connections > max_connections:
+            raise ValueError('min_connections cannot be greater than max_connections')
+
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._connect = connect if connect is not None else db_updates.open_connection
+
+        # (connection, time it was returned to the pool) tuples of the idle connections
+        self._idle = deque()
+        self._num_connections = 0
+        self._condition = threading.Condition()
+        self._closed = False
+
+        self.checkouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.peak_in_use = 0
+        self.replaced = 0
+
+        for _ in range(min_connections):
+            self._idle.append((self._connect(), time.time()))
+            self._num_connections += 1
+
+    def _is_healthy(self, connection, idle_since):
+        """Check whether an idle connection can still be used."""
+        if connection.closed:
+            return False
+        if time.time() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+            return True
+        except (Exception, Error):
+            return False
+
+    def _discard(self, connection):
+        """Close a connection that is not returned to the pool."""
+        try:
+            connection.close()
+        except (Exception, Error):
+            pass
+
+    def getconn(self):
+        """A function that checks out a connection, waiting for one to be returned if all connections are in use.
+
+           Params: None
+
+           Returns:
+           connection: psycopg2.extensions.connection - A healthy connection. It must be returned with putconn.
+           """
+        start = time.time()
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise Error('The connection pool is closed')
+                if self._idle:
+                    connection, idle_since = self._idle.pop()
+                    break
+                if self._num_connections < self.max_connections:
+                    # Reserve the slot before connecting so that concurrent checkouts cannot exceed max_connections
+                    self._num_connections += 1
+                    connection = None
+                    break
+                remaining = self.timeout - (time.time() - start)
+                if remaining <= 0:
+                    raise PoolTimeoutError('No connection became available within {} seconds'.format(self.timeout))
+                self._condition.wait(remaining)
+
+        try:
+            if connection is None:
+                connection = self._connect()
+            elif not self._is_healthy(connection, idle_since):
+                self._discard(connection)
+                self.replaced += 1
+                connection = self._connect()
+        except BaseException:
+            with self._condition:
+                self._num_connections -= 1
+                self._condition.notify()
+            raise
+
+        waited = time.time() - start
+        with self._condition:
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+            self.peak_in_use = max(self.peak_in_use, self._num_connections - len(self._idle))
+        return connection
+
+    def putconn(self, connection, discard=False):
+        """A function that returns a checked out connection to the pool. Any transaction left open is rolled back, so the next
+           checkout starts from a clean state.
+
+           Params:
+           connection: psycopg2.extensions.connection - The connection checked out with getconn.
+           discard: boolean - Close the connection instead of returning it, e.g. after a connection error.
+
+           Returns:
+           None
+           """
+        if not discard and not connection.closed:
+            try:
+                if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except (Exception, Error):
+                discard = True
+
+        with self._condition:
+            if discard or connection.closed or self._closed:
+                self._discard(connection)
+                self._num_connections -= 1
+            else:
+                self._idle.append((connection, time.time()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """A context manager checking out a connection and a cursor and returning them to the pool on exit.
+
+           Usage:
+           with pool.connection() as (connection, cursor):
+               cursor.execute(query)
+           """
+        connection = self.getconn()
+        cursor = None
+        try:
+            cursor = connection.cursor()
+            yield connection, cursor
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # The connection itself is broken, hence it is not reused
+            if cursor is not None and not cursor.closed:
+                cursor.close()
+            cursor = None
+            self.putconn(connection, discard=True)
+            connection = None
+            raise
+        finally:
+            if connection is not None:
+                if cursor is not None and not cursor.closed:
+                    cursor.close()
+                self.putconn(connection)
+
+    def stats(self):
+        """A function that retrieves the pool metrics.
+
+           Params: None
+
+           Returns:
+           stats: dict - The number of checkouts, the total, mean and max seconds spent waiting for a connection, the number of open,
+                         in use and idle connections, the current and peak utilization(in use/max_connections) and the number of
+                         connections replaced after failing a health check.
+           """
+        with self._condition:
+            in_use = self._num_connections - len(self._idle)
+            return {'checkouts': self.checkouts,
+                    'wait_time': self.wait_time,
+                    'mean_wait_time': self.wait_time / self.checkouts if self.checkouts else 0.0,
+                    'max_wait_time': self.max_wait_time,
+                    'open': self._num_connections,
+                    'in_use': in_use,
+                    'idle': len(self._idle),
+                    'utilization': in_use / self.max_connections,
+                    'peak_utilization': self.peak_in_use / self.max_connections,
+                    'replaced': self.replaced}
+
+    def close(self):
+        """A function that closes all idle connections. Connections checked out at the time are closed when they are returned."""
+        with self._condition:
+            self._closed = True
+            while self._idle:
+                connection, _ = self._idle.pop()
+                self._discard(connection)
+                self._num_connections -= 1
+            self._condition.notify_all()
+
+
+def configure(min_connections=MIN_CONNECTIONS, max_connections=MAX_CONNECTIONS, timeout=CHECKOUT_TIMEOUT):
+    """A function that (re)creates the pool shared by the process. Any previous pool is closed.
+
+       Params:
+       min_connections: int - The number of connections opened when the pool is created.
+       max_connections: int - The maximum number of connections open at the same time.
+       timeout: float - The maximum number of seconds a checkout waits for a connection.
+
+       Returns:
+       pool: ConnectionPool - The shared pool.
+       """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(min_connections, max_connections, timeout)
+    return _pool
+
+
+def get_pool():
+    """A function that retrieves the pool shared by the process, creating it with the default sizes on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+    return _pool
+
+
+def checkout():
+    """A function that checks out a connection and a cursor from the shared pool(see ConnectionPool.connection).
+
+       Usage:
+       with db_pool.checkout() as (connection, cursor):
+           cursor.execute(query)
+       """
+    return get_pool().connection()
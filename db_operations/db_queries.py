@@ -1,8 +1,7 @@
 import datetime
 
 from psycopg2 import Error
-from db_operations import db_updates
-import numpy as np
+from db_operations import db_updates, db_pool
 import pandas as pd
 from datetime import timedelta
 
@@ -19,31 +18,9 @@ def get_count_stats(ticker,date):
 
        """
 
-    # format the date that will be used for the query.
-    current_date=str(date.year)+"-"+str(date.month)+"-"+str(date.day)
-    limit_date = date + timedelta(days=1)
-    limit_date = str(limit_date.year) + "-" + str(limit_date.month) + "-" + str(limit_date.day)
-
-    sentiment_classes=['negative','neutral', 'positive']
-    sentiment_counts=[]
-
-    # Query the database for the number of articles for each sentiment class
-    for sent in sentiment_classes:
-        query = "SELECT COUNT(overall_sent) FROM (SELECT ticker,overall_sent FROM entryinfo NATURAL JOIN " \
-                   "sentiment WHERE overall_sent={} AND ticker={} AND date_time BETWEEN {} AND {}) AS a1".format("'"+sent+"'","'"+ticker+"'",
-                                                                                                "'"+current_date+"'","'"+
-                                                                                                                    limit_date+"'")
-        try:
-            connection, cursor = db_updates.connect_to_db()
-            cursor.execute(query)
-            response=cursor.fetchone()[0]
-            sentiment_counts.append(response)
-        except (Exception,Error) as error:
-            print("Something went wrong when fetching article stats..")
-            print(error)
-        finally:
-            cursor.close()
-            connection.close()
+    # Get the number of articles of each sentiment class from the daily sentiment rollup
+    negative_count, neutral_count, positive_count, _, _ = _get_daily_rollups([ticker],date)[ticker]
+    sentiment_counts=[negative_count, neutral_count, positive_count]
 
     return sentiment_counts
 
@@ -67,71 +44,141 @@ def get_sentiment_stats(ticker,date):
        sentiment_scalar: float - The overall scalar sentiment towards a given stock/cryptocurrency on a given day.
        """
 
-    current_date=str(date.year)+"-"+str(date.month)+"-"+str(date.day)
-    limit_date = date + timedelta(days=1)
-    limit_date = str(limit_date.year) + "-" + str(limit_date.month) + "-" + str(limit_date.day)
+    # Get the number of articles and the sums of the class probabilities of each sentiment class from the daily sentiment rollup
+    return _get_class_scalars(_get_daily_rollups([ticker],date)[ticker])
 
-    sentiment_classes=['negative','positive']
-    num_negative_articles=0
-    num_positive_articles=0
-    pos_neg_scalars=[]
-
-    # Get the articles for each sentiment class and calculate the respective scalar.
-    for sent in sentiment_classes:
-        # Query the database for the sentiment probabilities of each article for the given ticker on the given date.
-        query = "SELECT a1.sentiment_prob FROM (SELECT overall_sent,sentiment_prob FROM entryinfo NATURAL JOIN " \
-            "sentiment WHERE overall_sent={} AND ticker={} AND date_time BETWEEN {} AND {}) AS a1".format("'"+sent+"'","'"+ticker+"'",
-                                                                                         "'"+current_date+"'","'"+limit_date+"'")
-        try:
-            connection,cursor = db_updates.connect_to_db()
-            cursor.execute(query)
+def get_sentiment_scores(tickers,date):
+    """A function that retrieves the sentiment scalar(see get_sentiment_stats) of many stocks/cryptocurrencies on a given day.
+       The statistics of all tickers are retrieved in a single query rather than one query per ticker.
+
+       Params:
+       tickers: list - The stock/cryptocurrency tickers.
+       date: datetime object - The date for which results are to be retrieved.
+
+       Returns:
+       sentiment_scores: dict - ticker : the overall scalar sentiment towards the stock/cryptocurrency on the given day.
+       """
+    rollups=_get_daily_rollups(tickers,date)
+    return {ticker:_get_class_scalars(rollups[ticker])[1] for ticker in tickers}
+
+def _get_class_scalars(rollup):
+    """A function that calculates the scalar negativity, scalar positivity and overall sentiment scalar from the daily sentiment
+       rollup of a single ticker(see _get_daily_rollups).
+
+       Params:
+       rollup: tuple - (negative_count, neutral_count, positive_count, negative_prob_sum, positive_prob_sum).
+
+       Returns:
+       pos_neg_scalars: list - The scalar(expressed) negativity and positivity in negative and positive articles respectively.
+       sentiment_scalar: float - The overall scalar sentiment.
+       """
+    num_negative_articles, _, num_positive_articles, negative_prob_sum, positive_prob_sum = rollup
+
+    # The pooled negative probability of negative articles and the pooled positive probability of positive articles.
+    # 0 is used for the given scalar if there were no articles in the class.
+    negative_scalar = negative_prob_sum/num_negative_articles if num_negative_articles>0 else 0
+    positive_scalar = positive_prob_sum/num_positive_articles if num_positive_articles>0 else 0
+    pos_neg_scalars=[negative_scalar, positive_scalar]
+
+    sentiment_scalar=_get_sentiment_scalar(num_negative_articles, negative_scalar, num_positive_articles, positive_scalar)
+    return pos_neg_scalars, sentiment_scalar
+
+def get_historical_scores(ticker,date,period):
+    """A function that retrieves the daily sentiment scalar(see get_sentiment_stats) for a given stock/cryptocurrency over the period
+       of days ending on a given day. Rather than querying each day separately, the daily sentiment rollups of the whole period are
+       retrieved in a single query. Days without any negative or positive articles get a score of 0.
+
+       Params:
+       ticker: str - The stock/cryptocurrency ticker.
+       date: datetime object - The last day of the period.
+       period: int - The number of days for which scores are to be retrieved.
+
+       Returns:
+       scores: list - The sentiment scalar of each day in the period, ordered from the oldest to the most recent day.
+       """
+    last_day = datetime.datetime(date.year, date.month, date.day)
+    days = [last_day - timedelta(days=time_unit) for time_unit in range(period)][::-1]
+    if len(days)==0:
+        return []
+
+    query = "SELECT day, negative_count, neutral_count, positive_count, negative_prob_sum, positive_prob_sum " \
+            "FROM daily_ticker_sentiment WHERE ticker=%s AND day BETWEEN %s AND %s"
+
+    # Days without articles keep a rollup of zeros
+    rollups={day.date():(0, 0, 0, 0, 0) for day in days}
+    try:
+        with db_pool.checkout() as (connection, cursor):
+            cursor.execute(query,(ticker,days[0].date(),last_day.date()))
             response=cursor.fetchall()
+        for item in response:
+            rollups[item[0]]=tuple(item[1:])
+    except (Exception,Error) as error:
+        print("Something went wrong when fetching historical scores..")
+        print(error)
 
-            # Check whether there is any data in the response.
-            if len(response) >0:
+    scores=[_get_class_scalars(rollups[day.date()])[1] for day in days]
 
-                # Convert to numpy ndarray for further processing.
-                arr=np.array(response)
-                if sent=='negative':
-                    num_negative_articles=len(response)
+    return scores
 
-                    # Mean pool along the column axis and retrieve the pooled negative probability of negative articles.
-                    score=np.mean(arr,axis=0)[0][0]
+def _get_daily_rollups(tickers,date):
+    """A function that retrieves the daily sentiment rollup(table daily_ticker_sentiment, see db_updates._update_daily_sentiment)
+       of the given stocks/cryptocurrencies on a given day. The rollup is maintained as articles are inserted, hence a single row is
+       read per ticker regardless of the number of articles. Like the per day queries it replaced, a day covers the articles from its
+       midnight up to and including the next midnight(see bulk_writer.get_rollup_days).
 
-                else:
-                    num_positive_articles=len(response)
+       Params:
+       tickers: list - The stock/cryptocurrency tickers.
+       date: datetime object - The date for which results are to be retrieved.
 
-                    # Mean pool along the column axis and retrieve the pooled positive probability of positive articles.
-                    score=np.mean(arr,axis=0)[0][2]
+       Returns:
+       rollups: dict - ticker : (negative_count, neutral_count, positive_count, negative_prob_sum, positive_prob_sum). The sums are
+                       the sum of the negative probability of negative articles and of the positive probability of positive articles.
+       """
+    query = "SELECT ticker, negative_count, neutral_count, positive_count, negative_prob_sum, positive_prob_sum " \
+            "FROM daily_ticker_sentiment WHERE ticker = ANY(%s) AND day=%s"
 
-                # Append the list holding both scalars.
-                pos_neg_scalars.append(score)
-            # Append 0 for the given scalar if there were no articles in the response.
-            else:
-                pos_neg_scalars.append(0)
-        except (Exception,Error) as error:
-            print("Something went wrong")
-            print(error)
-        finally:
-            cursor.close()
-            connection.close()
+    # Tickers without articles on the given day keep a rollup of zeros
+    rollups={ticker:(0, 0, 0, 0, 0) for ticker in tickers}
+    try:
+        with db_pool.checkout() as (connection, cursor):
+            cursor.execute(query,(list(rollups.keys()),datetime.date(date.year, date.month, date.day)))
+            response=cursor.fetchall()
+        for item in response:
+            rollups[item[0]]=tuple(item[1:])
+    except (Exception,Error) as error:
+        print("Something went wrong when fetching article stats..")
+        print(error)
+
+    return rollups
 
-    # Calculate the overall sentiment scalar.
+def _get_sentiment_scalar(num_negative_articles, negative_scalar, num_positive_articles, positive_scalar):
+    """A function that calculates the overall sentiment scalar from the scalar negativity of negative articles and the scalar
+       positivity of positive articles(see get_sentiment_stats for the formula).
+
+       Params:
+       num_negative_articles: int - The number of negative articles.
+       negative_scalar: float - The pooled negative probability of the negative articles, 0 if there were none.
+       num_positive_articles: int - The number of positive articles.
+       positive_scalar: float - The pooled positive probability of the positive articles, 0 if there were none.
+
+       Returns:
+       sentiment_scalar: float - The overall scalar sentiment.
+       """
 
     # If there were no articles for both classes the sentiment scalar is zero.
-    if sum(pos_neg_scalars)==0:
+    if negative_scalar+positive_scalar==0:
         sentiment_scalar=0
 
     else:
         # Calculate the weights and the overall sentiment scalar based on the formula in the function description.
         neg_weight= -1*(num_negative_articles/(num_negative_articles+num_positive_articles))
         pos_weight= num_positive_articles/(num_negative_articles+num_positive_articles)
-        sentiment_scalar = ((neg_weight*(pos_neg_scalars[0])) + (pos_weight*pos_neg_scalars[1]))*100
+        sentiment_scalar = ((neg_weight*(negative_scalar)) + (pos_weight*positive_scalar))*100
         sentiment_scalar=float("%.2f" % sentiment_scalar)
 
         if sentiment_scalar%1==0:
             sentiment_scalar=int(sentiment_scalar)
-    return pos_neg_scalars, sentiment_scalar
+    return sentiment_scalar
 
 def _get_frequent_polarity_words(ticker, date, n):
     """A function that retrieves the n most occurring positive and negative words in the articles for a given stock/cryptocurrency
@@ -215,9 +262,9 @@ def _get_lexicon_df(ticker,date):
         "'" + ticker + "'", "'" + current_date+ "'","'"+limit_date+"'"
     )
     try:
-        connection, cursor = db_updates.connect_to_db()
-        cursor.execute(query)
-        response = cursor.fetchall()
+        with db_pool.checkout() as (connection, cursor):
+            cursor.execute(query)
+            response = cursor.fetchall()
         # Check whether there is any data in the response
         if len(response) > 0:
             # For each item in the response lists append the dataframe with the corresponding information.
@@ -225,9 +272,6 @@ def _get_lexicon_df(ticker,date):
                 df=df.append(pd.DataFrame({'word':item[0],'sentiment':item[1],'headline':item[2],'url':item[3]}),ignore_index=True)
     except (Exception,Error) as error:
         print(error)
-    finally:
-        cursor.close()
-        connection.close()
 
     return df
 
@@ -261,9 +305,9 @@ def get_keyphrases(ticker,date):
     )
 
     try:
-        connection, cursor = db_updates.connect_to_db()
-        cursor.execute(query)
-        response = cursor.fetchall()
+        with db_pool.checkout() as (connection, cursor):
+            cursor.execute(query)
+            response = cursor.fetchall()
         # Check if the response contains any data.
         if len(response)==0:
             return [],[],[]
@@ -275,10 +319,6 @@ def get_keyphrases(ticker,date):
     except (Exception, Error) as error:
         print(error)
 
-    finally:
-        cursor.close()
-        connection.close()
-
 
     # Get the dataframe containing all words from the articles for the given ticker that were present in the sentiment lexicon.
     lexicon_df=_get_lexicon_df(ticker,date)
@@ -313,24 +353,17 @@ def get_ticker_info(date):
     Returns:
     ticker_info: dict - A dictionary of key-value pairs - ticker : dictionary containing keys: id, image_url, name, num_articles and ticker.
     """
-    current_date = str(date.year) + "-" + str(date.month) + "-" + str(date.day)
-    limit_date = date + timedelta(days=1)
-    limit_date =str(limit_date.year) + "-" + str(limit_date.month) + "-" + str(limit_date.day)
-
-    query='SELECT id,tickerinfo.ticker,name,image_url,COUNT(entryinfo.ticker) FROM tickerinfo LEFT JOIN entryinfo ' \
-          'ON entryinfo.ticker=tickerinfo.ticker AND date_time BETWEEN {} and {} GROUP BY tickerinfo.ticker'.format(
-        "'"+current_date+"'","'"+limit_date+"'")
+    # The number of articles is read from the daily sentiment rollup
+    query='SELECT id,tickerinfo.ticker,name,image_url,COALESCE(negative_count+neutral_count+positive_count,0) FROM tickerinfo ' \
+          'LEFT JOIN daily_ticker_sentiment ON daily_ticker_sentiment.ticker=tickerinfo.ticker AND day=%s'
 
     try:
-        connection,cursor= db_updates.connect_to_db()
-        cursor.execute(query)
-        response=cursor.fetchall()
+        with db_pool.checkout() as (connection, cursor):
+            cursor.execute(query,(datetime.date(date.year, date.month, date.day),))
+            response=cursor.fetchall()
 
     except (Exception,Error) as error:
         print(error)
-    finally:
-        cursor.close()
-        connection.close()
 
     ticker_info={}
     for item in response:
@@ -370,18 +403,15 @@ def get_headlines(ticker,date):
                                                                       "'"+limit_date+"'")
 
     try:
-        connection, cursor = db_updates.connect_to_db()
-        cursor.execute(query)
-        response = cursor.fetchall()
-        # Execute the query retrieving neutral articles if there are less than 5 positive and negative ones.
-        if len(response)<5:
-            cursor.execute(neutral_query)
-            response=cursor.fetchall()
+        with db_pool.checkout() as (connection, cursor):
+            cursor.execute(query)
+            response = cursor.fetchall()
+            # Execute the query retrieving neutral articles if there are less than 5 positive and negative ones.
+            if len(response)<5:
+                cursor.execute(neutral_query)
+                response=cursor.fetchall()
     except (Exception, Error) as error:
         print(error)
-    finally:
-        cursor.close()
-        connection.close()
 
     articles=[]
     for item in response:
@@ -3,22 +3,24 @@ import traceback
 from newspaper import fulltext
 import psycopg2
 from psycopg2 import Error
+from psycopg2.extras import execute_values
 from datetime import datetime
-from utilities import sentiment_analysis, polarity_words, key_phrases, news_scrapers
+from utilities import article_analysis, inference_queue, news_scrapers, http_fetcher, content_fingerprint
+from db_operations import bulk_writer, url_index
 
 
 # The stock and crypto tickers that will be considered when updating the database
 TICKER_CLASSES={'stock_tickers':['TSLA', 'GOOG', 'AMZN', 'HOOD', 'NFLX', 'AAPL','FB','AMC','GME','NVDA','PYPL','INTC','ABNB'],
              'crypto_tickers':['BTC','ETH','DOGE','XRP','ADA','LTC','BNB','LINK','SHIB']}
 
-def connect_to_db():
-    """A function that establishes the connection to the PostgreSQL database using the psycopg2 adapter.
+def open_connection():
+    """A function that opens a new connection to the PostgreSQL database using the psycopg2 adapter. Query and update functions
+       check out pooled connections instead(see db_pool.checkout).
 
        Params: None
 
        Returns:
        connection: psycopg2.extensions.connection - The connection to the database.
-       cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
 
        """
 
@@ -28,10 +30,23 @@ def connect_to_db():
     HOST = ''
     PORT = ''
     DATABASE = ''
+    return psycopg2.connect(user=USER,password=PASSWORD,
+                            host=HOST,port=PORT,
+                            database=DATABASE)
+
+
+def connect_to_db():
+    """A function that establishes the connection to the PostgreSQL database using the psycopg2 adapter.
+
+       Params: None
+
+       Returns:
+       connection: psycopg2.extensions.connection - The connection to the database.
+       cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+
+       """
     try:
-        connection=psycopg2.connect(user=USER,password=PASSWORD,
-                                      host=HOST,port=PORT,
-                                      database=DATABASE)
+        connection=open_connection()
         cursor = connection.cursor()
     except (Exception,Error) as error:
         print('Something went wrong....',error)
@@ -40,75 +55,280 @@ def connect_to_db():
 
 
 
-def update_db(connection,cursor):
+def update_db(connection,cursor,max_batch_size=inference_queue.MAX_BATCH_SIZE,max_wait=inference_queue.MAX_WAIT,
+              write_batch_size=bulk_writer.BATCH_SIZE,flush_interval=bulk_writer.FLUSH_INTERVAL,incremental=True):
     """A function that updates the database by updating all columns in all four tables for each news article scraped from the web
-       for all stocks and cryptocurrencies listed in TICKER_CLASSES.
+       for all stocks and cryptocurrencies listed in TICKER_CLASSES. The news of all tickers and the article bodies are downloaded
+       concurrently through the shared fetch layer(see http_fetcher.Fetcher), which limits the requests made to each host. Rather than
+       analysing the articles one at a time, the parsed articles of all tickers are submitted to an inference queue that analyses them in
+       cross-article batches in the background while the scraping continues(see inference_queue.InferenceQueue). Copies of a story that
+       was already submitted(e.g the same wire story listed under several tickers) reuse its analysis(see content_fingerprint). As their
+       analyses complete, the entries are collected by a bulk writer that writes them to the database in batches(see bulk_writer.BulkWriter).
+       Only the articles published after the high-water mark of each ticker are scraped(see _scrape_articles), the marks being moved
+       forward once all entries are written. A mark is not moved past an article that could not be downloaded, analysed or written,
+       hence the next update retries it(see advance_watermarks).
 
        Params:
        connection: psycopg2.extensions.connection - The established connection to the database.
        cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+       max_batch_size: int - The maximum number of articles analysed in a single batch.
+       max_wait: float - The maximum number of seconds an article waits for its batch to fill up.
+       write_batch_size: int - The number of articles written to the database in a single transaction.
+       flush_interval: float - The number of seconds after which a partial batch is written. The writer is polled after each scraped
+                               article(see _write_completed and bulk_writer.BulkWriter.flush_if_due).
+       incremental: boolean - Whether to skip the articles older than the high-water marks. All articles of the day are scraped otherwise.
 
        Returns:
        None: Void function that updates the database.
 
     """
 
-    # Loop through both ticker classes in TICKER_CLASSES
-    for key in TICKER_CLASSES.keys():
-        # For each ticker in a given ticker class get the news
-        for ticker in TICKER_CLASSES[key]:
-            # Scrape from finviz using get_stock_news
-            if key == 'stock_tickers':
-                news= news_scrapers.get_stock_news(ticker)
-            # Scrape using the crypto news API using get_crypto_news
-            else:
-                news= news_scrapers.get_crypto_news(ticker)
+    # The articles submitted for analysis whose entries are yet to be written, the news listed for each ticker and the urls of the
+    # articles that could not be ingested
+    pending = []
+    listings = {}
+    failed_urls = set()
+
+    writer = bulk_writer.BulkWriter(connection,cursor,write_batch_size,flush_interval)
+    fingerprints = content_fingerprint.FingerprintIndex()
+
+    with inference_queue.InferenceQueue(max_batch_size, max_wait) as analysis_queue:
+        for article in _scrape_articles(cursor,listings,failed_urls,incremental):
+            # The copies of a story share the future of its analysis instead of being analysed again
+            future = fingerprints.find(article['text'])
+            if future is None:
+                future = analysis_queue.submit(article['text'])
+                fingerprints.add(article['text'],future)
+            pending.append((article, future))
+            # Write the entries of the articles that have already been analysed
+            pending = _write_completed(writer,pending,failed_urls,wait=False)
+
+    # The queue has analysed all remaining articles once closed
+    _write_completed(writer,pending,failed_urls,wait=True)
+    writer.close()
+    failed_urls |= writer.failed_urls
+    save_watermarks(connection,cursor,advance_watermarks(listings,failed_urls))
+    print('BULK WRITER: {}'.format(writer.stats()))
+    print('FETCHER: {}'.format(http_fetcher.get_fetcher().stats()))
+    print('FINGERPRINTS: {}'.format(fingerprints.stats()))
+
+
+def _scrape_articles(cursor,listings=None,failed_urls=None,incremental=True):
+    """A generator that scrapes the news of all tickers in TICKER_CLASSES and yields the parsable articles that are not already in the
+       database as their downloads complete. The news of all tickers are requested at once and the article bodies are downloaded
+       concurrently through the shared fetch layer(see http_fetcher.Fetcher). The scrapers stop at the high-water mark of each ticker
+       (see news_scrapers.Watermark) and the urls already in the database are filtered out in memory before any download(see url_index.UrlIndex).
 
-            # Check whether there returned news dictionary is not empty (no news available for the given day for the given stock/cryptocurrency)
-            if len(news)>0:
-                # Update the database with information retrieved from each news article
-                for headline,url in news.items():
-                    _insert_entry(connection,cursor,headline,ticker,url)
+       Params:
+       cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+       listings: dict - Filled with ticker : (the stored high-water mark, the scraped (headline, url, timestamp) tuples). The marks are
+                        only moved forward by the caller once the articles are written(see advance_watermarks), so that an interrupted
+                        update scrapes them again.
+       failed_urls: set - Filled with the urls of the articles whose download failed and may succeed on the next update.
+       incremental: boolean - Whether to skip the articles older than the stored high-water marks.
+
+       Yields:
+       article: dict - The article(see _build_entry).
+       """
 
+    # The articles being downloaded and the urls downloaded during the current run
+    downloads = []
+    submitted_urls = set()
 
+    fetcher = http_fetcher.get_fetcher()
+    stored_watermarks = get_watermarks(cursor)
+    index = url_index.UrlIndex.load(cursor)
+    if listings is None:
+        listings = {}
+    if failed_urls is None:
+        failed_urls = set()
 
+    # Stocks are scraped from finviz using get_stock_articles, cryptocurrencies using the crypto news API using get_crypto_articles
+    scrapes = []
+    for key in TICKER_CLASSES.keys():
+        scraper = news_scrapers.get_stock_articles if key == 'stock_tickers' else news_scrapers.get_crypto_articles
+        for ticker in TICKER_CLASSES[key]:
+            watermark = stored_watermarks.get(ticker) if incremental else None
+            scrapes.append((ticker, fetcher.submit(scraper,ticker,watermark)))
+
+    for ticker, scrape in scrapes:
+        try:
+            news = scrape.result()
+        except Exception as error:
+            print('Something went wrong when scraping the news of {}....'.format(ticker), error)
+            news = None
+
+        # Check whether there returned news list is not empty (no new articles available for the given day for the given stock/cryptocurrency)
+        if news and len(news)>0:
+            listings[ticker] = (stored_watermarks.get(ticker), news)
+
+            # Download each article that is not already in the database. The duplicate check uses the cursor, hence it stays on this thread.
+            known_urls = index.filter_known(cursor,[url for _,url,_ in news if url not in submitted_urls])
+            if known_urls:
+                print("{} DUPLICATE INSERTIONS SKIPPED...".format(len(known_urls)))
+            for headline,url,_ in news:
+                if url in submitted_urls or url in known_urls:
+                    continue
+                submitted_urls.add(url)
+                index.add(url)
+                downloads.append((headline, ticker, url, fetcher.submit(_fetch_article,url)))
+
+        articles, downloads = _collect_downloaded(downloads,failed_urls,wait=False)
+        yield from articles
+
+    articles, _ = _collect_downloaded(downloads,failed_urls,wait=True)
+    yield from articles
+    print('URL INDEX: {}'.format(index.stats()))
+
+
+def _collect_downloaded(downloads,failed_urls,wait):
+    """A function that collects the downloaded articles that can be parsed. Articles that cannot be parsed are skipped for good, while
+       the urls of the downloads that failed(see _is_retryable) are added to failed_urls.
 
+       Params:
+       downloads: list - (headline, ticker, url, future) tuples for the articles being downloaded(see _scrape_articles).
+       failed_urls: set - The urls of the articles that could not be ingested.
+       wait: boolean - Whether to wait for the downloads that have not completed yet.
 
+       Returns:
+       articles: list - The parsable downloaded articles(see _build_entry).
+       still_downloading: list - The (headline, ticker, url, future) tuples whose download has not completed yet.
+       """
+    articles = []
+    still_downloading = []
+    for headline, ticker, url, future in downloads:
+        if not wait and not future.done():
+            still_downloading.append((headline, ticker, url, future))
+            continue
+        try:
+            fetched = future.result()
+        except Exception as error:
+            print('Something went wrong when downloading {}....'.format(url), error)
+            failed_urls.add(url)
+            continue
+        article = _build_entry(headline,ticker,url,fetched)
+        if article is not None:
+            articles.append(article)
+        elif _is_retryable(fetched):
+            failed_urls.add(url)
+
+    return articles, still_downloading
+
+
+def _write_completed(writer,pending,failed_urls,wait):
+    """A function that passes the entries of the submitted articles whose analysis has completed to the bulk writer.
 
+       Params:
+       writer: bulk_writer.BulkWriter - The writer collecting the analysed articles.
+       pending: list - (article, future) tuples for the articles submitted for analysis(see update_db).
+       failed_urls: set - Filled with the urls of the articles whose analysis failed.
+       wait: boolean - Whether to wait for the analyses that have not completed yet.
 
-def _check_parsing(url):
-    """A function that checks whether the text from an article can be correctly parsed. Some websites do not allow scraping
-       response status codes other than 200 are returned (e.g 403), hence firstly that is checked for. In other cases, the response
-       code is 200(OK) but the response states that the website does not allow for scraping hence the length of the response is checked.
-       Lastly, the crypto news api sometimes includes urls that would throw exceptions when attempted to be parsed by newspaper.fulltext
-       (e.g - YouTube urls). Such circumstances are also controlled for.
+       Returns:
+       still_pending: list - The (article, future) tuples whose analysis has not completed yet.
+       """
+    still_pending = []
+    for article, future in pending:
+        if not wait and not future.done():
+            still_pending.append((article, future))
+            continue
+        try:
+            analysis = future.result()
+        except Exception as error:
+            print('Something went wrong when analysing {}....'.format(article['url']), error)
+            failed_urls.add(article['url'])
+            continue
+        writer.add(article,analysis)
+
+    # Write a partial batch that has waited for flush_interval seconds even if no analysis completed since
+    writer.flush_if_due()
+    return still_pending
+
+
+def _fetch_article(url):
+    """A function that downloads a news article and extracts its text in a single pass. The result is used both to check whether the
+       article can be parsed(see _is_parsable) and as the text that is analysed, hence every article is only downloaded and parsed once.
+       The article is requested through the shared fetch layer(see http_fetcher.Fetcher).
 
        Params:
        url: str - The news article url.
 
        Returns:
-       boolean: True if the text from the given article url can be correctly parsed. False otherwise.
+       fetched: dict - A dictionary containing keys: status(the response status code, None if the request failed), html(the raw response
+                       text) and body(the text extracted by newspaper.fulltext, None if the response was not OK or could not be parsed).
        """
 
-    response= requests.get(url)
+    # Hosts that keep timing out or refusing connections are treated like articles that cannot be parsed
+    try:
+        response= http_fetcher.get_fetcher().get(url)
+    except requests.RequestException:
+        return {'status':None,'html':'','body':None}
+
+    fetched = {'status':response.status_code,'html':response.text,'body':None}
 
-    # Check response status code
+    # Only successful responses are parsed
     if response.status_code!=200:
-        return False
+        return fetched
 
     # Control for urls that do not contain text to be parsed by newspaper.fulltext (e.g YouTube urls)
     try:
-        article_body= fulltext(response.text)
+        fetched['body']= fulltext(response.text)
     except:
+        pass
+
+    return fetched
+
+
+def _is_retryable(fetched):
+    """A function that checks whether a downloaded article(see _fetch_article) failed for a reason that may not hold on the next update,
+       i.e the request kept failing or the server kept responding with a retried status(see http_fetcher.RETRY_STATUSES).
+
+       Params:
+       fetched: dict - The downloaded article.
+
+       Returns:
+       boolean: True if the download may succeed when retried. False otherwise.
+       """
+    return fetched['status'] is None or fetched['status'] in http_fetcher.RETRY_STATUSES
+
+
+def _is_parsable(fetched):
+    """A function that checks whether the text from a downloaded article(see _fetch_article) was correctly parsed. Some websites do not allow
+       scraping, response status codes other than 200 are returned (e.g 403), hence firstly that is checked for. In other cases, the response
+       code is 200(OK) but the response states that the website does not allow for scraping hence the length of the response is checked.
+       Lastly, the crypto news api sometimes includes urls that would throw exceptions when attempted to be parsed by newspaper.fulltext
+       (e.g - YouTube urls). Such circumstances are also controlled for.
+
+       Params:
+       fetched: dict - The downloaded article(see _fetch_article).
+
+       Returns:
+       boolean: True if the text of the article was correctly parsed. False otherwise.
+       """
+
+    # Check response status code and whether newspaper.fulltext could parse the response
+    if fetched['status']!=200 or fetched['body'] is None:
         return False
 
     # Check whether the response is not a message stating that the website does not allow for scraping. 420 was deemed as an appropriate length after observing the average length of such responses.
-    if len(article_body)>420:
+    if len(fetched['body'])>420:
         return True
     else:
         return False
 
 
+def _check_parsing(url):
+    """A function that checks whether the text from an article can be correctly parsed(see _is_parsable).
+
+       Params:
+       url: str - The news article url.
+
+       Returns:
+       boolean: True if the text from the given article url can be correctly parsed. False otherwise.
+       """
+    return _is_parsable(_fetch_article(url))
+
+
 def _insert_entry(connection,cursor,headline,ticker,url):
     """"A function that inserts all information retrieved from a single news article into the database.
         All columns in tables: entryinfo, sentiment, keyphrases, and polaritywords are updated with the
@@ -126,17 +346,78 @@ def _insert_entry(connection,cursor,headline,ticker,url):
 
     """
 
-    # Check whether the article text can be correctly parsed from the url
-    if not _check_parsing(url):
+    article = _prepare_entry(cursor,headline,ticker,url)
+    if article is None:
         return False
 
+    try:
+        # Get the sentiment, key phrases and polarity words of the article. The model is ran over the article only once.
+        analysis = article_analysis.analyse_article(article['text'])
+    except (Exception, Error) as error:
+        print('Something went wrong....', error)
+        print(traceback.format_exc())
+        return False
+
+    return _write_entry(connection,cursor,article,analysis)
+
+
+def _prepare_entry(cursor,headline,ticker,url):
+    """A function that checks whether an article can be inserted into the database and retrieves its text. The article is downloaded
+       and parsed once(see _fetch_article), and only if it is not already in the database.
+
+        Params:
+        cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+        headline: str - The article headline.
+        ticker: str - The stock/cryptocurrency ticker related to the article.
+        url: str - The article url.
+
+        Returns:
+        article: dict - A dictionary containing keys: headline, ticker, url, time and text. None if the article cannot be inserted.
+    """
+
     # Check whether the attempted insertion is not a duplicate
     if _is_duplicate(cursor,url):
-        return False
+        return None
+
+    return _build_entry(headline,ticker,url,_fetch_article(url))
+
+
+def _build_entry(headline,ticker,url,fetched):
+    """A function that builds the entry of a downloaded article(see _fetch_article).
+
+        Params:
+        headline: str - The article headline.
+        ticker: str - The stock/cryptocurrency ticker related to the article.
+        url: str - The article url.
+        fetched: dict - The downloaded article.
+
+        Returns:
+        article: dict - A dictionary containing keys: headline, ticker, url, time and text. None if the article text cannot be parsed.
+    """
+
+    # Check whether the article text can be correctly parsed from the url
+    if not _is_parsable(fetched):
+        return None
 
     # A timestamp will be inserted in db table entryinfo indicating the time of entry
     time = datetime.now()
-    article_text =fulltext(requests.get(url).text)
+
+    return {'headline':headline,'ticker':ticker,'url':url,'time':time,'text':fetched['body']}
+
+
+def _write_entry(connection,cursor,article,analysis):
+    """"A function that writes an analysed article into the database.
+
+        Params:
+        connection: psycopg2.extensions.connection - The established connection to the database.
+        cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+        article: dict - The article(see _prepare_entry).
+        analysis: dict - The sentiment, key phrases and polarity words of the article(see article_analysis.analyse_article).
+
+        Returns:
+        boolean: True if the entry was correctly inserted. False otherwise.
+
+    """
 
     '''Update each table in the db with the relevant information. Four statements updating the different db tables are executed.Subsequently,
        all modifications are saved by committing. Despite _is_duplicate checking for duplicate entries, a second layer of protection is employed.
@@ -147,27 +428,26 @@ def _insert_entry(connection,cursor,headline,ticker,url):
        in any way.
        '''
     try:
-        print(headline)
-        # Get a unique entry id for the current entry
-        entry_id=_get_next_id(cursor)
-        # Update table entryinfo
-        entryinfo_statement='INSERT INTO entryinfo (entryid,ticker,headline,date_time,url) VALUES (%s,%s,%s,%s,%s);'
-        cursor.execute(entryinfo_statement,(entry_id,ticker,headline,time,url))
+        print(article['headline'])
+        # Update table entryinfo. The unique entry id is allocated by the database(identity column) and returned by the insert.
+        entryinfo_statement='INSERT INTO entryinfo (ticker,headline,date_time,url) VALUES (%s,%s,%s,%s) RETURNING entryid;'
+        cursor.execute(entryinfo_statement,(article['ticker'],article['headline'],article['time'],article['url']))
+        entry_id=cursor.fetchone()[0]
 
         # Update table sentiment
-        overall_sentiment, sentiment_probab = sentiment_analysis.get_sentiment(article_text)
         sentiment_statement = 'INSERT INTO sentiment (entryid,overall_sent,sentiment_prob) VALUES (%s,%s,%s);'
-        cursor.execute(sentiment_statement,(entry_id,overall_sentiment,sentiment_probab))
+        cursor.execute(sentiment_statement,(entry_id,analysis['overall_sentiment'],analysis['sentiment_prob']))
 
         # Update table keyphrases
-        phrases = key_phrases.get_keyphrases(article_text, (3, 3), 7)
         keyphrase_statement = 'INSERT INTO keyphrases (entryid, phrases) VALUES (%s,%s);'
-        cursor.execute(keyphrase_statement,(entry_id,phrases))
+        cursor.execute(keyphrase_statement,(entry_id,analysis['keyphrases']))
 
         # Update table polarity_words
-        words,sentiment= polarity_words.get_polarity_words(article_text)
         polarity_words_statement = 'INSERT INTO polaritywords (entryid,words,sentiment_class) VALUES (%s,%s,%s)'
-        cursor.execute(polarity_words_statement,(entry_id,words,sentiment))
+        cursor.execute(polarity_words_statement,(entry_id,analysis['polarity_words'],analysis['polarity_sentiment']))
+
+        # Update the daily sentiment rollup of the ticker within the same transaction
+        _update_daily_sentiment(cursor,article,analysis)
         print("ALL QUERIES EXECUTED")
         # Commit all updates made
         connection.commit()
@@ -185,28 +465,163 @@ def _insert_entry(connection,cursor,headline,ticker,url):
 
     return True
 
-def _get_next_id(cursor):
-    """A function that generates a new unique id for a db entry.
-       The function fetches the last id used from the db and adds one to it to generate a new id
+def _update_daily_sentiment(cursor,article,analysis):
+    """A function that adds an article to the daily sentiment rollup of its ticker(table daily_ticker_sentiment). The rollup holds
+       the number of articles of each sentiment class and the sums of the negative probability of negative articles and of the positive
+       probability of positive articles for each ticker and day, so that the read endpoints do not need to aggregate the articles.
+       The function does not commit, the rollup is updated in the transaction inserting the article.
 
-    Params:
-    cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands
+       Params:
+       cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+       article: dict - The article(see _prepare_entry).
+       analysis: dict - The sentiment of the article(see article_analysis.analyse_article).
 
-    Returns:
-    new_id: int - New id generated
+       Returns:
+       None
+       """
+    execute_values(cursor,bulk_writer.ROLLUP_STATEMENT,bulk_writer.get_rollup_rows([(article,analysis)]))
 
-    """
 
-    new_id=-1
+def _get_rollup_query(condition):
+    """Build the query aggregating the articles matching condition(on entryinfo NATURAL JOIN sentiment) into daily sentiment rollup
+       rows(ticker, day, negative_count, neutral_count, positive_count, negative_prob_sum, positive_prob_sum), the SQL counterpart of
+       bulk_writer.get_rollup_rows. Articles stamped exactly at midnight also count towards the previous day(see bulk_writer.get_rollup_days).
+       The probabilities are summed in double precision as they are read back from column sentiment_prob(real), i.e through their text."""
+    return "SELECT ticker, day, " \
+           "COUNT(*) FILTER (WHERE overall_sent='negative'), COUNT(*) FILTER (WHERE overall_sent='neutral'), " \
+           "COUNT(*) FILTER (WHERE overall_sent='positive'), " \
+           "COALESCE(SUM(sentiment_prob[1]::text::double precision) FILTER (WHERE overall_sent='negative'),0), " \
+           "COALESCE(SUM(sentiment_prob[3]::text::double precision) FILTER (WHERE overall_sent='positive'),0) " \
+           "FROM (SELECT ticker, date_time::date AS day, overall_sent, sentiment_prob FROM entryinfo NATURAL JOIN sentiment WHERE {0} " \
+           "UNION ALL SELECT ticker, date_time::date - 1, overall_sent, sentiment_prob FROM entryinfo NATURAL JOIN sentiment " \
+           "WHERE date_time = date_time::date AND {0}) AS articles GROUP BY ticker, day".format(condition)
+
+
+def _remove_daily_sentiment(cursor,entry_ids):
+    """A function that takes articles out of the daily sentiment rollup of their tickers before they are deleted from the database,
+       the counterpart of _update_daily_sentiment. Rollup rows left without articles are deleted. The function does not commit.
+
+       Params:
+       cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+       entry_ids: list - The entryid of each article.
+
+       Returns:
+       None
+       """
+    cursor.execute("UPDATE daily_ticker_sentiment AS rollup SET negative_count=rollup.negative_count-articles.negative_count, "
+                   "neutral_count=rollup.neutral_count-articles.neutral_count, positive_count=rollup.positive_count-articles.positive_count, "
+                   "negative_prob_sum=rollup.negative_prob_sum-articles.negative_prob_sum, "
+                   "positive_prob_sum=rollup.positive_prob_sum-articles.positive_prob_sum "
+                   "FROM ({}) AS articles (ticker,day,negative_count,neutral_count,positive_count,negative_prob_sum,positive_prob_sum) "
+                   "WHERE rollup.ticker=articles.ticker AND rollup.day=articles.day".format(_get_rollup_query('entryid = ANY(%(ids)s)')),
+                   {'ids': list(entry_ids)})
+    cursor.execute("DELETE FROM daily_ticker_sentiment WHERE negative_count=0 AND neutral_count=0 AND positive_count=0")
+
+
+def backfill_daily_sentiment(connection,cursor):
+    """A function that rebuilds the daily sentiment rollup(see _update_daily_sentiment) from all articles in the database. It is
+       used once for the articles inserted before the rollup existed, or to repair the rollup. The rows match the ones built as the
+       articles are inserted(see _get_rollup_query).
+
+       Params:
+       connection: psycopg2.extensions.connection - The established connection to the database.
+       cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+
+       Returns:
+       boolean: True if the rollup was rebuilt. False otherwise.
+       """
+    backfill_statement = "INSERT INTO daily_ticker_sentiment (ticker,day,negative_count,neutral_count,positive_count,negative_prob_sum,positive_prob_sum) " \
+                         + _get_rollup_query('TRUE')
     try:
-        query = "SELECT MAX(entryid) FROM entryinfo"
-        cursor.execute(query)
-        last_id=cursor.fetchone()[0]
-        new_id=last_id+1
+        # The rollup is replaced in a single transaction, hence the read endpoints never see it partially rebuilt
+        cursor.execute('DELETE FROM daily_ticker_sentiment')
+        cursor.execute(backfill_statement)
+        connection.commit()
+        print('BACKFILLED {} TICKER DAYS'.format(cursor.rowcount))
+    except (Exception, Error) as error:
+        print('Something went wrong....', error)
+        connection.rollback()
+        return False
+
+    return True
+
+def get_stored_analyses(cursor,urls):
+    """A function that retrieves the analyses of articles already written to the database.
+
+       Params:
+       cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands
+       urls: list - The article urls
+
+       Returns:
+       analyses: dict - url : the analysis of the article(see article_analysis.analyse_article)
+       """
+    cursor.execute("SELECT url,overall_sent,sentiment_prob,phrases,words,sentiment_class "
+                   "FROM entryinfo NATURAL JOIN sentiment NATURAL JOIN keyphrases NATURAL JOIN polaritywords WHERE url = ANY(%s)",
+                   (list(urls),))
+    return {url: {'overall_sentiment': overall_sent, 'sentiment_prob': sentiment_prob, 'keyphrases': phrases,
+                  'polarity_words': words, 'polarity_sentiment': sentiment_class}
+            for url, overall_sent, sentiment_prob, phrases, words, sentiment_class in cursor.fetchall()}
+
+
+def advance_watermarks(listings,failed_urls):
+    """A function that moves the high-water marks of the tickers over the articles scraped by an update. The articles that were written
+       or found in the database are covered, the mark of a ticker stopping short of its oldest article that could not be downloaded,
+       analysed or written(see news_scrapers.advance_watermark).
+
+       Params:
+       listings: dict - ticker : (the stored high-water mark, the scraped (headline, url, timestamp) tuples)(see _scrape_articles).
+       failed_urls: set - The urls of the articles that could not be ingested.
+
+       Returns:
+       watermarks: dict - ticker : news_scrapers.Watermark(see save_watermarks). Tickers whose mark did not move are left out.
+       """
+    watermarks = {}
+    for ticker, (stored, news) in listings.items():
+        # The scrapers return None timestamps for rows they cannot parse, an unnoticed format change would stop incremental updates
+        if all(timestamp is None for _,_,timestamp in news):
+            print('The high-water mark of {} cannot move, none of its {} articles has a parsable timestamp....'.format(ticker,len(news)))
+            continue
+        watermark = news_scrapers.advance_watermark(stored,news,failed_urls)
+        if watermark is not None and watermark != stored:
+            watermarks[ticker] = watermark
+    return watermarks
+
+
+def get_watermarks(cursor):
+    """A function that retrieves the high-water mark of every ticker, i.e the newest article ingested for it(see news_scrapers.Watermark).
+
+       Params:
+       cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands
+
+       Returns:
+       watermarks: dict - ticker : news_scrapers.Watermark
+       """
+    cursor.execute("SELECT ticker,last_seen,urls FROM ticker_watermarks")
+    return {ticker: news_scrapers.Watermark(last_seen, frozenset(urls)) for ticker, last_seen, urls in cursor.fetchall()}
+
+
+def save_watermarks(connection,cursor,watermarks):
+    """A function that stores the high-water marks reached by an update.
+
+       Params:
+       connection: psycopg2.extensions.connection - The established connection to the database.
+       cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands
+       watermarks: dict - ticker : news_scrapers.Watermark
+
+       Returns:
+       None
+       """
+    if not watermarks:
+        return
+    try:
+        execute_values(cursor, 'INSERT INTO ticker_watermarks (ticker,last_seen,urls) VALUES %s ON CONFLICT (ticker) DO UPDATE '
+                               'SET last_seen=EXCLUDED.last_seen, urls=EXCLUDED.urls',
+                       [(ticker, watermark.last_seen, sorted(watermark.urls)) for ticker, watermark in watermarks.items()])
+        connection.commit()
     except (Exception, Error) as error:
-        print("Something went wrong....",error)
+        connection.rollback()
+        print('Something went wrong when saving the high-water marks....', error)
 
-    return int(new_id)
 
 def _is_duplicate(cursor,url):
     """A function that checks whether a duplicate insertion is being attempted. Since column url in table entryinfo has a unique constraint,
@@ -221,8 +636,7 @@ def _is_duplicate(cursor,url):
 
        """
     try:
-        query="SELECT url FROM entryinfo WHERE url={}".format("'"+url+"'")
-        cursor.execute(query)
+        cursor.execute("SELECT url FROM entryinfo WHERE url=%s", (url,))
         response=cursor.fetchone()
 
         # If no entry with the given url exists, the response returns None
@@ -0,0 +1,194 @@
+import argparse
+import datetime
+from psycopg2 import Error
+
+# The versioned schema migrations. Each migration is applied once, in its own transaction, and recorded in table schema_migrations.
+# Every statement is idempotent, so databases created from relations_def.sql before the migrations existed can be migrated too.
+MIGRATIONS=[
+    (1, 'initial schema', [
+        '''CREATE TABLE IF NOT EXISTS entryinfo(
+           entryid int primary key,
+           ticker varchar(5) not null,
+           headline varchar not null,
+           date_time timestamp not null,
+           url varchar unique not null)''',
+        '''CREATE TABLE IF NOT EXISTS polaritywords(
+           entryid int references entryinfo(entryid),
+           words text[] not null,
+           sentiment_class text[] not null)''',
+        '''CREATE TABLE IF NOT EXISTS sentiment(
+           entryid int references entryinfo(entryid),
+           overall_sent varchar not null,
+           sentiment_prob real[] not null)''',
+        '''CREATE TABLE IF NOT EXISTS keyphrases(
+           entryid int references entryinfo(entryid),
+           phrases text[] not null)''',
+        '''CREATE TABLE IF NOT EXISTS tickerinfo(
+           id int not null unique,
+           ticker varchar(5) primary key,
+           name varchar not null,
+           image_url varchar not null)''',
+        '''CREATE TABLE IF NOT EXISTS daily_ticker_sentiment(
+           ticker varchar(5) not null,
+           day date not null,
+           negative_count int not null default 0,
+           neutral_count int not null default 0,
+           positive_count int not null default 0,
+           negative_prob_sum double precision not null default 0,
+           positive_prob_sum double precision not null default 0,
+           primary key (ticker, day))''',
+    ]),
+    (2, 'entryinfo indexes', [
+        # Every query of db_queries filters the articles of a ticker on a given day
+        'CREATE INDEX IF NOT EXISTS entryinfo_ticker_date_time_idx ON entryinfo (ticker, date_time)',
+        # The duplicate check of db_updates looks up urls. Tables created with the unique constraint already have such an index.
+        '''DO $$ BEGIN
+           IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE tablename='entryinfo' AND indexdef LIKE 'CREATE UNIQUE INDEX % (url)') THEN
+               CREATE UNIQUE INDEX entryinfo_url_idx ON entryinfo (url);
+           END IF;
+           END $$''',
+    ]),
+    (3, 'entryid foreign keys', [
+        '''DO $$ DECLARE child text;
+           BEGIN
+           FOREACH child IN ARRAY ARRAY['sentiment','keyphrases','polaritywords'] LOOP
+               IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE contype='f' AND conrelid=child::regclass
+                              AND confrelid='entryinfo'::regclass) THEN
+                   EXECUTE format('ALTER TABLE %I ADD FOREIGN KEY (entryid) REFERENCES entryinfo(entryid)', child);
+               END IF;
+           END LOOP;
+           END $$''',
+        # PostgreSQL does not index the referencing columns, which are used by every NATURAL JOIN with entryinfo
+        'CREATE INDEX IF NOT EXISTS sentiment_entryid_idx ON sentiment (entryid)',
+        'CREATE INDEX IF NOT EXISTS keyphrases_entryid_idx ON keyphrases (entryid)',
+        'CREATE INDEX IF NOT EXISTS polaritywords_entryid_idx ON polaritywords (entryid)',
+    ]),
+    (4, 'entryid identity', [
+        # Entry ids are allocated by the database, starting after the highest id inserted before the migration
+        '''DO $$ BEGIN
+           IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name='entryinfo' AND column_name='entryid'
+                          AND is_identity='YES') THEN
+               ALTER TABLE entryinfo ALTER COLUMN entryid ADD GENERATED BY DEFAULT AS IDENTITY;
+               PERFORM setval(pg_get_serial_sequence('entryinfo','entryid'), COALESCE((SELECT MAX(entryid) FROM entryinfo),0)+1, false);
+           END IF;
+           END $$''',
+    ]),
+    (5, 'ticker watermarks', [
+        # The newest article ingested for each ticker(see db_updates.get_watermarks)
+        '''CREATE TABLE IF NOT EXISTS ticker_watermarks(
+           ticker varchar(5) primary key,
+           last_seen timestamp not null,
+           urls text[] not null)''',
+    ]),
+]
+
+# The queries on the hot paths of the API and the database update, and the table each of them must access through an index.
+HOT_QUERIES={
+    'articles of a ticker on a day': ("SELECT headline,url,overall_sent FROM entryinfo NATURAL JOIN sentiment "
+                                      "WHERE ticker=%s AND date_time BETWEEN %s AND %s",
+                                      ('TSLA', datetime.date(2021, 9, 3), datetime.date(2021, 9, 4)), 'entryinfo'),
+    'duplicate url': ("SELECT url FROM entryinfo WHERE url=%s", ('https://example.com',), 'entryinfo'),
+    'known urls': ("SELECT url FROM entryinfo WHERE url = ANY(%s)", (['https://example.com', 'https://example.org'],), 'entryinfo'),
+    'sentiment of an entry': ("SELECT overall_sent FROM sentiment WHERE entryid=%s", (1,), 'sentiment'),
+    'daily sentiment rollup': ("SELECT negative_count FROM daily_ticker_sentiment WHERE ticker = ANY(%s) AND day=%s",
+                               (['TSLA'], datetime.date(2021, 9, 3)), 'daily_ticker_sentiment'),
+}
+
+
+def get_schema_version(cursor):
+    """A function that retrieves the version of the last migration applied to the database.
+
+       Params:
+       cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+
+       Returns:
+       version: int - The version of the last migration applied, 0 if none was applied.
+       """
+    cursor.execute('CREATE TABLE IF NOT EXISTS schema_migrations(version int primary key, name varchar not null, '
+                   'applied_at timestamp not null default now())')
+    cursor.execute('SELECT COALESCE(MAX(version),0) FROM schema_migrations')
+    return cursor.fetchone()[0]
+
+
+def migrate(connection,cursor,target=None):
+    """A function that applies the migrations that were not applied to the database yet, in order of version. Each migration
+       is committed together with its record in table schema_migrations, hence an interrupted run can be safely repeated.
+
+       Params:
+       connection: psycopg2.extensions.connection - The established connection to the database.
+       cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+       target: int - The version to migrate to. Defaults to the latest version.
+
+       Returns:
+       version: int - The version of the database after migrating.
+       """
+    version = get_schema_version(cursor)
+    connection.commit()
+
+    for migration_version, name, statements in MIGRATIONS:
+        if migration_version <= version or (target is not None and migration_version > target):
+            continue
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute('INSERT INTO schema_migrations (version, name) VALUES (%s,%s)', (migration_version, name))
+            connection.commit()
+            print('APPLIED MIGRATION {}: {}'.format(migration_version, name))
+            version = migration_version
+        except (Exception, Error) as error:
+            print('Something went wrong when applying migration {}....'.format(migration_version), error)
+            connection.rollback()
+            break
+
+    return version
+
+
+def _get_index_scans(plan, relation=None):
+    """Get the (table, index) pairs of all index scans in an EXPLAIN (FORMAT JSON) plan node and its children. Bitmap index scans
+       do not name their table, which is the one of the parent bitmap heap scan."""
+    relation = plan.get('Relation Name', relation)
+    scans = []
+    if 'Index Name' in plan:
+        scans.append((relation, plan['Index Name']))
+    for child in plan.get('Plans', []):
+        scans.extend(_get_index_scans(child, relation))
+    return scans
+
+
+def check_indexes(cursor):
+    """A function that checks whether the hot queries(see HOT_QUERIES) can be answered through the indexes of the schema by
+       inspecting their EXPLAIN plans. Sequential scans are disabled while planning, otherwise PostgreSQL rightly prefers them
+       on small tables and the check would depend on the amount of data rather than on the indexes that exist.
+
+       Params:
+       cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+
+       Returns:
+       results: dict - query name : list of the indexes used to access its table, empty if the table is scanned sequentially.
+       """
+    results = {}
+    cursor.execute('SET enable_seqscan = off')
+    try:
+        for name, (query, params, table) in HOT_QUERIES.items():
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + query, params)
+            plan = cursor.fetchone()[0][0]['Plan']
+            results[name] = [index for relation, index in _get_index_scans(plan) if relation == table]
+    finally:
+        cursor.execute('RESET enable_seqscan')
+
+    return results
+
+
+if __name__ == '__main__':
+    from db_operations import db_pool
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--target', type=int, default=None, help='The version to migrate to. Defaults to the latest version.')
+    parser.add_argument('--check', action='store_true', help='Check that the hot queries use the indexes after migrating.')
+    args = parser.parse_args()
+
+    with db_pool.checkout() as (connection, cursor):
+        print('SCHEMA VERSION: {}'.format(migrate(connection, cursor, args.target)))
+        if args.check:
+            for name, indexes in check_indexes(cursor).items():
+                print('{:<32} {}'.format(name, ', '.join(indexes) if indexes else 'SEQUENTIAL SCAN'))
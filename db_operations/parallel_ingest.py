@@ -0,0 +1,254 @@
+import os
+import time
+import queue
+import multiprocessing
+import torch
+from utilities import article_analysis, inference_queue, model_registry, content_fingerprint
+from db_operations import db_updates, db_pool, bulk_writer
+
+# The number of worker processes analysing and writing the articles
+NUM_WORKERS=max(1, min(4, (os.cpu_count() or 1) // 2))
+
+# The number of articles waiting in the work queue per worker. The scrapers block once the queue is full.
+QUEUE_SIZE_PER_WORKER=64
+
+# The number of seconds the coordinator waits between checks that the workers are still alive
+POLL_INTERVAL=1.0
+
+
+def _next_batch(tasks, batch_size, max_wait, timeout=None):
+    """A function that takes the next batch of articles from the work queue. It blocks until an article arrives, then collects articles
+       until the batch holds batch_size articles or max_wait seconds have elapsed.
+
+       Params:
+       tasks: multiprocessing.Queue/queue.Queue - The work queue. None marks the end of the work.
+       batch_size: int - The maximum number of articles in a batch.
+       max_wait: float - The maximum number of seconds the first article of a batch waits for more articles.
+       timeout: float - The maximum number of seconds to wait for the first article, None to wait until one arrives.
+
+       Returns:
+       batch: list - The articles(see db_updates._build_entry). Empty if no article arrived within timeout seconds.
+       done: boolean - Whether the end of the work was reached.
+       """
+    try:
+        first = tasks.get(timeout=timeout)
+    except queue.Empty:
+        return [], False
+    if first is None:
+        return [], True
+
+    batch = [first]
+    deadline = time.time() + max_wait
+    while len(batch) < batch_size:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        try:
+            article = tasks.get(timeout=remaining)
+        except queue.Empty:
+            break
+        if article is None:
+            return batch, True
+        batch.append(article)
+
+    return batch, False
+
+
+def _analyse_batch(worker_id, batch):
+    """A function that analyses a batch of articles. If the batch fails, each article is analysed on its own so that one article that
+       cannot be analysed does not fail the whole batch(see inference_queue.InferenceQueue).
+
+       Params:
+       worker_id: int - The worker analysing the batch.
+       batch: list - The articles(see db_updates._build_entry).
+
+       Returns:
+       analyses: list - The analysis of each article(see article_analysis.analyse_article). None for the articles that could not be analysed.
+       """
+    try:
+        return article_analysis.analyse_articles([article['text'] for article in batch])
+    except Exception as error:
+        print('Worker {}: something went wrong when analysing a batch of {} articles, analysing them one by one....'.format(
+            worker_id, len(batch)), error)
+
+    analyses = []
+    for article in batch:
+        try:
+            analyses.append(article_analysis.analyse_article(article['text']))
+        except Exception as error:
+            print('Worker {}: something went wrong when analysing {}....'.format(worker_id, article['url']), error)
+            analyses.append(None)
+    return analyses
+
+
+def _run_worker(worker_id, tasks, results, batch_size, max_wait, write_batch_size, flush_interval, num_threads):
+    """The entry point of a worker process. The worker loads its own model instance and checks out its own pooled connection, then
+       analyses the articles of the work queue in batches and writes them with a bulk writer until the end of the work is reached.
+       While the queue is empty the writer is polled every POLL_INTERVAL seconds, hence flush_interval holds for partial batches. Its summary,
+       including the urls of the articles it could not analyse or write, is put on the results queue(see ingest)."""
+    # Each worker gets an equal share of the cores rather than every worker using all of them
+    torch.set_num_threads(num_threads)
+    db_pool.configure(min_connections=1, max_connections=1)
+
+    # Load the model before the clock starts, so that the throughput only measures the processing of articles
+    model_registry.get_backend()
+    start = time.time()
+
+    articles = 0
+    failed = 0
+    failed_urls = set()
+    done = False
+    with db_pool.checkout() as (connection, cursor):
+        writer = bulk_writer.BulkWriter(connection, cursor, write_batch_size, flush_interval)
+        while not done:
+            batch, done = _next_batch(tasks, batch_size, max_wait, timeout=POLL_INTERVAL)
+            if not batch:
+                writer.flush_if_due()
+                continue
+            for article, analysis in zip(batch, _analyse_batch(worker_id, batch)):
+                if analysis is None:
+                    failed += 1
+                    failed_urls.add(article['url'])
+                else:
+                    writer.add(article, analysis)
+            articles += len(batch)
+        writer.close()
+
+    elapsed = time.time() - start
+    stats = writer.stats()
+    results.put({'worker': worker_id, 'articles': articles, 'failed_analysis': failed, 'written': stats['written'],
+                 'duplicates': stats['duplicates'], 'failed_writes': stats['failed'], 'failed_urls': failed_urls | writer.failed_urls,
+                 'elapsed': elapsed,
+                 'articles_per_second': articles / elapsed if elapsed > 0 else 0.0})
+
+
+def _put(tasks, item, workers):
+    """Put an item on the work queue, failing instead of blocking forever if all workers died."""
+    while True:
+        try:
+            tasks.put(item, timeout=POLL_INTERVAL)
+            return
+        except queue.Full:
+            if not any(worker.is_alive() for worker in workers):
+                raise RuntimeError('All ingestion workers exited before the work was done.')
+
+
+def ingest(num_workers=NUM_WORKERS, batch_size=inference_queue.MAX_BATCH_SIZE, max_wait=inference_queue.MAX_WAIT,
+           write_batch_size=bulk_writer.BATCH_SIZE, flush_interval=bulk_writer.FLUSH_INTERVAL, incremental=True):
+    """A function that updates the database like db_updates.update_db with a pool of worker processes. The articles of all tickers are
+       scraped and downloaded by the calling process(see db_updates._scrape_articles) and put on a single article-level work queue, from
+       which every worker takes its next batch as soon as it is free. Hence a ticker with many articles(e.g TSLA) is spread over all
+       workers instead of keeping one of them busy while the others are idle. Each worker owns a model instance and a pooled connection.
+       The workers keep their key phrase embeddings in memory only, the disk tier of the embedding cache cannot be shared by processes.
+       The high-water marks of the tickers are only moved forward if every worker finished its work, and not past the articles that could
+       not be analysed or written(see db_updates.advance_watermarks). Copies of a story that was already
+       put on the queue(see content_fingerprint) are not analysed, their entries are written from the stored analysis of the story once
+       the workers are done(see _write_copies).
+
+       Params:
+       num_workers: int - The number of worker processes.
+       batch_size: int - The maximum number of articles a worker analyses in a single batch.
+       max_wait: float - The maximum number of seconds a worker waits for its batch to fill up.
+       write_batch_size: int - The number of articles a worker writes to the database in a single transaction.
+       flush_interval: float - The number of seconds after which a worker writes a partial batch(see bulk_writer.BulkWriter.flush_if_due).
+       incremental: boolean - Whether to skip the articles older than the high-water marks of the tickers.
+
+       Returns:
+       summaries: list - A dictionary for each worker containing keys: worker, articles, failed_analysis, written, duplicates,
+                         failed_writes, failed_urls, elapsed and articles_per_second.
+       """
+    # Forked processes would inherit the torch thread pools and the connections of the parent, hence the workers are spawned
+    context = multiprocessing.get_context('spawn')
+    tasks = context.Queue(maxsize=num_workers * QUEUE_SIZE_PER_WORKER)
+    results = context.Queue()
+    num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+
+    workers = [context.Process(target=_run_worker, args=(worker_id, tasks, results, batch_size, max_wait, write_batch_size,
+                                                         flush_interval, num_threads), daemon=True)
+               for worker_id in range(num_workers)]
+    for worker in workers:
+        worker.start()
+
+    submitted = 0
+    listings = {}
+    failed_urls = set()
+    fingerprints = content_fingerprint.FingerprintIndex()
+    # (article, url of the original story) tuples
+    copies = []
+    try:
+        with db_pool.checkout() as (connection, cursor):
+            for article in db_updates._scrape_articles(cursor, listings, failed_urls, incremental):
+                original = fingerprints.find(article['text'])
+                if original is not None:
+                    copies.append((article, original))
+                    continue
+                fingerprints.add(article['text'], article['url'])
+                _put(tasks, article, workers)
+                submitted += 1
+    finally:
+        # One end of work marker per worker. If all workers died the markers cannot be taken, the error is reported rather than
+        # raised so that it does not hide an exception raised while scraping.
+        try:
+            for _ in workers:
+                _put(tasks, None, workers)
+        except RuntimeError as error:
+            print(error)
+    print('SUBMITTED {} ARTICLES TO {} WORKERS'.format(submitted, num_workers))
+    print('FINGERPRINTS: {}'.format(fingerprints.stats()))
+
+    summaries = []
+    while len(summaries) < num_workers:
+        try:
+            summaries.append(results.get(timeout=POLL_INTERVAL))
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers) and results.empty():
+                print('{} ingestion workers exited without a summary'.format(num_workers - len(summaries)))
+                break
+
+    for worker in workers:
+        worker.join()
+
+    for summary in summaries:
+        failed_urls |= summary['failed_urls']
+
+    with db_pool.checkout() as (connection, cursor):
+        failed_urls |= _write_copies(connection, cursor, copies, write_batch_size)
+        if len(summaries) == num_workers:
+            db_updates.save_watermarks(connection, cursor, db_updates.advance_watermarks(listings, failed_urls))
+
+    return sorted(summaries, key=lambda summary: summary['worker'])
+
+
+def _write_copies(connection, cursor, copies, write_batch_size):
+    """Write the entries of the copies of stories analysed by the workers, reusing the analyses stored by the workers. Copies of a
+       story that could not be analysed or written are skipped. Returns the urls of the copies that were not written."""
+    if not copies:
+        return set()
+
+    failed_urls = set()
+    analyses = db_updates.get_stored_analyses(cursor, {original for _, original in copies})
+    with bulk_writer.BulkWriter(connection, cursor, write_batch_size, float('inf')) as writer:
+        for article, original in copies:
+            if original in analyses:
+                writer.add(article, analyses[original])
+            else:
+                failed_urls.add(article['url'])
+    print('COPIES: {}'.format(writer.stats()))
+    return failed_urls | writer.failed_urls
+
+
+def print_summary(summaries, elapsed):
+    """A function that prints the throughput of each worker and of the whole ingestion.
+
+       Params:
+       summaries: list - The worker summaries(see ingest).
+       elapsed: float - The number of seconds the ingestion took.
+
+       Returns:
+       None
+       """
+    for summary in summaries:
+        print('WORKER {worker}: {articles} articles in {elapsed:.1f}s({articles_per_second:.2f} articles/s), {written} written, '
+              '{duplicates} duplicates, {failed_analysis} failed analyses, {failed_writes} failed writes'.format(**summary))
+    articles = sum(summary['articles'] for summary in summaries)
+    print('TOTAL: {} articles in {:.1f}s({:.2f} articles/s)'.format(articles, elapsed, articles / elapsed if elapsed > 0 else 0.0))
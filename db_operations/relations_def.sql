@@ -1,5 +1,5 @@
 create table entryinfo(
-entryid int primary key,
+entryid int generated by default as identity primary key,
 ticker varchar(5) not null,
 headline varchar not null,
 date_time timestamp not null,
@@ -28,4 +28,26 @@ id int not null unique,
 ticker varchar(5) primary key,
 name varchar not null,
 image_url varchar not null
-);
\ No newline at end of file
+);
+
+create table daily_ticker_sentiment(
+ticker varchar(5) not null,
+day date not null,
+negative_count int not null default 0,
+neutral_count int not null default 0,
+positive_count int not null default 0,
+negative_prob_sum double precision not null default 0,
+positive_prob_sum double precision not null default 0,
+primary key (ticker, day)
+);
+
+create table ticker_watermarks(
+ticker varchar(5) primary key,
+last_seen timestamp not null,
+urls text[] not null
+);
+
+create index entryinfo_ticker_date_time_idx on entryinfo (ticker, date_time);
+create index sentiment_entryid_idx on sentiment (entryid);
+create index keyphrases_entryid_idx on keyphrases (entryid);
+create index polaritywords_entryid_idx on polaritywords (entryid);
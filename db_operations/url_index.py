@@ -0,0 +1,141 @@
+import math
+import hashlib
+
+# The false positive rate of the Bloom filter at full capacity
+ERROR_RATE=0.01
+
+# The filter is sized for twice the number of urls in the database, so that it keeps its error rate as articles are inserted
+GROWTH_FACTOR=2
+MIN_CAPACITY=10000
+
+# The number of urls streamed from the database at a time when the index is loaded
+LOAD_BATCH_SIZE=10000
+
+
+class BloomFilter:
+    """A Bloom filter over strings. Membership checks never miss a string that was added, but may report a string that was not added
+       with probability error_rate once capacity strings were added. The bit array takes about 1.2 bytes per string at a 1% error rate,
+       hence all historical urls fit in memory.
+    """
+
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        """Params:
+           capacity: int - The number of strings the filter is sized for.
+           error_rate: float - The false positive rate once capacity strings were added.
+        """
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._count = 0
+
+    def _positions(self, item):
+        """Get the bit positions of a string(double hashing over one 128 bit digest)."""
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.num_bits for index in range(self.num_hashes)]
+
+    def add(self, item):
+        """A function that adds a string to the filter."""
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self._count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def __len__(self):
+        return self._count
+
+
+def get_known_urls(cursor, urls):
+    """A function that checks which of the given urls are in table entryinfo with a single query.
+
+       Params:
+       cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+       urls: list - The article urls.
+
+       Returns:
+       known_urls: set - The urls in the database.
+       """
+    if not urls:
+        return set()
+    cursor.execute("SELECT url FROM entryinfo WHERE url = ANY(%s)", (list(urls),))
+    return {row[0] for row in cursor.fetchall()}
+
+
+class UrlIndex:
+    """An in-memory index of the urls in the database, loaded once per update(see load). Candidate urls are checked against a Bloom
+       filter without a round trip to the database. Only the urls the filter reports as present, i.e the duplicates and the rare false
+       positives, are checked exactly with a single query(see get_known_urls). Urls are added to the index as they are ingested.
+    """
+
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        """Params:
+           capacity: int - The number of urls the filter is sized for.
+           error_rate: float - The false positive rate once capacity urls were added.
+        """
+        self.bloom = BloomFilter(capacity, error_rate)
+
+        self.checked = 0
+        self.filtered = 0
+        self.duplicates = 0
+        self.false_positives = 0
+
+    @classmethod
+    def load(cls, cursor, error_rate=ERROR_RATE):
+        """A function that builds the index from all urls in table entryinfo. The urls are streamed through a server-side cursor
+           rather than fetched at once.
+
+           Params:
+           cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+           error_rate: float - The false positive rate of the Bloom filter at full capacity.
+
+           Returns:
+           index: UrlIndex - The loaded index.
+           """
+        cursor.execute("SELECT COUNT(*) FROM entryinfo")
+        index = cls(max(MIN_CAPACITY, cursor.fetchone()[0] * GROWTH_FACTOR), error_rate)
+
+        with cursor.connection.cursor(name='url_index_load') as stream:
+            stream.itersize = LOAD_BATCH_SIZE
+            stream.execute("SELECT url FROM entryinfo")
+            for (url,) in stream:
+                index.bloom.add(url)
+
+        return index
+
+    def add(self, url):
+        """A function that adds an ingested url to the index."""
+        self.bloom.add(url)
+
+    def filter_known(self, cursor, urls):
+        """A function that finds which of the given urls are already in the database.
+
+           Params:
+           cursor: psycopg2.extensions.cursor - A cursor allowing for python code to execute PostgreSQL commands.
+           urls: list - The candidate article urls.
+
+           Returns:
+           known_urls: set - The urls already in the database.
+           """
+        candidates = [url for url in urls if url in self.bloom]
+        known_urls = get_known_urls(cursor, candidates)
+
+        self.checked += len(urls)
+        self.filtered += len(urls) - len(candidates)
+        self.duplicates += len(known_urls)
+        self.false_positives += len(candidates) - len(known_urls)
+        return known_urls
+
+    def stats(self):
+        """A function that retrieves the index metrics.
+
+           Params: None
+
+           Returns:
+           stats: dict - The number of urls indexed and checked, the number of urls cleared by the Bloom filter alone, the number of
+                         duplicates found and the number of false positives of the filter.
+           """
+        return {'indexed': len(self.bloom), 'checked': self.checked, 'filtered': self.filtered, 'duplicates': self.duplicates,
+                'false_positives': self.false_positives}
@@ -1,10 +1,18 @@
+import os
 import unittest
+import datetime
+import time
+import queue
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from psycopg2 import Error
 import numpy as np
+import pandas as pd
 import requests
 from newspaper import fulltext
-from utilities import key_phrases,sentiment_analysis,polarity_words,news_scrapers
-from db_operations import db_updates
+from utilities import key_phrases,sentiment_analysis,polarity_words,news_scrapers,model_registry,article_analysis,encoder,inference_queue,http_fetcher,content_fingerprint,http_cache
+from db_operations import db_updates, db_pool, db_queries, migrations, bulk_writer, parallel_ingest, url_index
 from transformers import BertTokenizer
 
 
@@ -18,6 +26,8 @@ def clean_up(id):
     queries = [clean_up1, clean_up2, clean_up3, clean_up4]
     try:
         connection, cursor = db_updates.connect_to_db()
+        # Remove the example entry from the daily sentiment rollup before it is deleted
+        db_updates._remove_daily_sentiment(cursor, [id])
         for query in queries:
             cursor.execute(query)
     except (Exception, Error) as error:
@@ -27,6 +37,60 @@ def clean_up(id):
         cursor.close()
         connection.close()
 
+class StandInHandler(BaseHTTPRequestHandler):
+    """A local stand-in for the news websites used by the fetch layer tests. /slow responds after 0.2 seconds, /flaky fails with
+       503 twice before responding, /hang responds after 2 seconds and /etag answers 304 to requests revalidating its ETag.
+       The number of requests in progress and the number of requests of each path are recorded."""
+    lock = threading.Lock()
+    in_progress = 0
+    max_in_progress = 0
+    flaky_requests = 0
+    requests_by_path = {}
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.in_progress += 1
+            cls.max_in_progress = max(cls.max_in_progress, cls.in_progress)
+            cls.requests_by_path[self.path] = cls.requests_by_path.get(self.path, 0) + 1
+        try:
+            status = 200
+            if self.path == '/etag' and self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            if self.path == '/slow':
+                time.sleep(0.2)
+            elif self.path == '/hang':
+                time.sleep(2)
+            elif self.path == '/flaky':
+                with cls.lock:
+                    cls.flaky_requests += 1
+                    status = 503 if cls.flaky_requests <= 2 else 200
+            self.send_response(status)
+            self.send_header('Content-Length', '2')
+            if self.path == '/etag':
+                self.send_header('ETag', '"v1"')
+            self.end_headers()
+            self.wfile.write(b'ok')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up waiting
+            pass
+        finally:
+            with cls.lock:
+                cls.in_progress -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in():
+    """A function that starts the local stand-in website on a free port and returns the server and its base url."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
 # A class containing all tests
 class Tests(unittest.TestCase):
     # The test texts that will be used
@@ -220,7 +284,7 @@ class Tests(unittest.TestCase):
             cursor.execute(data_query)
             response = cursor.fetchall()
             # Check whether data in table entryinfo is correctly inserted
-            self.assertTrue(new_id==last_id+1 and response[0][1]=="BTC" and response[0][4]==article_url)
+            self.assertTrue(new_id>last_id and response[0][1]=="BTC" and response[0][4]==article_url)
             # Check whether data in table sentiment is correctly inserted
             self.assertTrue(response[0][6]=='positive' and response[0][6].index(max(response[0][6]))==2)
             # Check whether keyphrases were inserted
@@ -235,15 +299,522 @@ class Tests(unittest.TestCase):
             connection.close()
             clean_up(new_id)
 
+    def test_shared_model(self):
+        """System loads the BERT model only once and shares the same instance between sentiment analysis and key phrase extraction."""
+        sentiment_analysis.get_sentiment(self.example_text)
+        key_phrases._get_doc_rep(self.example_text)
+        self.assertTrue(model_registry.is_model_loaded(), "The model was not loaded on first use")
+        self.assertTrue(model_registry.get_model() is model_registry.get_model(), "More than one model instance was loaded")
+
+    def test_batched_candidate_reps(self):
+        """System produces the same candidate embeddings when candidates are embedded in padded batches as when each
+           candidate is ran through the model on its own."""
+        candidates = key_phrases._get_candidates(self.example_text, (3, 3))[:40]
+        batched_reps = key_phrases._get_candidate_reps(candidates, batch_size=16, use_cache=False)
+        single_reps = key_phrases._get_candidate_reps(candidates, batch_size=1, use_cache=False)
+        for batched_rep, single_rep in zip(batched_reps, single_reps):
+            self.assertTrue(np.allclose(batched_rep, single_rep, atol=1e-4), "Batched embeddings differ from the per-candidate ones")
+
+    def test_vectorized_similarity(self):
+        """System selects the same key phrases with the vectorized cosine similarity and top-n selection as with
+           per-candidate cosine similarities and a full sort."""
+        from sklearn.metrics.pairwise import cosine_similarity
+
+        candidates = key_phrases._get_candidates(self.example_text, (3, 3))
+        candidate_reps = key_phrases._get_candidate_reps(candidates)
+        doc_rep = key_phrases._get_doc_rep(self.example_text)
+
+        similarities = key_phrases._get_cosine_similarity(doc_rep, key_phrases._get_embedding_matrix(candidate_reps))
+        expected = np.array([cosine_similarity(doc_rep, rep).squeeze() for rep in candidate_reps])
+        self.assertTrue(np.allclose(similarities, expected, atol=1e-5), "Cosine similarities differ from sklearn's")
+        self.assertTrue(list(key_phrases._get_top_indexes(similarities, 7)) == list(np.argsort(expected)[-7:]),
+                        "The top key phrases differ from the ones obtained by a full sort")
+
+    def test_embedding_cache(self):
+        """System serves repeated candidate embeddings from the embedding cache, both from memory and from disk in a later run."""
+        import tempfile
+        from utilities import embedding_cache
+
+        candidates = list(key_phrases._get_candidates(self.example_text, (3, 3))[:20])
+        with tempfile.TemporaryDirectory() as disk_dir:
+            cache = embedding_cache.configure(max_entries=10, disk_dir=disk_dir)
+            first_reps = key_phrases._get_candidate_reps(candidates)
+            self.assertTrue(cache.misses == len(candidates) and cache.hits == 0)
+            cache.flush()
+
+            # A new cache on the same directory behaves like a later run
+            cache = embedding_cache.configure(max_entries=10, disk_dir=disk_dir)
+            second_reps = key_phrases._get_candidate_reps(candidates)
+            self.assertTrue(cache.hits == len(candidates) and cache.disk_hits == len(candidates), "Embeddings were not served from disk")
+            for first_rep, second_rep in zip(first_reps, second_reps):
+                self.assertTrue(np.array_equal(first_rep, second_rep))
+        embedding_cache.configure()
+
+    def test_single_pass_analysis(self):
+        """System obtains the same sentiment and key phrases from the single forward pass of article_analysis as from
+           running sentiment analysis and key phrase extraction separately."""
+        analysis = article_analysis.analyse_article(self.example_text)
+        overall_sentiment, class_probabilities = sentiment_analysis.get_sentiment(self.example_text)
+        self.assertTrue(analysis['overall_sentiment'] == overall_sentiment and np.allclose(analysis['sentiment_prob'], class_probabilities))
+        self.assertTrue(analysis['keyphrases'] == key_phrases.get_keyphrases(self.example_text, (3, 3), 7))
+
+    def test_dynamic_padding(self):
+        """System produces the same model outputs when length-bucketed batches are padded to their longest paragraph
+           as when every paragraph is padded to the maximum token length."""
+        documents = [key_phrases._get_paragraphs(text) for text in self.texts]
+        dynamic_outputs = encoder.encode_documents(documents, dynamic_padding=True)
+        max_length_outputs = encoder.encode_documents(documents, dynamic_padding=False)
+        for dynamic_output, max_length_output in zip(dynamic_outputs, max_length_outputs):
+            self.assertTrue(np.allclose(dynamic_output[0], max_length_output[0], atol=1e-4), "Logits differ after dynamic padding")
+            self.assertTrue(np.allclose(dynamic_output[1], max_length_output[1], atol=1e-4), "[CLS] embeddings differ after dynamic padding")
+
+    def test_inference_queue(self):
+        """System resolves every article submitted to the inference queue with the same analysis as when the article is analysed on its own."""
+        with inference_queue.InferenceQueue(max_batch_size=2, max_wait=0.1) as analysis_queue:
+            futures = [analysis_queue.submit(text) for text in self.texts]
+        for text, future in zip(self.texts, futures):
+            analysis = article_analysis.analyse_article(text)
+            self.assertTrue(future.result()['overall_sentiment'] == analysis['overall_sentiment'] and
+                            future.result()['keyphrases'] == analysis['keyphrases'], "Batched analysis differs from the per-article one")
+
+    def test_quantized_backend(self):
+        """System's int8 quantized backend classifies paragraphs consistently with the PyTorch fp32 backend and produces outputs of the same shape."""
+        paragraphs = key_phrases._get_paragraphs(self.long_text)
+        logits, cls_embeddings = encoder.encode_paragraphs(paragraphs, backend='torch')
+        quantized_logits, quantized_cls_embeddings = encoder.encode_paragraphs(paragraphs, backend='torch_int8')
+        self.assertTrue(quantized_logits.shape == logits.shape and quantized_cls_embeddings.shape == cls_embeddings.shape)
+        agreement = np.mean(np.argmax(quantized_logits, axis=1) == np.argmax(logits, axis=1))
+        self.assertTrue(agreement >= 0.9, "The quantized backend disagrees with the fp32 backend")
+
+    def test_compiled_lexicon(self):
+        """System retrieves the same polarity words and sentiment from the compiled lexicon as the previous dataframe lookup,
+           including negated positive and negative words."""
+        from benchmarks.polarity_benchmark import _dataframe_sentiment_scores
+
+        example_sentence = "Analysts do not have a bullish prognosis for Tesla in the long-run, however, its short-term potential is still favorable. " \
+                           "Sales were not strong, not good and not weak."
+        tokens = polarity_words._neg_marking(example_sentence)
 
+        words, sentiment = polarity_words.get_sentiment_scores(tokens, polarity_words.lexicon_index)
+        self.assertTrue((words, sentiment) == _dataframe_sentiment_scores(tokens, polarity_words.lexicon))
+        self.assertTrue((words, sentiment) == polarity_words.get_sentiment_scores(tokens, polarity_words.lexicon))
+        self.assertTrue({'not bullish', 'not strong', 'not good', 'not weak'} <= set(words))
 
+    def test_streaming_negation_marking(self):
+        """System's streaming negation marking tags the same tokens as the list based one and the batch API matches the per-article one."""
+        example_sentence = "Analysts do not have a bullish prognosis for Tesla in the long-run, however, its short-term potential is still favorable"
+        marked_tokens = list(polarity_words._iter_neg_marking(example_sentence))
+        self.assertTrue(marked_tokens[5] == ('bullish', True) and marked_tokens[20] == ('favorable', False))
+        self.assertTrue([token for token, negated in marked_tokens if negated] == ['have', 'a', 'bullish'])
 
+        self.assertTrue(polarity_words.get_polarity_words_batch(self.texts) ==
+                        [polarity_words.get_polarity_words(text) for text in self.texts])
 
+    def test_connection_pool(self):
+        """System reuses pooled connections, blocks checkouts beyond the maximum pool size and reports the pool utilization."""
+        pool = db_pool.ConnectionPool(min_connections=1, max_connections=2, timeout=0.5)
+        try:
+            with pool.connection() as (connection, cursor):
+                cursor.execute("SELECT 1")
+                first_connection = connection
+            with pool.connection() as (connection, cursor):
+                self.assertTrue(connection is first_connection, "The idle connection was not reused")
+                with pool.connection():
+                    self.assertTrue(pool.stats()['utilization'] == 1)
+                    with self.assertRaises(db_pool.PoolTimeoutError):
+                        with pool.connection():
+                            pass
+            stats = pool.stats()
+            self.assertTrue(stats['in_use'] == 0 and stats['checkouts'] == 3 and stats['peak_utilization'] == 1)
+        finally:
+            pool.close()
 
+    def test_sentiment_aggregates(self):
+        """System's daily sentiment rollup gives the same counts and scores as aggregating the articles of the day one by one."""
+        connection, cursor = db_updates.connect_to_db()
+        try:
+            cursor.execute("SELECT ticker, date_time FROM entryinfo ORDER BY entryid DESC LIMIT 1")
+            ticker, date = cursor.fetchone()
 
+            counts = db_queries.get_count_stats(ticker, date)
+            pos_neg_scalars, _ = db_queries.get_sentiment_stats(ticker, date)
 
+            query = "SELECT overall_sent, sentiment_prob FROM entryinfo NATURAL JOIN sentiment WHERE ticker=%s AND date_time BETWEEN %s AND %s"
+            cursor.execute(query, (ticker, date.date(), date.date() + datetime.timedelta(days=1)))
+            response = cursor.fetchall()
 
+            self.assertTrue(counts == [sum(1 for item in response if item[0] == sent) for sent in ['negative', 'neutral', 'positive']])
+            negative_probs = [item[1][0] for item in response if item[0] == 'negative']
+            positive_probs = [item[1][2] for item in response if item[0] == 'positive']
+            self.assertAlmostEqual(pos_neg_scalars[0], np.mean(negative_probs) if negative_probs else 0, places=12)
+            self.assertAlmostEqual(pos_neg_scalars[1], np.mean(positive_probs) if positive_probs else 0, places=12)
+        finally:
+            cursor.close()
+            connection.close()
 
+    def test_historical_scores(self):
+        """System's range based historical scores match the sentiment score of each day retrieved separately."""
+        try:
+            connection, cursor = db_updates.connect_to_db()
+            cursor.execute("SELECT ticker, date_time FROM entryinfo ORDER BY entryid DESC LIMIT 1")
+            ticker, date = cursor.fetchone()
+        finally:
+            cursor.close()
+            connection.close()
 
+        period = 7
+        scores = db_queries.get_historical_scores(ticker, date, period)
+        daily_scores = [db_queries.get_sentiment_stats(ticker, date - datetime.timedelta(days=time_unit))[1] for time_unit in range(period)][::-1]
+        self.assertTrue(len(scores) == period)
+        self.assertTrue(scores == daily_scores)
+
+    def test_multi_ticker_scores(self):
+        """System's multi-ticker sentiment scores are identical to the scores retrieved for each ticker separately."""
+        tickers = db_updates.TICKER_CLASSES['stock_tickers'] + db_updates.TICKER_CLASSES['crypto_tickers']
+        date = datetime.datetime.now()
+        scores = db_queries.get_sentiment_scores(tickers, date)
+        self.assertTrue(list(scores.keys()) == tickers)
+        for ticker in tickers:
+            self.assertTrue(scores[ticker] == db_queries.get_sentiment_stats(ticker, date)[1], "Score mismatch for {}".format(ticker))
+
+        # The original per-ticker formula: the mean class probabilities of the articles between the day and the next midnight
+        connection, cursor = db_updates.connect_to_db()
+        try:
+            for ticker in tickers:
+                probs = {}
+                for sent, column in [('negative', 0), ('positive', 2)]:
+                    cursor.execute("SELECT sentiment_prob FROM entryinfo NATURAL JOIN sentiment WHERE overall_sent=%s AND ticker=%s "
+                                   "AND date_time BETWEEN %s AND %s", (sent, ticker, date.date(), date.date() + datetime.timedelta(days=1)))
+                    probs[sent] = [row[0][column] for row in cursor.fetchall()]
+                baseline = db_queries._get_sentiment_scalar(len(probs['negative']), np.mean(probs['negative']) if probs['negative'] else 0,
+                                                            len(probs['positive']), np.mean(probs['positive']) if probs['positive'] else 0)
+                # The rollup only sums the probabilities in a different order than np.mean
+                self.assertAlmostEqual(scores[ticker], baseline, places=9, msg="Score of {} deviates from the original formula".format(ticker))
+        finally:
+            cursor.close()
+            connection.close()
 
+    def test_rollup_day_boundary(self):
+        """System counts an article stamped exactly at midnight towards both days, like the per day queries the rollup replaced."""
+        try:
+            connection, cursor = db_updates.connect_to_db()
+            for table in ['entryinfo', 'sentiment', 'keyphrases', 'polaritywords', 'daily_ticker_sentiment']:
+                cursor.execute('CREATE TEMPORARY TABLE {0} (LIKE public.{0} INCLUDING ALL)'.format(table))
+            connection.commit()
+
+            analysis = {'overall_sentiment': 'negative', 'sentiment_prob': [0.7, 0.2, 0.1], 'keyphrases': ['key phrase'],
+                        'polarity_words': ['weak'], 'polarity_sentiment': ['negative']}
+            day = datetime.datetime(2021, 9, 3)
+            times = [day + datetime.timedelta(hours=10), day + datetime.timedelta(days=1), day + datetime.timedelta(days=1, seconds=1)]
+            with bulk_writer.BulkWriter(connection, cursor) as writer:
+                for index, timestamp in enumerate(times):
+                    writer.add({'headline': 'Headline', 'ticker': 'TSLA', 'url': 'https://example.com/{}'.format(index), 'time': timestamp},
+                               analysis)
+
+            cursor.execute('SELECT day, negative_count FROM daily_ticker_sentiment ORDER BY day')
+            rollup = cursor.fetchall()
+            for rollup_day, count in rollup:
+                cursor.execute("SELECT COUNT(*) FROM entryinfo WHERE date_time BETWEEN %s AND %s",
+                               (rollup_day, rollup_day + datetime.timedelta(days=1)))
+                self.assertEqual(cursor.fetchone()[0], count)
+            self.assertEqual(rollup, [(day.date(), 2), (day.date() + datetime.timedelta(days=1), 2)])
+        finally:
+            connection.rollback()
+            cursor.close()
+            connection.close()
+
+    def test_rollup_backfill(self):
+        """System's backfilled rollup matches the rollup built as articles are inserted, also once an article is taken out of it."""
+        def get_rollup():
+            cursor.execute('SELECT ticker, day, negative_count, neutral_count, positive_count, negative_prob_sum, positive_prob_sum '
+                           'FROM daily_ticker_sentiment ORDER BY ticker, day')
+            return cursor.fetchall()
+
+        def assert_rollups_match(rollup, other):
+            self.assertEqual([row[:5] for row in rollup], [row[:5] for row in other])
+            for row, other_row in zip(rollup, other):
+                self.assertAlmostEqual(row[5], other_row[5], places=12)
+                self.assertAlmostEqual(row[6], other_row[6], places=12)
+
+        try:
+            connection, cursor = db_updates.connect_to_db()
+            for table in ['entryinfo', 'sentiment', 'keyphrases', 'polaritywords', 'daily_ticker_sentiment']:
+                cursor.execute('CREATE TEMPORARY TABLE {0} (LIKE public.{0} INCLUDING ALL)'.format(table))
+            connection.commit()
+
+            random_state = np.random.RandomState(0)
+            day = datetime.datetime(2021, 9, 3)
+            with bulk_writer.BulkWriter(connection, cursor, batch_size=7) as writer:
+                for index in range(40):
+                    probs = random_state.dirichlet([1, 1, 1]).tolist()
+                    analysis = {'overall_sentiment': ['negative', 'neutral', 'positive'][int(np.argmax(probs))], 'sentiment_prob': probs,
+                                'keyphrases': ['key phrase'], 'polarity_words': ['weak'], 'polarity_sentiment': ['negative']}
+                    timestamp = day + datetime.timedelta(hours=index * 3) if index % 10 else day + datetime.timedelta(days=index // 10)
+                    writer.add({'headline': 'Headline', 'ticker': ['TSLA', 'AMZN'][index % 2], 'url': 'https://example.com/{}'.format(index),
+                                'time': timestamp}, analysis)
+            incremental = get_rollup()
+            self.assertTrue(db_updates.backfill_daily_sentiment(connection, cursor))
+            assert_rollups_match(incremental, get_rollup())
+
+            # Deleting the articles of a whole day, including the one at the next midnight, takes the day out of the rollup
+            cursor.execute("SELECT entryid FROM entryinfo WHERE date_time BETWEEN %s AND %s", (day, day + datetime.timedelta(days=1)))
+            entry_ids = [row[0] for row in cursor.fetchall()]
+            db_updates._remove_daily_sentiment(cursor, entry_ids)
+            for table in ['sentiment', 'keyphrases', 'polaritywords', 'entryinfo']:
+                cursor.execute('DELETE FROM {} WHERE entryid = ANY(%s)'.format(table), (entry_ids,))
+            connection.commit()
+            removed = get_rollup()
+            self.assertTrue(db_updates.backfill_daily_sentiment(connection, cursor))
+            assert_rollups_match(removed, get_rollup())
+            self.assertFalse(any(row[1] <= day.date() for row in removed))
+        finally:
+            connection.rollback()
+            cursor.close()
+            connection.close()
+
+    def test_schema_indexes(self):
+        """System's schema is migrated to the latest version and the hot queries are answered through indexes."""
+        try:
+            connection, cursor = db_updates.connect_to_db()
+            self.assertTrue(migrations.migrate(connection, cursor) == migrations.MIGRATIONS[-1][0])
+            for name, indexes in migrations.check_indexes(cursor).items():
+                self.assertTrue(len(indexes) > 0, "{} does not use an index".format(name))
+        finally:
+            connection.rollback()
+            cursor.close()
+            connection.close()
+
+    def test_bulk_writer(self):
+        """System writes a batch of articles in one transaction, skips duplicates and isolates an article that cannot be inserted."""
+        try:
+            connection, cursor = db_updates.connect_to_db()
+            # Temporary copies of the tables shadow the real ones for this connection only
+            for table in ['entryinfo', 'sentiment', 'keyphrases', 'polaritywords', 'daily_ticker_sentiment']:
+                cursor.execute('CREATE TEMPORARY TABLE {0} (LIKE public.{0} INCLUDING ALL)'.format(table))
+            connection.commit()
+
+            analysis = {'overall_sentiment': 'positive', 'sentiment_prob': [0.1, 0.2, 0.7], 'keyphrases': ['key phrase'],
+                        'polarity_words': ['good'], 'polarity_sentiment': ['positive']}
+            articles = [{'headline': 'Headline {}'.format(index), 'ticker': 'TSLA', 'url': 'https://example.com/{}'.format(index),
+                         'time': datetime.datetime.now()} for index in range(5)]
+            # A duplicate url and an article violating the not null constraint of column headline
+            articles += [dict(articles[0]), dict(articles[1], headline=None, url='https://example.com/bad')]
+
+            with bulk_writer.BulkWriter(connection, cursor, batch_size=len(articles)) as writer:
+                for article in articles:
+                    writer.add(article, analysis)
+
+            cursor.execute('SELECT COUNT(*) FROM entryinfo NATURAL JOIN sentiment NATURAL JOIN keyphrases NATURAL JOIN polaritywords')
+            self.assertTrue(cursor.fetchone()[0] == 5)
+            cursor.execute('SELECT positive_count FROM daily_ticker_sentiment')
+            self.assertTrue(cursor.fetchone()[0] == 5)
+            self.assertTrue(writer.stats()['written'] == 5 and writer.stats()['failed'] == 1)
+            # The duplicate is counted once although the batch was retried article by article
+            self.assertEqual(writer.stats()['duplicates'], 1)
+
+            # A batch failing after its entries were inserted(an invalid sentiment probability) does not count its duplicates twice
+            with bulk_writer.BulkWriter(connection, cursor, batch_size=2) as retry_writer:
+                retry_writer.add(articles[2], analysis)
+                retry_writer.add(dict(articles[2], url='https://example.com/invalid'), dict(analysis, sentiment_prob=['invalid']))
+            self.assertTrue(retry_writer.stats()['duplicates'] == 1 and retry_writer.stats()['failed'] == 1)
+            self.assertEqual(writer.failed_urls, {'https://example.com/bad'})
+
+            # A partial batch is written once polled after flush_interval seconds
+            writer = bulk_writer.BulkWriter(connection, cursor, batch_size=100, flush_interval=0.1)
+            writer.add(dict(articles[0], url='https://example.com/late'), analysis)
+            self.assertEqual(writer.flush_if_due(), 0)
+            time.sleep(0.1)
+            self.assertEqual(writer.flush_if_due(), 1)
+        finally:
+            connection.rollback()
+            cursor.close()
+            connection.close()
+
+    def test_single_fetch(self):
+        """System downloads and parses an article once and uses the same result for validation and analysis."""
+        fetched = db_updates._fetch_article(self.article_url)
+        self.assertTrue(fetched['status'] == 200 and len(fetched['html']) > 0)
+        self.assertTrue(db_updates._is_parsable(fetched) and fetched['body'] == fulltext(fetched['html']))
+
+    def test_fetcher_host_limits(self):
+        """System makes at most max_per_host concurrent requests to a host and spaces them by the politeness delay."""
+        server, base_url = start_stand_in()
+        StandInHandler.max_in_progress = 0
+        try:
+            with http_fetcher.Fetcher(max_workers=8, max_per_host=2, politeness_delay=0.05) as fetcher:
+                start = time.time()
+                futures = [fetcher.submit(fetcher.get, base_url + '/slow') for _ in range(6)]
+                statuses = [future.result().status_code for future in futures]
+                elapsed = time.time() - start
+            self.assertTrue(statuses == [200] * 6 and StandInHandler.max_in_progress == 2)
+            # Three rounds of two requests, rather than a single round of six
+            self.assertTrue(elapsed >= 0.6)
+        finally:
+            server.shutdown()
+
+    def test_fetcher_retries_and_timeouts(self):
+        """System retries failed requests with backoff and gives up on hosts that do not respond within the read timeout."""
+        server, base_url = start_stand_in()
+        StandInHandler.flaky_requests = 0
+        try:
+            with http_fetcher.Fetcher(politeness_delay=0, read_timeout=0.5, max_retries=2, backoff_factor=0.01) as fetcher:
+                self.assertEqual(fetcher.get(base_url + '/flaky').status_code, 200)
+                self.assertTrue(StandInHandler.flaky_requests == 3 and fetcher.stats()['retries'] == 2)
+                with self.assertRaises(requests.Timeout):
+                    fetcher.get(base_url + '/hang')
+            # Articles that cannot be downloaded are not parsable
+            self.assertFalse(db_updates._is_parsable(db_updates._fetch_article('http://127.0.0.1:1/article')))
+        finally:
+            server.shutdown()
+
+    def test_article_work_queue(self):
+        """System hands out articles in batches from a single work queue and stops at the end of work marker."""
+        tasks = queue.Queue()
+        for index in range(5):
+            tasks.put({'url': 'https://example.com/{}'.format(index), 'text': self.example_text})
+        tasks.put(None)
+        batch, done = parallel_ingest._next_batch(tasks, 3, 0.1)
+        self.assertTrue(len(batch) == 3 and not done)
+        batch, done = parallel_ingest._next_batch(tasks, 3, 0.1)
+        self.assertTrue([article['url'] for article in batch] == ['https://example.com/3', 'https://example.com/4'] and done)
+        # An empty queue yields an empty batch after the timeout, so that the worker can poll its writer
+        self.assertEqual(parallel_ingest._next_batch(tasks, 3, 0.1, timeout=0.1), ([], False))
+
+    def test_worker_batch_fallback(self):
+        """System analyses the articles of a failed batch one by one, so that only the article that cannot be analysed is dropped."""
+        batch = [{'url': 'https://example.com/0', 'text': self.example_text}, {'url': 'https://example.com/1', 'text': None}]
+        analyses = parallel_ingest._analyse_batch(0, batch)
+        self.assertTrue(analyses[0] == article_analysis.analyse_article(self.example_text) and analyses[1] is None)
+
+    def test_watermark_scraping(self):
+        """System stops walking the news table at the first article that was already ingested and moves the high-water mark forward."""
+        day = news_scrapers.current_date
+        rows = [day.strftime('%b-%d-%y') + ' 10:30AM', '10:15AM', '10:15AM', '09:00AM']
+        html = '<table id="news-table">' + ''.join(
+            '<tr><td>{}</td><td><a href="https://example.com/{}">Tesla headline {}</a></td></tr>'.format(row, index, index)
+            for index, row in enumerate(rows)) + '</table>'
+        self.assertEqual(len(news_scrapers._parse_news_table(html, 'TSLA')), 4)
+
+        seen = datetime.datetime.combine(day.date(), datetime.time(10, 15))
+        watermark = news_scrapers.Watermark(seen, frozenset(['https://example.com/2']))
+        articles = news_scrapers._parse_news_table(html, 'TSLA', watermark)
+        self.assertEqual([url for _, url, _ in articles], ['https://example.com/0', 'https://example.com/1'])
+
+        watermark = news_scrapers.advance_watermark(watermark, articles)
+        self.assertTrue(watermark.last_seen == seen.replace(minute=30) and watermark.urls == {'https://example.com/0'})
+        self.assertEqual(news_scrapers._parse_news_table(html, 'TSLA', watermark), [])
+
+    def test_watermark_today_rows(self):
+        """System parses the timestamps of news tables whose first row of the day is prefixed with 'Today' and moves the mark over them."""
+        rows = ['Today 10:30AM', '10:15AM', '09:00AM']
+        html = '<table id="news-table">' + ''.join(
+            '<tr><td>{}</td><td><a href="https://example.com/{}">Tesla headline {}</a></td></tr>'.format(row, index, index)
+            for index, row in enumerate(rows)) + '</table>'
+        articles = news_scrapers._parse_news_table(html, 'TSLA')
+        day = news_scrapers.current_date.date()
+        self.assertEqual([timestamp for _, _, timestamp in articles],
+                         [datetime.datetime.combine(day, datetime.time(hour, minute)) for hour, minute in [(10, 30), (10, 15), (9, 0)]])
+
+        watermark = db_updates.advance_watermarks({'TSLA': (None, articles)}, set())['TSLA']
+        self.assertEqual(news_scrapers._parse_news_table(html, 'TSLA', watermark), [])
+
+    def test_watermark_failed_download(self):
+        """System does not move the high-water mark past an article whose download failed, hence the next update scrapes it again."""
+        day = news_scrapers.current_date
+        rows = [day.strftime('%b-%d-%y') + ' 10:30AM', '10:15AM', '09:00AM']
+        urls = ['https://example.com/0', 'http://127.0.0.1:1/article', 'https://example.com/2']
+        html = '<table id="news-table">' + ''.join(
+            '<tr><td>{}</td><td><a href="{}">Tesla headline {}</a></td></tr>'.format(row, url, index)
+            for index, (row, url) in enumerate(zip(rows, urls))) + '</table>'
+        news = news_scrapers._parse_news_table(html, 'TSLA')
+
+        failed_urls = set()
+        downloads = [('Tesla headline 1', 'TSLA', urls[1], http_fetcher.get_fetcher().submit(db_updates._fetch_article, urls[1]))]
+        articles, _ = db_updates._collect_downloaded(downloads, failed_urls, wait=True)
+        self.assertTrue(articles == [] and failed_urls == {urls[1]})
+
+        # The mark stops at the article published before the failed one
+        watermark = db_updates.advance_watermarks({'TSLA': (None, news)}, failed_urls)['TSLA']
+        self.assertTrue(watermark.last_seen == datetime.datetime.combine(day.date(), datetime.time(9)) and watermark.urls == {urls[2]})
+        self.assertEqual([url for _, url, _ in news_scrapers._parse_news_table(html, 'TSLA', watermark)], urls[:2])
+
+        # Once the article is ingested the mark moves past all articles
+        watermark = db_updates.advance_watermarks({'TSLA': (watermark, news)}, set())['TSLA']
+        self.assertEqual(news_scrapers._parse_news_table(html, 'TSLA', watermark), [])
+
+    def test_bloom_filter(self):
+        """System never misses a url added to the Bloom filter and keeps its false positive rate close to the configured one."""
+        bloom = url_index.BloomFilter(1000, 0.01)
+        added = ['https://example.com/article/{}'.format(index) for index in range(1000)]
+        for url in added:
+            bloom.add(url)
+        self.assertTrue(all(url in bloom for url in added))
+        false_positives = sum('https://example.org/article/{}'.format(index) in bloom for index in range(10000))
+        self.assertLess(false_positives / 10000, 0.02)
+
+    def test_url_index(self):
+        """System finds the urls already in the database through the url index and checks the candidates of the filter exactly."""
+        connection, cursor = db_updates.connect_to_db()
+        try:
+            cursor.execute("SELECT url FROM entryinfo LIMIT 10")
+            known = [row[0] for row in cursor.fetchall()]
+            index = url_index.UrlIndex.load(cursor)
+            new = ['https://example.com/not-ingested/{}'.format(index) for index in range(100)]
+            self.assertEqual(index.filter_known(cursor, known + new), set(known))
+            self.assertFalse(db_updates._is_duplicate(cursor, "https://example.com/it's-not-ingested"))
+            index.add(new[0])
+            self.assertTrue(new[0] in index.bloom and index.filter_known(cursor, new[:1]) == set())
+        finally:
+            cursor.close()
+            connection.close()
+
+    def test_content_fingerprint(self):
+        """System recognises exact and near-duplicate copies of an article and tells different articles apart."""
+        # Fixed article-length texts(about 1000 words) built from the dataset, near-duplicate recall being low for short texts
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'project_datasets', 'bert_dataset.csv')
+        sentences = list(pd.read_csv(path, index_col=0).headlines)
+        text, other_text = ' '.join(sentences[:30]), ' '.join(sentences[30:60])
+
+        index = content_fingerprint.FingerprintIndex()
+        index.add(text, 'original')
+
+        # The same story with different whitespace and case, and with a changed word and an added footer
+        self.assertEqual(index.find('  ' + text.upper()), 'original')
+        self.assertEqual(index.find(text.replace(' the ', ' a ', 1) + ' Reporting by a news agency.'), 'original')
+        self.assertIsNone(index.find(other_text))
+        self.assertTrue(index.stats() == {'indexed': 1, 'exact_matches': 1, 'near_matches': 1})
+
+    def test_http_cache(self):
+        """System serves fresh responses from the cache, revalidates stale ones, evicts beyond its size and replays offline."""
+        server, base_url = start_stand_in()
+        StandInHandler.requests_by_path = {}
+        try:
+            with tempfile.TemporaryDirectory() as cache_dir:
+                cache = http_cache.HttpCache(cache_dir, ttl=60)
+                with http_fetcher.Fetcher(politeness_delay=0, cache=cache) as fetcher:
+                    for _ in range(3):
+                        self.assertEqual(fetcher.get(base_url + '/slow').text, 'ok')
+                    self.assertTrue(StandInHandler.requests_by_path['/slow'] == 1 and cache.hits == 2)
+                    # A request with a shorter ttl, e.g a news listing, is not served a response older than its ttl
+                    time.sleep(0.1)
+                    fetcher.get(base_url + '/slow', ttl=0.05)
+                    self.assertTrue(StandInHandler.requests_by_path['/slow'] == 2 and cache.hits == 2)
+
+                    # Stale responses with an ETag are renewed by a 304 answer
+                    cache.ttl = 0
+                    fetcher.get(base_url + '/etag')
+                    self.assertEqual(fetcher.get(base_url + '/etag').content, b'ok')
+                    self.assertTrue(StandInHandler.requests_by_path['/etag'] == 2 and cache.revalidated == 1)
+
+                server.shutdown()
+                with http_fetcher.Fetcher(cache=http_cache.HttpCache(cache_dir, offline=True)) as fetcher:
+                    self.assertEqual(fetcher.get(base_url + '/slow').status_code, 200)
+                    with self.assertRaises(http_cache.CacheMissError):
+                        fetcher.get(base_url + '/flaky')
+
+                cache = http_cache.HttpCache(cache_dir, max_size=1)
+                cache.store(base_url + '/other', cache.lookup(base_url + '/slow')[0])
+                self.assertTrue(cache.evicted >= 2 and cache.lookup(base_url + '/etag')[0] is None)
+        finally:
+            server.shutdown()
 
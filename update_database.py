@@ -1,13 +1,46 @@
 import db_operations.db_updates
+from db_operations import db_pool, parallel_ingest
+from utilities import embedding_cache, http_cache
 import time
+import argparse
 
 if __name__ =="__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backfill-rollup', action='store_true',
+                        help='Rebuild the daily sentiment rollup from all articles in the database instead of updating it.')
+    parser.add_argument('--full', action='store_true',
+                        help='Scrape all articles of the day instead of only those newer than the high-water mark of each ticker.')
+    parser.add_argument('--http-cache', action='store_true',
+                        help='Store the scraped pages and articles on disk and reuse them on the next runs.')
+    parser.add_argument('--offline', action='store_true',
+                        help='Replay the pages and articles stored by --http-cache without any network access.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='The number of worker processes analysing and writing the articles. Defaults to a single process.')
+    args = parser.parse_args()
+
+    if args.backfill_rollup:
+        with db_pool.checkout() as (connection, cursor):
+            db_operations.db_updates.backfill_daily_sentiment(connection, cursor)
+        raise SystemExit
+
+    if args.http_cache or args.offline:
+        http_cache.configure(offline=args.offline)
+
     print("STARTING UPDATE")
     t0 = time.time()
-    connection, cursor = db_operations.db_updates.connect_to_db()
-    db_operations.db_updates.update_db(connection, cursor)
-    cursor.close()
-    connection.close()
+    if args.workers > 1:
+        # Each worker process analyses and writes the articles with its own model and connection
+        parallel_ingest.print_summary(parallel_ingest.ingest(args.workers, incremental=not args.full), time.time() - t0)
+    else:
+        # Persist the candidate key phrase embeddings between runs
+        cache = embedding_cache.configure(disk_dir=embedding_cache.DISK_CACHE_DIR)
+        with db_pool.checkout() as (connection, cursor):
+            db_operations.db_updates.update_db(connection, cursor, incremental=not args.full)
+        cache.flush()
+        print("EMBEDDING CACHE: {}".format(cache.stats()))
+    print("CONNECTION POOL: {}".format(db_pool.get_pool().stats()))
+    if http_cache.get_cache() is not None:
+        print("HTTP CACHE: {}".format(http_cache.get_cache().stats()))
     t1 = time.time() - t0
     print("FINISHED, IT TOOK {} minutes".format(t1 / 60))
 
@@ -0,0 +1,62 @@
+from utilities import sentiment_analysis, key_phrases, polarity_words, encoder
+
+# The n-gram range and the number of key phrases extracted from each article
+N_GRAM_RANGE=(3, 3)
+TOP_N_KEYPHRASES=7
+
+
+def analyse_article(text, n_gram_range=N_GRAM_RANGE, top_n_keyphrases=TOP_N_KEYPHRASES):
+    """A function that retrieves all information stored in the database for a single news article: its sentiment, key phrases
+       and polarity words. The article is split into topical paragraphs and ran through the model only once. Both the
+       classification logits used for the sentiment and the pooled [CLS] token embeddings used as the document representation
+       for key phrase extraction are taken from that single forward pass.
+
+       Params:
+       text: str - the document text(news article)
+       n_gram_range: tuple - what n-grams to consider when extracting key phrases(see key_phrases.get_keyphrases)
+       top_n_keyphrases: int - how many key phrases to extract
+
+       Returns:
+       analysis: dict - A dictionary containing keys: overall_sentiment, sentiment_prob, keyphrases, polarity_words and polarity_sentiment.
+       """
+    return analyse_articles([text], n_gram_range, top_n_keyphrases)[0]
+
+
+def analyse_articles(texts, n_gram_range=N_GRAM_RANGE, top_n_keyphrases=TOP_N_KEYPHRASES):
+    """A function that analyses many news articles at once(see analyse_article). The paragraphs of all articles are ran through
+       the model together(see encoder.encode_documents) and the key phrase candidates of all articles are embedded together, so that
+       the model sees large batches instead of one article at a time. Candidates shared by several articles are only embedded once.
+
+       Params:
+       texts: list - the document texts(news articles)
+       n_gram_range: tuple - what n-grams to consider when extracting key phrases(see key_phrases.get_keyphrases)
+       top_n_keyphrases: int - how many key phrases to extract
+
+       Returns:
+       analyses: list - A dictionary for each article(see analyse_article) in the order of texts.
+       """
+
+    #Split the documents in topical paragraphs and run them through the model once
+    documents = [sentiment_analysis._split_input(text) for text in texts]
+    outputs = encoder.encode_documents(documents)
+
+    #Embed the key phrase candidates of all articles together
+    candidates = [key_phrases._get_candidates(text, n_gram_range) for text in texts]
+    unique_candidates = list(dict.fromkeys(candidate for article_candidates in candidates for candidate in article_candidates))
+    candidate_reps = dict(zip(unique_candidates, key_phrases._get_candidate_reps(unique_candidates)))
+
+    polarity = polarity_words.get_polarity_words_batch(texts)
+
+    analyses = []
+    for (logits, cls_embeddings), article_candidates, (words, sentiment) in zip(outputs, candidates, polarity):
+        #Get the sentiment from the logits and the document representation from the [CLS] tokens
+        overall_sentiment, sentiment_prob = sentiment_analysis._get_prediction(logits)
+        doc_rep = key_phrases._pool_paragraph_reps(cls_embeddings)
+
+        phrases = key_phrases._select_keyphrases(article_candidates, [candidate_reps[candidate] for candidate in article_candidates],
+                                                 doc_rep, top_n_keyphrases)
+
+        analyses.append({'overall_sentiment': overall_sentiment, 'sentiment_prob': sentiment_prob, 'keyphrases': phrases,
+                         'polarity_words': words, 'polarity_sentiment': sentiment})
+
+    return analyses
@@ -0,0 +1,211 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from utilities import model_registry
+
+# The below will allow the script to be ran from different working directories
+dir = os.path.dirname(__file__)
+
+# The default directory of the on-disk tier. Each model checkpoint gets its own subdirectory.
+DISK_CACHE_DIR=os.path.join(dir, 'EmbeddingCache')
+
+# The maximum number of embeddings kept in memory. At 768 float32 dimensions an embedding takes 3KB, hence ~150MB at most.
+MAX_MEMORY_ENTRIES=50000
+
+# BERT embedding dimensions
+EMBEDDING_DIM=768
+
+# The names of the files making up the on-disk tier
+EMBEDDINGS_FILE='embeddings.f32'
+INDEX_FILE='index.json'
+
+# The cache shared by the process, created on first use by get_cache
+_cache=None
+
+
+class EmbeddingCache:
+    """A content-addressed cache of candidate key phrase embeddings. Entries are keyed by the candidate string and the hash of
+       the model checkpoint that produced them, so a new checkpoint never reads stale embeddings. The cache has two tiers:
+       a bounded in-memory tier evicting the least recently used entries and an optional on-disk tier that survives between runs.
+       The on-disk tier stores the embeddings as rows of a raw float32 file that is memory-mapped for reading, alongside a json
+       index mapping each key to its row. New embeddings are only written to disk when flush is called.
+    """
+
+    def __init__(self, model_hash, max_entries=MAX_MEMORY_ENTRIES, disk_dir=None):
+        """Params:
+           model_hash: str - The hash of the model checkpoint and backend (see model_registry.get_backend_hash).
+           max_entries: int - The maximum number of embeddings kept in the in-memory tier.
+           disk_dir: str - The directory of the on-disk tier. The on-disk tier is disabled if None.
+        """
+        self.model_hash = model_hash
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        self._memory = OrderedDict()
+
+        # The on-disk tier
+        self._disk_path = None
+        self._disk_index = {}
+        self._disk_rows = None
+        self._pending = OrderedDict()
+
+        if disk_dir is not None:
+            self._disk_path = os.path.join(disk_dir, model_hash[:16])
+            os.makedirs(self._disk_path, exist_ok=True)
+            self._load_disk_tier()
+
+    def _key(self, text):
+        """Get the content address of a candidate string for the current model checkpoint."""
+        return hashlib.sha1((self.model_hash + '\0' + text).encode('utf-8')).hexdigest()
+
+    def _load_disk_tier(self):
+        """Load the index of the on-disk tier and memory-map the embeddings written by previous runs."""
+        index_path = os.path.join(self._disk_path, INDEX_FILE)
+        embeddings_path = os.path.join(self._disk_path, EMBEDDINGS_FILE)
+
+        if not os.path.exists(index_path) or not os.path.exists(embeddings_path):
+            return
+
+        with open(index_path) as file:
+            index = json.load(file)
+
+        # Only the rows that were completely written are considered, in case a previous run was interrupted mid-write
+        num_rows = os.path.getsize(embeddings_path) // (EMBEDDING_DIM * 4)
+        self._disk_index = {key: row for key, row in index.items() if row < num_rows}
+
+        if num_rows > 0:
+            self._disk_rows = np.memmap(embeddings_path, dtype=np.float32, mode='r', shape=(num_rows, EMBEDDING_DIM))
+
+    def _remember(self, key, embedding):
+        """Add an embedding to the in-memory tier, evicting the least recently used entry if the tier is full."""
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, text):
+        """A function that looks up the embedding of a candidate, first in memory and then on disk.
+
+           Params:
+           text: str - The candidate key phrase.
+
+           Returns:
+           embedding: np.ndarray of shape (768,) - The cached embedding. None if the candidate is not cached.
+           """
+        key = self._key(text)
+
+        embedding = self._memory.get(key)
+        if embedding is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+        row = self._disk_index.get(key)
+        if row is not None:
+            # Copy the row out of the memory map and promote it to the in-memory tier
+            embedding = np.array(self._disk_rows[row])
+            self._remember(key, embedding)
+            self.hits += 1
+            self.disk_hits += 1
+            return embedding
+
+        self.misses += 1
+        return None
+
+    def put(self, text, embedding):
+        """A function that stores the embedding of a candidate. If the on-disk tier is enabled the embedding is also queued
+           to be written to disk on the next flush.
+
+           Params:
+           text: str - The candidate key phrase.
+           embedding: np.ndarray - The embedding of the candidate.
+
+           Returns:
+           None
+           """
+        key = self._key(text)
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        self._remember(key, embedding)
+
+        if self._disk_path is not None and key not in self._disk_index:
+            self._pending[key] = embedding
+
+    def flush(self):
+        """A function that appends the embeddings added since the last flush to the on-disk tier and rewrites its index.
+
+           Params: None
+
+           Returns:
+           None
+           """
+        if self._disk_path is None or len(self._pending) == 0:
+            return
+
+        index_path = os.path.join(self._disk_path, INDEX_FILE)
+        embeddings_path = os.path.join(self._disk_path, EMBEDDINGS_FILE)
+
+        # Rows are appended after the last complete row written so far
+        first_row = os.path.getsize(embeddings_path) // (EMBEDDING_DIM * 4) if os.path.exists(embeddings_path) else 0
+        with open(embeddings_path, 'ab') as file:
+            file.truncate(first_row * EMBEDDING_DIM * 4)
+            file.write(np.vstack(list(self._pending.values())).astype(np.float32).tobytes())
+
+        for row, key in enumerate(self._pending.keys(), start=first_row):
+            self._disk_index[key] = row
+        self._pending.clear()
+
+        # The index is replaced atomically so that an interrupted flush never leaves a corrupt index behind
+        with open(index_path + '.tmp', 'w') as file:
+            json.dump(self._disk_index, file)
+        os.replace(index_path + '.tmp', index_path)
+
+        num_rows = os.path.getsize(embeddings_path) // (EMBEDDING_DIM * 4)
+        self._disk_rows = np.memmap(embeddings_path, dtype=np.float32, mode='r', shape=(num_rows, EMBEDDING_DIM))
+
+    def stats(self):
+        """A function that reports the cache counters.
+
+           Params: None
+
+           Returns:
+           stats: dict - The number of hits, misses, hits served from disk, the hit rate and the number of entries in each tier.
+           """
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'disk_hits': self.disk_hits,
+                'hit_rate': self.hits / lookups if lookups > 0 else 0,
+                'memory_entries': len(self._memory), 'disk_entries': len(self._disk_index)}
+
+
+def configure(max_entries=MAX_MEMORY_ENTRIES, disk_dir=None):
+    """A function that (re)creates the cache shared by the process. Processes that want embeddings to persist between runs
+       (e.g update_database.py) pass a disk_dir, usually DISK_CACHE_DIR.
+
+       Params:
+       max_entries: int - The maximum number of embeddings kept in memory.
+       disk_dir: str - The directory of the on-disk tier. The on-disk tier is disabled if None.
+
+       Returns:
+       cache: EmbeddingCache - The new shared cache.
+       """
+    global _cache
+
+    _cache = EmbeddingCache(model_registry.get_backend_hash(), max_entries=max_entries, disk_dir=disk_dir)
+    return _cache
+
+
+def get_cache():
+    """A function that returns the cache shared by the process. If configure was not called, an in-memory only cache is created.
+
+       Params: None
+
+       Returns:
+       cache: EmbeddingCache - The shared cache.
+       """
+    if _cache is None:
+        return configure()
+    return _cache
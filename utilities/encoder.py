@@ -0,0 +1,97 @@
+import numpy as np
+from utilities import model_registry
+
+#The number of sentiment classes and BERT embedding dimensions
+NUM_LABELS=3
+EMBEDDING_DIM=768
+
+#BERT is limited to a 512 tokens input. A balance between being able to tokenize longer sequences and computational cost was struck at 300.
+MAX_TOKENS_LENGTH=300
+
+#The number of paragraphs passed to the model at once
+PARAGRAPH_BATCH_SIZE=16
+
+#Whether each batch is padded to its longest paragraph instead of MAX_TOKENS_LENGTH. Most paragraphs are much shorter than
+#MAX_TOKENS_LENGTH, so padding them all to it spends most of the computation on padding tokens.
+DYNAMIC_PADDING=True
+
+
+def encode_paragraphs(paragraphs, dynamic_padding=None, backend=None):
+    """A function that runs the paragraphs of a document(news article) through the model once and returns everything the
+       rest of the pipeline needs from that pass: the classification logits used by sentiment_analysis and the final hidden
+       state of the [CLS] token of each paragraph used by key_phrases as the paragraph representation.
+
+       Params:
+       paragraphs: list - the document split into topical paragraphs(see key_phrases._get_paragraphs)
+       dynamic_padding: boolean - whether to pad each batch to its longest paragraph. Defaults to DYNAMIC_PADDING.
+       backend: str - the inference backend to use(see model_registry.get_backend). Defaults to model_registry.BACKEND.
+
+       Returns:
+       logits: np.ndarray of shape (n,3) - the output logits for each paragraph
+       cls_embeddings: np.ndarray of shape (n,768) - the [CLS] token embedding for each paragraph
+       """
+    return encode_documents([paragraphs], dynamic_padding=dynamic_padding, backend=backend)[0]
+
+
+def encode_documents(documents, batch_size=None, dynamic_padding=None, backend=None):
+    """A function that runs the paragraphs of many documents through the model. The paragraphs of all documents are tokenized
+       together and sorted by their length, so that paragraphs of similar length end up in the same batch. Each batch is then padded to
+       its longest paragraph only. Since the attention mask excludes the padding tokens, the outputs are the same(up to floating point error)
+       as the ones obtained by padding every paragraph to MAX_TOKENS_LENGTH. The outputs are returned in the original order of the documents.
+
+       Params:
+       documents: list - a list of documents, each given as the list of its paragraphs
+       batch_size: int - how many paragraphs are passed to the model at once. Defaults to PARAGRAPH_BATCH_SIZE.
+       dynamic_padding: boolean - whether to pad each batch to its longest paragraph. If False, every paragraph is padded to MAX_TOKENS_LENGTH. Defaults to DYNAMIC_PADDING.
+       backend: str - the inference backend to use(see model_registry.get_backend). Defaults to model_registry.BACKEND.
+
+       Returns:
+       outputs: list - a (logits, cls_embeddings) tuple for each document(see encode_paragraphs)
+       """
+    if batch_size is None:
+        batch_size = PARAGRAPH_BATCH_SIZE
+    if dynamic_padding is None:
+        dynamic_padding = DYNAMIC_PADDING
+
+    paragraphs = [paragraph for document in documents for paragraph in document]
+    if len(paragraphs) == 0:
+        return [(np.empty((0, NUM_LABELS), dtype=np.float32), np.empty((0, EMBEDDING_DIM), dtype=np.float32)) for _ in documents]
+
+    model_backend = model_registry.get_backend(backend)
+    bert_tokenizer = model_registry.get_tokenizer()
+
+    #Tokenize all paragraphs without padding. Paragraphs are split to fit MAX_TOKENS_LENGTH, hence truncation never removes any text.
+    input_ids = bert_tokenizer(paragraphs, add_special_tokens=True, truncation=True, max_length=MAX_TOKENS_LENGTH)['input_ids']
+
+    #Group paragraphs of similar length by sorting them by their number of tokens
+    order = sorted(range(len(paragraphs)), key=lambda index: len(input_ids[index]))
+
+    logits = np.empty((len(paragraphs), NUM_LABELS), dtype=np.float32)
+    cls_embeddings = np.empty((len(paragraphs), EMBEDDING_DIM), dtype=np.float32)
+
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        batch_length = max(len(input_ids[index]) for index in batch) if dynamic_padding else MAX_TOKENS_LENGTH
+
+        #Pad the batch to batch_length and mask the padding tokens
+        batch_ids = np.full((len(batch), batch_length), bert_tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(batch), batch_length), dtype=np.int64)
+        for row, index in enumerate(batch):
+            batch_ids[row, :len(input_ids[index])] = input_ids[index]
+            attention_mask[row, :len(input_ids[index])] = 1
+
+        #Get the model output
+        batch_logits, last_hidden_state = model_backend.forward(batch_ids, attention_mask)
+
+        # The [CLS] token is the 0th token of each sequence in the last hidden state
+        logits[batch] = batch_logits
+        cls_embeddings[batch] = last_hidden_state[:, 0, :]
+
+    #Split the outputs back into the documents they belong to
+    outputs = []
+    start = 0
+    for document in documents:
+        outputs.append((logits[start:start + len(document)], cls_embeddings[start:start + len(document)]))
+        start += len(document)
+
+    return outputs
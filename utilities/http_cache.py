@@ -0,0 +1,237 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# The below will allow the script to be ran from different working directories
+dir = os.path.dirname(__file__)
+
+# The default directory of the cache
+CACHE_DIR=os.path.join(dir, 'HttpCache')
+
+# The number of seconds a stored article is served without contacting the server. Article bodies rarely change once published.
+TTL=24*60*60
+
+# The number of seconds a stored news listing(finviz page or news API response) is served without contacting the server. Listings gain
+# new articles throughout the day, hence they are only reused within a single update(see news_scrapers).
+LISTING_TTL=60
+
+# The maximum number of bytes the compressed responses take on disk. The least recently used responses are evicted beyond it.
+MAX_SIZE=500*1024*1024
+
+# Setting the below environment variable to a directory enables the cache in every process(e.g when running the tests)
+CACHE_ENV='NARATAI_HTTP_CACHE'
+
+# Setting the below environment variable to 1 replays the stored responses without any network access(see HttpCache)
+OFFLINE_ENV='NARATAI_HTTP_OFFLINE'
+
+# Only the below response headers are stored
+STORED_HEADERS=('Content-Type', 'ETag', 'Last-Modified')
+
+# The cache shared by the process, created by configure or on first use by get_cache if CACHE_ENV is set
+_cache=None
+_cache_lock=threading.Lock()
+
+
+class CacheMissError(requests.RequestException):
+    """Raised by an offline cache for a url that has no stored response."""
+
+
+class HttpCache:
+    """An on-disk cache of successful GET responses keyed by url, used by the fetch layer(see http_fetcher.Fetcher). Each response
+       is stored gzip-compressed in its own file. A stored response is served without contacting the server for ttl seconds(or the
+       ttl of the request, e.g LISTING_TTL for news listings), after which it is revalidated with If-None-Match/If-Modified-Since
+       when the server sent an ETag or Last-Modified header, a 304 Not Modified answer renewing it. Once the responses take more than max_size bytes the least recently used ones are evicted.
+       An offline cache serves the stored responses regardless of their age and never lets a request through, hence re-running
+       the pipeline over a recorded day, or the tests, replays exactly the same responses.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl=TTL, max_size=MAX_SIZE, offline=False):
+        """Params:
+           cache_dir: str - The directory of the cache.
+           ttl: float - The default number of seconds a stored response is served without contacting the server.
+           max_size: int - The maximum number of bytes the stored responses take on disk.
+           offline: boolean - Whether to only replay stored responses.
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evicted = 0
+
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(cache_dir) if entry.name.endswith('.gz'))
+
+    def _path(self, url):
+        """Get the file storing the response of a url."""
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.gz')
+
+    def _load(self, url):
+        """Read the stored (metadata, content) of a url, None if there is none or it cannot be read."""
+        try:
+            with gzip.open(self._path(url), 'rb') as file:
+                metadata = json.loads(file.readline())
+                content = file.read()
+        except (OSError, EOFError, ValueError):
+            return None
+        # Two urls with the same hash are not told apart by the file name
+        if metadata['url'] != url:
+            return None
+        return metadata, content
+
+    def _to_response(self, url, metadata, content):
+        """Build a requests.Response from a stored response."""
+        response = requests.Response()
+        response.status_code = metadata['status']
+        response.headers = CaseInsensitiveDict(metadata['headers'])
+        response.encoding = metadata['encoding']
+        response.url = url
+        response._content = content
+        return response
+
+    def lookup(self, url, ttl=None):
+        """A function that finds the stored response of a url.
+
+           Params:
+           url: str - The requested url.
+           ttl: float - The number of seconds the response is served without contacting the server. Defaults to the ttl of the cache.
+
+           Returns:
+           response: requests.Response - The stored response. None if there is none.
+           fresh: boolean - Whether the response can be served without contacting the server.
+           validators: dict - The conditional request headers revalidating the stored response.
+           """
+        stored = self._load(url)
+        if stored is None:
+            if self.offline:
+                raise CacheMissError('No response was recorded for {}'.format(url))
+            with self._lock:
+                self.misses += 1
+            return None, False, {}
+
+        metadata, content = stored
+        fresh = self.offline or time.time() - metadata['stored_at'] < (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if fresh:
+            # Mark the response as recently used for the eviction
+            try:
+                os.utime(self._path(url))
+            except OSError:
+                pass
+
+        validators = {}
+        if 'ETag' in metadata['headers']:
+            validators['If-None-Match'] = metadata['headers']['ETag']
+        if 'Last-Modified' in metadata['headers']:
+            validators['If-Modified-Since'] = metadata['headers']['Last-Modified']
+
+        return self._to_response(url, metadata, content), fresh, validators
+
+    def store(self, url, response, cached=None):
+        """A function that stores the response of a url.
+
+           Params:
+           url: str - The requested url.
+           response: requests.Response - The response of the server.
+           cached: requests.Response - The stored response that was revalidated, if any(see lookup).
+
+           Returns:
+           response: requests.Response - The response to use, the stored one if the server answered 304 Not Modified.
+           """
+        if response.status_code == 304 and cached is not None:
+            with self._lock:
+                self.revalidated += 1
+            response = cached
+        elif response.status_code != 200:
+            return response
+
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        metadata = {'url': url, 'status': response.status_code, 'headers': headers, 'encoding': response.encoding,
+                    'stored_at': time.time()}
+
+        path = self._path(url)
+        temporary_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        with gzip.open(temporary_path, 'wb') as file:
+            file.write(json.dumps(metadata).encode('utf-8') + b'\n')
+            file.write(response.content)
+
+        with self._lock:
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(temporary_path, path)
+            self._size += os.path.getsize(path) - previous_size
+            if self._size > self.max_size:
+                self._evict()
+
+        return response
+
+    def _evict(self):
+        """Delete the least recently used responses until they take at most 90% of max_size."""
+        entries = sorted((entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.gz')),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self._size <= self.max_size * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self._size -= size
+            self.evicted += 1
+
+    def stats(self):
+        """A function that retrieves the cache metrics.
+
+           Params: None
+
+           Returns:
+           stats: dict - The number of hits, misses, revalidated and evicted responses and the size of the cache in bytes.
+           """
+        return {'hits': self.hits, 'misses': self.misses, 'revalidated': self.revalidated, 'evicted': self.evicted, 'size': self._size}
+
+
+def configure(cache_dir=CACHE_DIR, ttl=TTL, max_size=MAX_SIZE, offline=False):
+    """A function that (re)creates the cache shared by the process.
+
+       Params:
+       cache_dir: str - The directory of the cache.
+       ttl: float - The number of seconds a stored response is served without contacting the server.
+       max_size: int - The maximum number of bytes the stored responses take on disk.
+       offline: boolean - Whether to only replay stored responses.
+
+       Returns:
+       cache: HttpCache - The shared cache.
+       """
+    global _cache
+    with _cache_lock:
+        _cache = HttpCache(cache_dir, ttl, max_size, offline)
+    return _cache
+
+
+def get_cache():
+    """A function that returns the cache shared by the process. The cache is optional: unless configure was called or CACHE_ENV
+       is set, None is returned.
+
+       Params: None
+
+       Returns:
+       cache: HttpCache - The shared cache, None if the cache is disabled.
+       """
+    global _cache
+    with _cache_lock:
+        if _cache is None and os.environ.get(CACHE_ENV):
+            _cache = HttpCache(os.environ[CACHE_ENV], offline=os.environ.get(OFFLINE_ENV) == '1')
+    return _cache
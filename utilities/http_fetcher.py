@@ -0,0 +1,198 @@
+import time
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from utilities import http_cache
+
+# The number of requests made at the same time across all hosts
+MAX_WORKERS=16
+
+# The number of requests made at the same time to a single host and the minimum number of seconds between two requests to it
+MAX_PER_HOST=2
+POLITENESS_DELAY=0.25
+
+# The number of seconds to wait for a connection to be established and for the server to send data
+CONNECT_TIMEOUT=5
+READ_TIMEOUT=20
+
+# Failed requests are retried after backoff_factor*2^attempt seconds. Connection errors, timeouts and the below statuses are retried.
+MAX_RETRIES=2
+BACKOFF_FACTOR=0.5
+RETRY_STATUSES=frozenset([429, 500, 502, 503, 504])
+
+# The fetcher shared by the process, created on first use by get_fetcher
+_fetcher=None
+_fetcher_lock=threading.Lock()
+
+
+class _Host:
+    """The concurrency limit and politeness state of a single host."""
+
+    def __init__(self, max_per_host):
+        self.slots = threading.BoundedSemaphore(max_per_host)
+        self.lock = threading.Lock()
+        self.next_request = 0.0
+
+
+class Fetcher:
+    """A concurrent HTTP fetch layer. All requests share a keep-alive session, so connections to the same host are reused.
+       Requests are made on a bounded thread pool(see submit) while at most max_per_host of them hit the same host at a time
+       and consecutive requests to a host are spaced by politeness_delay seconds. Every request has connect and read timeouts,
+       and failed requests are retried with exponential backoff, hence a slow or failing publisher cannot stall the whole update.
+       If a response cache is enabled(see http_cache.HttpCache), fresh stored responses are served without making a request.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST, politeness_delay=POLITENESS_DELAY,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR,
+                 cache=None):
+        """Params:
+           max_workers: int - The number of requests made at the same time across all hosts.
+           max_per_host: int - The number of requests made at the same time to a single host.
+           politeness_delay: float - The minimum number of seconds between two requests to the same host.
+           connect_timeout: float - The number of seconds to wait for a connection to be established.
+           read_timeout: float - The number of seconds to wait for the server to send data.
+           max_retries: int - The number of times a failed request is retried.
+           backoff_factor: float - A retried request waits backoff_factor*2^attempt seconds.
+           cache: http_cache.HttpCache - The response cache. Defaults to the cache shared by the process, if enabled(see http_cache.get_cache).
+        """
+        self.max_per_host = max_per_host
+        self.politeness_delay = politeness_delay
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.cache = cache
+
+        self.num_requests = 0
+        self.num_retries = 0
+        self._stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _get_host(self, url):
+        """Get the state of the host of a url."""
+        host = urlsplit(url).netloc.lower()
+        with self._hosts_lock:
+            if host not in self._hosts:
+                self._hosts[host] = _Host(self.max_per_host)
+            return self._hosts[host]
+
+    def _wait_politeness(self, host):
+        """Reserve the next request slot of a host and wait for it."""
+        with host.lock:
+            now = time.time()
+            wait = host.next_request - now
+            host.next_request = max(now, host.next_request) + self.politeness_delay
+        if wait > 0:
+            time.sleep(wait)
+
+    def get(self, url, headers=None, ttl=None):
+        """A function that makes a GET request within the limits of its host, retrying it if it fails. It blocks the calling thread,
+           use submit to make requests concurrently.
+
+           Params:
+           url: str - The requested url.
+           headers: dict - The request headers.
+           ttl: float - The number of seconds a cached response is served without contacting the server. Defaults to the ttl of the cache.
+
+           Returns:
+           response: requests.Response - The response. If the server kept responding with a retried status, the last response is returned.
+
+           Raises:
+           requests.RequestException - If the request kept failing with connection errors or timeouts.
+           http_cache.CacheMissError - If the cache is offline and no response was recorded for the url.
+           """
+        cache = self.cache if self.cache is not None else http_cache.get_cache()
+        if cache is None:
+            return self._request(url, headers)
+
+        # Fresh stored responses do not count against the limits of the host
+        cached, fresh, validators = cache.lookup(url, ttl)
+        if fresh:
+            return cached
+        return cache.store(url, self._request(url, dict(headers or {}, **validators)), cached)
+
+    def _request(self, url, headers):
+        """Make a GET request within the limits of its host, retrying it if it fails(see get)."""
+        host = self._get_host(url)
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                with self._stats_lock:
+                    self.num_retries += 1
+                time.sleep(self.backoff_factor * 2 ** (attempt - 1))
+
+            with host.slots:
+                self._wait_politeness(host)
+                with self._stats_lock:
+                    self.num_requests += 1
+                try:
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt == self.max_retries:
+                        raise
+                    continue
+
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+
+        return response
+
+    def submit(self, fn, *args, **kwargs):
+        """A function that runs fn(*args, **kwargs) on the thread pool. fn is expected to make its requests through get, e.g.
+           fetcher.submit(fetcher.get, url) or fetcher.submit(news_scrapers.get_stock_news, ticker).
+
+           Returns:
+           future: concurrent.futures.Future - A future resolved with the result of fn.
+           """
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def stats(self):
+        """A function that retrieves the number of requests made and the number of retries."""
+        return {'requests': self.num_requests, 'retries': self.num_retries, 'hosts': len(self._hosts)}
+
+    def close(self):
+        """A function that waits for the submitted requests and closes the session."""
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def configure(max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST, politeness_delay=POLITENESS_DELAY):
+    """A function that (re)creates the fetcher shared by the process. Any previous fetcher is closed.
+
+       Params:
+       max_workers: int - The number of requests made at the same time across all hosts.
+       max_per_host: int - The number of requests made at the same time to a single host.
+       politeness_delay: float - The minimum number of seconds between two requests to the same host.
+
+       Returns:
+       fetcher: Fetcher - The shared fetcher.
+       """
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is not None:
+            _fetcher.close()
+        _fetcher = Fetcher(max_workers, max_per_host, politeness_delay)
+    return _fetcher
+
+
+def get_fetcher():
+    """A function that retrieves the fetcher shared by the process, creating it with the default limits on first use."""
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is None:
+            _fetcher = Fetcher()
+    return _fetcher
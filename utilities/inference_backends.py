@@ -0,0 +1,141 @@
+import os
+import argparse
+import numpy as np
+import torch
+
+# The below will allow the script to be ran from different working directories
+dir = os.path.dirname(__file__)
+
+# The location of the exported ONNX model(see export_onnx)
+ONNX_PATH=os.path.join(dir, 'BertModelOnnx', 'model.onnx')
+
+# The ONNX opset used when exporting the model
+ONNX_OPSET=12
+
+
+class TorchBackend:
+    """The PyTorch eager fp32 model. Every backend exposes the same forward function, so encoder and key_phrases do not need to know
+       which one is used(see model_registry.get_backend).
+    """
+
+    name = 'torch'
+
+    def __init__(self, model):
+        """Params:
+           model: transformers.BertForSequenceClassification - The fine-tuned model.
+        """
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        """A function that runs a batch of sequences through the model.
+
+           Params:
+           input_ids: np.ndarray of shape (k,l) - The token ids of each sequence.
+           attention_mask: np.ndarray of shape (k,l) - 1 for the tokens of each sequence and 0 for the padding tokens.
+
+           Returns:
+           logits: np.ndarray of shape (k,3) - The output logits of each sequence.
+           last_hidden_state: np.ndarray of shape (k,l,768) - The final hidden state of every token of each sequence.
+           """
+        #torch.no_grad() is used as there is not need to calculcate gradients which is otherwise automatically done by pytorch
+        with torch.no_grad():
+            output = self.model(torch.from_numpy(np.asarray(input_ids, dtype=np.int64)),
+                                torch.from_numpy(np.asarray(attention_mask, dtype=np.int64)), output_hidden_states=True)
+
+        return output.logits.numpy(), output.hidden_states[-1].numpy()
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """The PyTorch model with its linear layers dynamically quantized to int8. The weights are quantized once when the backend is
+       created and the activations are quantized on the fly, which speeds up inference on CPU at the cost of a small loss in precision.
+    """
+
+    name = 'torch_int8'
+
+    def __init__(self, model, inplace=False):
+        """Params:
+           model: transformers.BertForSequenceClassification - The fine-tuned fp32 model.
+           inplace: boolean - Whether to quantize the model itself rather than a copy. The fp32 weights of the linear layers are then
+                    released instead of staying in memory next to the int8 ones, hence the model must not be used by anything else.
+        """
+        super().__init__(torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=inplace))
+
+
+class OnnxBackend:
+    """The model exported to ONNX(see export_onnx) and ran by ONNX Runtime on the CPU."""
+
+    name = 'onnx'
+
+    def __init__(self, onnx_path=None):
+        """Params:
+           onnx_path: str - The location of the exported ONNX model. Defaults to ONNX_PATH.
+        """
+        if onnx_path is None:
+            onnx_path = ONNX_PATH
+
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError('The onnx backend requires the onnxruntime package to be installed.')
+
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError('{} does not exist. Export the model first: python -m utilities.inference_backends --export-onnx'.format(onnx_path))
+
+        self.session = onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+
+    def forward(self, input_ids, attention_mask):
+        """A function that runs a batch of sequences through the model(see TorchBackend.forward)."""
+        logits, last_hidden_state = self.session.run(['logits', 'last_hidden_state'],
+                                                     {'input_ids': np.asarray(input_ids, dtype=np.int64),
+                                                      'attention_mask': np.asarray(attention_mask, dtype=np.int64)})
+        return logits, last_hidden_state
+
+
+class _ExportWrapper(torch.nn.Module):
+    """Wraps the model so that the exported graph returns the logits and the final hidden state only."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        output = self.model(input_ids=input_ids, attention_mask=attention_mask, output_hidden_states=True, return_dict=True)
+        return output.logits, output.hidden_states[-1]
+
+
+def export_onnx(model, onnx_path=None):
+    """A function that exports the fine-tuned model to ONNX so that it can be used by OnnxBackend. The batch size and sequence length
+       are dynamic axes, hence the exported model works with the dynamically padded batches of encoder.encode_documents.
+
+       Params:
+       model: transformers.BertForSequenceClassification - The fine-tuned model.
+       onnx_path: str - Where to save the exported model. Defaults to ONNX_PATH.
+
+       Returns:
+       None
+       """
+    if onnx_path is None:
+        onnx_path = ONNX_PATH
+
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+
+    # An example input that is traced through the model
+    input_ids = torch.ones((2, 8), dtype=torch.long)
+    attention_mask = torch.ones((2, 8), dtype=torch.long)
+
+    dynamic_axes = {'input_ids': {0: 'batch', 1: 'sequence'}, 'attention_mask': {0: 'batch', 1: 'sequence'},
+                    'logits': {0: 'batch'}, 'last_hidden_state': {0: 'batch', 1: 'sequence'}}
+    torch.onnx.export(_ExportWrapper(model).eval(), (input_ids, attention_mask), onnx_path,
+                      input_names=['input_ids', 'attention_mask'], output_names=['logits', 'last_hidden_state'],
+                      dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--export-onnx', action='store_true', help='Export the fine-tuned model to ONNX_PATH.')
+    args = parser.parse_args()
+
+    if args.export_onnx:
+        from utilities import model_registry
+        export_onnx(model_registry.get_model())
+        print('Exported the model to {}'.format(ONNX_PATH))
@@ -0,0 +1,117 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from utilities import article_analysis
+
+# The maximum number of articles analysed in a single batch
+MAX_BATCH_SIZE=32
+
+# The maximum number of seconds the first article of a batch waits for more articles to arrive before the batch is analysed
+MAX_WAIT=2.0
+
+
+class InferenceQueue:
+    """A pipeline stage that collects parsed articles from the scrapers and analyses them in cross-article batches on a background
+       thread(see article_analysis.analyse_articles). A batch is analysed as soon as it holds max_batch_size articles or its first
+       article has waited for max_wait seconds. Every submitted article gets a concurrent.futures.Future that is resolved with
+       its analysis, so the writer of each article can pick up its result independently of the rest of the batch.
+    """
+
+    def __init__(self, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT):
+        """Params:
+           max_batch_size: int - The maximum number of articles analysed in a single batch.
+           max_wait: float - The maximum number of seconds an article waits for its batch to fill up.
+        """
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.num_batches = 0
+        self.num_articles = 0
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, text):
+        """A function that adds an article to the queue.
+
+           Params:
+           text: str - The article text.
+
+           Returns:
+           future: concurrent.futures.Future - A future resolved with the analysis of the article(see article_analysis.analyse_article).
+           """
+        if self._closed:
+            raise RuntimeError('Cannot submit articles to a closed inference queue.')
+
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def close(self):
+        """A function that analyses the articles still in the queue and stops the background thread.
+
+           Params: None
+
+           Returns:
+           None
+           """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _next_batch(self):
+        """Block until an article arrives, then collect articles until the batch is full or max_wait has elapsed.
+           Returns the batch and whether the queue was closed."""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+
+        batch = [first]
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _run(self):
+        """The background thread analysing the batches."""
+        closed = False
+        while not closed:
+            batch, closed = self._next_batch()
+            if len(batch) > 0:
+                self._analyse(batch)
+
+    def _analyse(self, batch):
+        """Analyse a batch and resolve the futures of its articles. If the batch fails, each article is analysed on its own
+           so that one article that cannot be analysed does not fail the whole batch."""
+        self.num_batches += 1
+        self.num_articles += len(batch)
+
+        try:
+            analyses = article_analysis.analyse_articles([text for text, _ in batch])
+        except Exception:
+            for text, future in batch:
+                try:
+                    future.set_result(article_analysis.analyse_article(text))
+                except Exception as error:
+                    future.set_exception(error)
+            return
+
+        for (_, future), analysis in zip(batch, analyses):
+            future.set_result(analysis)
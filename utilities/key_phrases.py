@@ -1,17 +1,8 @@
-import torch
 import numpy as np
-from transformers import BertForSequenceClassification, BertTokenizer
 from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from nltk.tokenize import TextTilingTokenizer
 from nltk.tokenize import sent_tokenize
-import os
-
-# The below will allow the script to be ran from different working directories
-dir = os.path.dirname(__file__)
-path=os.path.join(dir, 'BertModel')
-model = BertForSequenceClassification.from_pretrained(path)
-bert_tokenizer = BertTokenizer.from_pretrained('bert-base-cased')
+from utilities import model_registry, embedding_cache, encoder
 
 #The special [CLS] and [SEP] token added whenever add_special_tokens=True
 NUM_SPECIAL_TOKENS=2
@@ -20,6 +11,9 @@ NUM_SPECIAL_TOKENS=2
 MAX_TOKENS_LENGTH=300
 ALLOWED_TOKENS_LENGTH= MAX_TOKENS_LENGTH - NUM_SPECIAL_TOKENS
 
+#The number of candidate key phrases embedded in a single forward pass of the model
+CANDIDATE_BATCH_SIZE=64
+
 def _get_candidates(text, n_gram_range):
     """A function that uses sklearn CountVectorizer to tokenize the text and remove stopwords in order to generate
        candidate keywords.
@@ -48,43 +42,87 @@ def _get_candidates(text, n_gram_range):
     return candidates
 
 
-def _get_candidate_reps(candidates):
-    """A function to get the BERT representation of all words from the tokenized document. The model returns a tensor of shape (k,l,m) where k=number of examples(1), l=number of tokens, m=768(BERT embedding dimensions).
-       In order to get the representation I am indexing into the last hidden state of the returned tensor and getting the 0th element of the second dimension - [example][token][embedding].
-       Depending on the n-gram I choose I could have more than one token or also in some cases BERT represents one word with more than one tokens. Therefore, in such cases I am mean pooling the embeddings
-       using along the column axis which generates the final embedding representation. Finally, I am reshaping the tensors and converting them to numpy to prepare them as input for get_cosine_similarity.
+def _get_candidate_reps(candidates, batch_size=None, use_cache=True):
+    """A function to get the BERT representation of all words from the tokenized document. The model returns a tensor of shape (k,l,m) where k=number of examples, l=number of tokens, m=768(BERT embedding dimensions).
+       Depending on the n-gram I choose I could have more than one token or also in some cases BERT represents one word with more than one tokens. Therefore, I am mean pooling
+       the token embeddings of the last hidden state which generates the final embedding representation. Finally, I am reshaping the tensors and converting them to numpy to prepare them as input for get_cosine_similarity.
+       Since the same n-grams keep appearing in the news for a given stock/cryptocurrency, the embeddings are first looked up in the shared
+       embedding cache(see embedding_cache) and only the candidates that are not cached are ran through the model(see _embed_candidates).
 
        Params:
        candidates: list - the tokens obtained from CountVectorizer
+       batch_size: int - how many candidates are passed to the model at once. Defaults to CANDIDATE_BATCH_SIZE.
+       use_cache: boolean - whether to look up and store the embeddings in the embedding cache. Defaults to True.
 
-       Returns: word_reps - a list of the word embedding for each token reshaped so that they can be used as input to sklearn.metrics.pairwise.cosine_similarity
+       Returns: word_reps - a list of the word embedding for each token reshaped so that they can be stacked by _get_embedding_matrix
        """
-    word_reps = []
+    if not use_cache:
+        return [embedding.reshape(1, -1) for embedding in _embed_candidates(candidates, batch_size)]
 
-    for word in candidates:
-        encoding = bert_tokenizer.encode(word, add_special_tokens=False, return_tensors='pt')
+    cache = embedding_cache.get_cache()
+    word_reps = [cache.get(word) for word in candidates]
 
-        with torch.no_grad():
-            rep = model(encoding, output_hidden_states=True)
+    # Embed the candidates that were not found in the cache and store them
+    missing = [index for index, rep in enumerate(word_reps) if rep is None]
+    missing_candidates = [candidates[index] for index in missing]
+    for index, word, embedding in zip(missing, missing_candidates, _embed_candidates(missing_candidates, batch_size)):
+        cache.put(word, embedding)
+        word_reps[index] = embedding
 
-        # if there are multiple tokens, their representation is pooled using mean pooling along the 0 axis
-        if rep.hidden_states[-1][0].shape[0] > 1:
-            embedding = torch.mean(rep.hidden_states[-1][0], axis=0).detach().numpy().reshape(1, -1)
+    return [rep.reshape(1, -1) for rep in word_reps]
 
-        else:
-            embedding = rep.hidden_states[-1][0][0].detach().numpy().reshape(1, -1)
 
-        word_reps.append(embedding)
+def _embed_candidates(candidates, batch_size=None):
+    """A function that runs the candidates through the model. All candidates are tokenized together and padded to the longest one.
+       The model is then ran over batches of batch_size candidates and the attention mask is used to exclude the padding tokens from the
+       mean pooling, so each embedding is the same as the one obtained by running the model on the candidate alone.
+
+       Params:
+       candidates: list - the candidate key phrases to be embedded
+       batch_size: int - how many candidates are passed to the model at once. Defaults to CANDIDATE_BATCH_SIZE.
+
+       Returns:
+       embeddings: np.ndarray of shape (n,768) - the embedding of each candidate
+       """
+    if batch_size is None:
+        batch_size = CANDIDATE_BATCH_SIZE
+
+    if len(candidates) == 0:
+        return np.empty((0, embedding_cache.EMBEDDING_DIM), dtype=np.float32)
+
+    model_backend = model_registry.get_backend()
+    bert_tokenizer = model_registry.get_tokenizer()
+
+    # Tokenize all candidates at once. Special tokens are not added as the candidates are embedded on their own.
+    encodings = bert_tokenizer(list(candidates), add_special_tokens=False, padding='longest',
+                               return_attention_mask=True, return_tensors='np')
+
+    batch_embeddings = []
+    for start in range(0, len(candidates), batch_size):
+        attention_mask = encodings['attention_mask'][start:start + batch_size]
+
+        # Trim the padding columns that are not needed by any candidate in the current batch
+        batch_length = int(attention_mask.sum(axis=1).max())
+        attention_mask = attention_mask[:, :batch_length]
+        input_ids = encodings['input_ids'][start:start + batch_size, :batch_length]
+
+        _, last_hidden_state = model_backend.forward(input_ids, attention_mask)
+
+        # Mean pool the token embeddings of each candidate, ignoring the padding tokens
+        mask = attention_mask[:, :, np.newaxis].astype(last_hidden_state.dtype)
+        embeddings = (last_hidden_state * mask).sum(axis=1) / mask.sum(axis=1)
+        batch_embeddings.append(embeddings)
 
-    return word_reps
+    return np.vstack(batch_embeddings)
 
 
 def _get_doc_rep(text):
     """ A function that retrieves the BERT representation of the entire document. The special BERT [CLS] token
         is used as a representation of the entire sequence. The [CLS] token can be obtained by indexing into the final hidden state and getting
-        the 0th element of the second dimension. In cases where the tokenized document exceeds MAX_TOKEN_LENGTH, the text tiling algorithm is applied
-        to separate the document into topical paragraphs. Subsequently, the [CLS] tokens pertaining to each paragraph are pooled to arrive at
-        a final representation for the document.
+        the 0th element of the second dimension. The text tiling algorithm is applied to separate the document into topical paragraphs
+        of at most MAX_TOKENS_LENGTH tokens. Subsequently, the [CLS] tokens pertaining to each paragraph are pooled to arrive at
+        a final representation for the document(see _pool_paragraph_reps). When the sentiment of the document is also needed,
+        article_analysis.analyse_article obtains the same representation from the forward pass used for the sentiment instead.
 
         Params:
         text: str - the document text(news article)
@@ -93,27 +131,23 @@ def _get_doc_rep(text):
         doc_representation: numpy.ndarray of shape (1,768) - the [CLS] token embedding reshaped to be used as input to get_cosine_similarity
 
         """
+    paragraphs = _get_paragraphs(text)
+    _, cls_embeddings = encoder.encode_paragraphs(paragraphs)
 
-    #Getting the document representation by pooling the [CLS] tokens of each paragraph if the tokenized document exceeds MAX_TOKENS_LENGTH
-    if len(bert_tokenizer.tokenize(text))>ALLOWED_TOKENS_LENGTH:
-        paragraphs=_get_paragraphs(text)
-        doc_encoding=bert_tokenizer.batch_encode_plus(paragraphs,add_special_tokens=True,padding='max_length',max_length=MAX_TOKENS_LENGTH,return_attention_mask=True,return_tensors='pt')
+    return _pool_paragraph_reps(cls_embeddings)
 
-        with torch.no_grad():
-            model_output= model(doc_encoding['input_ids'],doc_encoding['attention_mask'],output_hidden_states=True)
-        doc_representation= torch.mean(model_output.hidden_states[-1][0],axis=0).detach().numpy().reshape(1,-1)
 
-    #If the tokenized document does not exceed MAX_TOKENS_LENGTH, there is no need for splitting, hence the [CLS] token of the sequence is considered as the document representation
-    else:
-        doc_encoding = bert_tokenizer.encode_plus(text, add_special_tokens=True, padding='max_length', max_length=MAX_TOKENS_LENGTH,
-                                                  return_attention_mask=True, return_tensors='pt')
-        with torch.no_grad():
-            model_output = model(doc_encoding['input_ids'], doc_encoding['attention_mask'], output_hidden_states=True)
+def _pool_paragraph_reps(cls_embeddings):
+    """A function that mean pools the [CLS] token embeddings of the paragraphs of a document into the document representation.
+       A document consisting of one paragraph is represented by its [CLS] token.
 
-        # Squeeze to remove the first dimension of size 1 and get the 0th element. I am converting to numpy as that will be needed later.
-        doc_representation = model_output.hidden_states[-1].squeeze(0)[0].detach().numpy().reshape(1, -1)
+       Params:
+       cls_embeddings: np.ndarray of shape (n,768) - the [CLS] token embedding for each paragraph(see encoder.encode_paragraphs)
 
-    return doc_representation
+       Returns:
+       doc_representation: numpy.ndarray of shape (1,768) - the document representation reshaped to be used as input to get_cosine_similarity
+       """
+    return np.mean(cls_embeddings, axis=0).reshape(1, -1)
 
 def _get_paragraphs(text):
     '''A function that separates the document(news article) into topical paragraphs. Defensive programming is applied
@@ -147,6 +181,7 @@ def _split_paragraphs(paragraphs):
        list - a list of the paragraphs with the paragraphs longer than the maximum tokens allowed split into two new
               paragraphs.
        """
+    bert_tokenizer = model_registry.get_tokenizer()
     tokenized_paragraphs = [bert_tokenizer.tokenize(paragraph) for paragraph in paragraphs]
     max_length_paragraph = max(len(paragraph) for paragraph in tokenized_paragraphs)
 
@@ -175,29 +210,96 @@ def _split_paragraphs(paragraphs):
 
 
 
-def _get_cosine_similarity(doc_embedding, word_embeddings):
+def _get_embedding_matrix(embeddings):
+    """A function that stacks the candidate embeddings into a single contiguous matrix and normalizes each row to unit length,
+       so that the cosine similarity between any two rows is simply their dot product.
+
+       Params:
+       embeddings: list of np.ndarray of shape (1,768) or np.ndarray of shape (n,768) - the BERT representations to be stacked
+
+       Returns:
+       matrix: np.ndarray of shape (n,768) - the row-normalized embeddings
+       """
+    matrix = np.ascontiguousarray(np.vstack(embeddings), dtype=np.float32)
+
+    # Rows with a norm of 0 are left as they are instead of dividing by zero
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+
+    return matrix / norms
+
+
+def _get_cosine_similarity(doc_embedding, candidate_matrix):
     """A function that creates an array of the cosine similarities of the representations of each token in the document and the document itself.
        The presumption is that word with a higher cosine similarity to the document likely represent something semantically significant for it.
+       The candidate matrix is already normalized(see _get_embedding_matrix), hence only the document embedding is normalized and all
+       similarities are obtained with a single matrix-vector product.
 
        Params:
 
        doc_embedding -np.ndarray of shape (1,768) - the BERT representation of the entire document.
 
-       word_embeddings - list of np.ndarray of shape (1,768) - the BERT representations for each word in the document
+       candidate_matrix - np.ndarray of shape (n,768) - the row-normalized BERT representations for each word in the document(see _get_embedding_matrix)
 
        Returns:
        similarities: nd.numpy.array - an array of all cosine similarities
        """
-    similarities = []
-    for rep in word_embeddings:
-        '''squeezing to remove all dimensions of size 1 when appending the array. 
-           (I will need that to get the indexes of the highest similarity values later.)'''
-        similarities.append(cosine_similarity(doc_embedding, rep).squeeze())
+    if len(candidate_matrix) == 0:
+        return np.array([], dtype=np.float32)
+
+    return candidate_matrix @ _get_embedding_matrix(doc_embedding)[0]
+
+
+def _get_top_indexes(similarities, top_n):
+    """A function that retrieves the indexes of the top_n highest similarities. np.argpartition is used to find them without
+       sorting the entire array, after which only the top_n indexes are sorted.
+
+       Params:
+       similarities: np.ndarray - the cosine similarities of each candidate and the document
+       top_n: int - how many indexes to return
+
+       Returns:
+       indexes: np.ndarray - the indexes of the top_n highest similarities in an ascending order based on their value
+       """
+    if top_n >= len(similarities):
+        return np.argsort(similarities)
+
+    top_indexes = np.argpartition(similarities, -top_n)[-top_n:]
 
-    return np.array(similarities)
+    return top_indexes[np.argsort(similarities[top_indexes])]
+
+
+def _get_mmr_indexes(doc_similarities, candidate_matrix, top_n, diversity):
+    """A function that selects key phrases using Maximal Marginal Relevance. At each step the candidate that is most similar to the
+       document while being least similar to the already selected candidates is picked. The trade-off is controlled by diversity:
+       0 is equivalent to selecting the most similar candidates, while values closer to 1 favour candidates unlike the ones already selected.
+
+       Params:
+       doc_similarities: np.ndarray - the cosine similarities of each candidate and the document
+       candidate_matrix: np.ndarray of shape (n,768) - the row-normalized candidate embeddings (see _get_embedding_matrix)
+       top_n: int - how many indexes to return
+       diversity: float - a value between 0 and 1
+
+       Returns:
+       indexes: np.ndarray - the indexes of the selected candidates. The first selected candidate is last to follow the order used by get_keyphrases.
+       """
+    top_n = min(top_n, len(doc_similarities))
+    selected = [int(np.argmax(doc_similarities))]
 
+    # The highest similarity of each candidate to any of the selected candidates, updated as candidates are selected
+    max_selected_similarity = candidate_matrix @ candidate_matrix[selected[0]]
 
-def get_keyphrases(text, n_gram_range, top_n_keyphrases):
+    while len(selected) < top_n:
+        mmr = (1 - diversity) * doc_similarities - diversity * max_selected_similarity
+        mmr[selected] = -np.inf
+        index = int(np.argmax(mmr))
+        selected.append(index)
+        max_selected_similarity = np.maximum(max_selected_similarity, candidate_matrix @ candidate_matrix[index])
+
+    return np.array(selected[::-1])
+
+
+def get_keyphrases(text, n_gram_range, top_n_keyphrases, diversity=None, doc_rep=None):
     """"A function that retrieves all key phrases from a given text. Semantic similarity is determined based on the cosine
         similarity between the embeddings.
 
@@ -205,6 +307,8 @@ def get_keyphrases(text, n_gram_range, top_n_keyphrases):
         text: str - the document text(news article)
         n_gram_range: tuple - what n-grams to consider when tokenizing. E.g (1,2) will generate both unigram and bigram candidates
         top_n_keyphrases: int - how many of the most similar key phrases to return.
+        diversity: float - if given, the key phrases are re-ranked using Maximal Marginal Relevance(see _get_mmr_indexes). Defaults to None.
+        doc_rep: numpy.ndarray of shape (1,768) - the document representation if it was already computed. Defaults to None, in which case it is obtained by _get_doc_rep.
 
         Returns:
         keyphrases: list - the key phrases of the document. keyphrases[-1] will have the highest similarity to the document embedding.
@@ -217,15 +321,41 @@ def get_keyphrases(text, n_gram_range, top_n_keyphrases):
     candidate_reps = _get_candidate_reps(candidates)
 
     # get the document representation
-    doc_rep = _get_doc_rep(text)
+    if doc_rep is None:
+        doc_rep = _get_doc_rep(text)
+
+    return _select_keyphrases(candidates, candidate_reps, doc_rep, top_n_keyphrases, diversity)
+
+
+def _select_keyphrases(candidates, candidate_reps, doc_rep, top_n_keyphrases, diversity=None):
+    """A function that selects the key phrases of a document from its candidates once their representations and the document
+       representation are known. It is shared by get_keyphrases and article_analysis.analyse_articles, which embeds the candidates of many articles at once.
+
+       Params:
+       candidates: list - the candidate key phrases obtained by _get_candidates
+       candidate_reps: list of np.ndarray of shape (1,768) - the BERT representation of each candidate
+       doc_rep: numpy.ndarray of shape (1,768) - the document representation
+       top_n_keyphrases: int - how many of the most similar key phrases to return.
+       diversity: float - if given, the key phrases are re-ranked using Maximal Marginal Relevance(see _get_mmr_indexes). Defaults to None.
+
+       Returns:
+       keyphrases: list - the key phrases of the document. keyphrases[-1] will have the highest similarity to the document embedding.
+       """
+    if len(candidates) == 0:
+        return []
+
+    # stack the candidate representations in a normalized matrix
+    candidate_matrix = _get_embedding_matrix(candidate_reps)
 
     # get the cosine similarities of each candidate and the entire document
-    cosine_similarities = _get_cosine_similarity(doc_rep, candidate_reps)
+    cosine_similarities = _get_cosine_similarity(doc_rep, candidate_matrix)
 
-    # get an array of the indexes in cosine_similarities sorted in an ascending order based on their value
-    sorted_cos_indexes = np.argsort(cosine_similarities)
+    # get an array of the indexes of the key phrases
+    if diversity is None:
+        top_indexes = _get_top_indexes(cosine_similarities, top_n_keyphrases)
+    else:
+        top_indexes = _get_mmr_indexes(cosine_similarities, candidate_matrix, top_n_keyphrases, diversity)
 
     # get the key phrases from the document
-    keyphrases = [candidates[i] for i in sorted_cos_indexes[-top_n_keyphrases:]]
+    keyphrases = [candidates[i] for i in top_indexes]
     return keyphrases
-
@@ -0,0 +1,179 @@
+import os
+import hashlib
+from transformers import BertForSequenceClassification, BertTokenizer
+from utilities import inference_backends
+
+# The below will allow the script to be ran from different working directories
+dir = os.path.dirname(__file__)
+path=os.path.join(dir, 'BertModel')
+
+# The pretrained tokenizer the model was fine-tuned with
+TOKENIZER_NAME='bert-base-cased'
+
+# Processes that only serve data from the database (e.g the Flask API) can set this environment variable in order to
+# guarantee that the model is never loaded into memory.
+DISABLE_MODEL_ENV='NARATAI_DISABLE_MODEL'
+
+# The shared instances. They are only loaded when first requested by get_model/get_tokenizer.
+_model=None
+_tokenizer=None
+_checkpoint_hash=None
+_model_disabled=os.environ.get(DISABLE_MODEL_ENV,'')=='1'
+
+# The inference backend used by encoder and key_phrases: 'torch'(PyTorch eager fp32), 'torch_int8'(PyTorch with dynamically int8
+# quantized linear layers) or 'onnx'(the exported model ran by ONNX Runtime, see inference_backends.export_onnx).
+BACKENDS={'torch': inference_backends.TorchBackend,
+          'torch_int8': inference_backends.QuantizedTorchBackend,
+          'onnx': inference_backends.OnnxBackend}
+BACKEND_ENV='NARATAI_BACKEND'
+BACKEND=os.environ.get(BACKEND_ENV,'torch')
+
+# The backends created so far, keyed by name
+_backends={}
+
+
+def get_model():
+    """A function that returns the fine-tuned BERT model shared by sentiment_analysis and key_phrases. The checkpoint is
+       loaded from the BertModel directory on the first call and the same instance is returned on every subsequent call,
+       so a process never holds more than one copy of the weights.
+
+       Params: None
+
+       Returns:
+       model: transformers.BertForSequenceClassification - The fine-tuned model set to evaluation mode.
+       """
+    global _model
+
+    if _model is None:
+        _model = _load_model()
+
+    return _model
+
+
+def _load_model():
+    """Load the fine-tuned BERT model from the BertModel directory and set it to evaluation mode."""
+    if _model_disabled:
+        raise RuntimeError('Loading the BERT model was disabled for this process (see disable_model_loading).')
+
+    model = BertForSequenceClassification.from_pretrained(path)
+    model.eval()
+    return model
+
+
+def get_backend(name=None):
+    """A function that returns the inference backend shared by encoder and key_phrases. Like the model, each backend is only created
+       on first use. All backends expose the same forward function(see inference_backends.TorchBackend.forward).
+
+       Params:
+       name: str - The name of the backend, one of BACKENDS. Defaults to BACKEND.
+
+       Returns:
+       backend: inference_backends.TorchBackend/QuantizedTorchBackend/OnnxBackend - The backend.
+       """
+    if name is None:
+        name = BACKEND
+
+    if name not in BACKENDS:
+        raise ValueError('Unknown inference backend {}. Choose one of {}.'.format(name, list(BACKENDS.keys())))
+
+    if name not in _backends:
+        if name == 'onnx':
+            if _model_disabled:
+                raise RuntimeError('Loading the BERT model was disabled for this process (see disable_model_loading).')
+            _backends[name] = BACKENDS[name]()
+        elif name == 'torch_int8' and _model is None:
+            # The quantized backend gets a model of its own that is quantized in place, hence the process does not keep the fp32
+            # weights in memory next to the int8 ones. The shared model is only copied if it was already loaded.
+            _backends[name] = BACKENDS[name](_load_model(), inplace=True)
+        else:
+            _backends[name] = BACKENDS[name](get_model())
+
+    return _backends[name]
+
+
+def get_tokenizer():
+    """A function that returns the BERT tokenizer shared by sentiment_analysis and key_phrases. Like the model, it is
+       loaded on the first call only.
+
+       Params: None
+
+       Returns:
+       tokenizer: transformers.BertTokenizer - The pretrained 'bert-base-cased' tokenizer.
+       """
+    global _tokenizer
+
+    if _tokenizer is None:
+        _tokenizer = BertTokenizer.from_pretrained(TOKENIZER_NAME)
+
+    return _tokenizer
+
+
+def get_checkpoint_hash():
+    """A function that computes a hash of the model checkpoint from the contents of the files in the BertModel directory.
+       It identifies the weights that produced an embedding (see embedding_cache) without having to load the model.
+       The hash is computed once per process.
+
+       Params: None
+
+       Returns:
+       checkpoint_hash: str - The sha256 hex digest of the checkpoint files.
+       """
+    global _checkpoint_hash
+
+    if _checkpoint_hash is None:
+        checkpoint_hash = hashlib.sha256()
+        for file_name in sorted(os.listdir(path)):
+            file_path = os.path.join(path, file_name)
+            if not os.path.isfile(file_path):
+                continue
+            checkpoint_hash.update(file_name.encode('utf-8'))
+            with open(file_path, 'rb') as file:
+                for chunk in iter(lambda: file.read(1 << 20), b''):
+                    checkpoint_hash.update(chunk)
+        _checkpoint_hash = checkpoint_hash.hexdigest()
+
+    return _checkpoint_hash
+
+
+def get_backend_hash(name=None):
+    """A function that computes a hash identifying the embeddings produced by a backend. The backends do not produce exactly the same
+       embeddings(e.g the quantized model), hence cached embeddings(see embedding_cache) are keyed by the checkpoint and the backend.
+       The 'torch' backend is identified by the checkpoint hash alone.
+
+       Params:
+       name: str - The name of the backend, one of BACKENDS. Defaults to BACKEND.
+
+       Returns:
+       backend_hash: str - A sha256 hex digest.
+       """
+    if name is None:
+        name = BACKEND
+
+    if name == 'torch':
+        return get_checkpoint_hash()
+
+    return hashlib.sha256((get_checkpoint_hash() + name).encode('utf-8')).hexdigest()
+
+
+def disable_model_loading():
+    """A function that prevents the model from being loaded in the current process. Any later call to get_model raises
+       a RuntimeError instead of silently loading the weights. Used by processes that never run inference (e.g the API).
+
+       Params: None
+
+       Returns:
+       None
+       """
+    global _model_disabled
+    _model_disabled = True
+
+
+def is_model_loaded():
+    """A function that checks whether the model has already been loaded in the current process.
+
+       Params: None
+
+       Returns:
+       boolean: True if the model weights are in memory. False otherwise.
+       """
+    return _model is not None
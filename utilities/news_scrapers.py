@@ -1,14 +1,19 @@
-import requests
-from datetime import datetime
+from collections import namedtuple
+from datetime import datetime, timezone
 from bs4 import BeautifulSoup
+from utilities import http_fetcher, http_cache
 
 current_date = datetime.now()
 
+# The high-water mark of a ticker: the publication time of the newest ingested article and the urls of the ingested articles published at that time
+Watermark = namedtuple('Watermark', ['last_seen', 'urls'])
+
 
 def get_stock_news(ticker):
     """A function that retrieves the news articles headlines and urls for a given stock using its ticker by scraping the finviz news feed
        The function works only for the finviz website. Constraints are applied to consider only news for a given day and news that
-       are relevant for the given stock ticker(see _check_day and _check_headline_relevancy for more context).
+       are relevant for the given stock ticker(see _check_day and _check_headline_relevancy for more context). The page is requested
+       through the shared fetch layer(see http_fetcher.Fetcher).
 
        Params:
        ticker: str - The stock's ticker
@@ -16,17 +21,48 @@ def get_stock_news(ticker):
        Returns:
        news: dictionary - A dictionary containing the news headlines and their urls
        """
+    return {headline: url for headline, url, _ in get_stock_articles(ticker)}
+
+
+def get_stock_articles(ticker, watermark=None):
+    """A function that retrieves the news articles of a given stock that are newer than its high-water mark(see get_stock_news).
 
-    news={}
+       Params:
+       ticker: str - The stock's ticker
+       watermark: Watermark - The newest article ingested for the ticker. None to retrieve all articles of the day.
+
+       Returns:
+       articles: list - (headline, url, timestamp) tuples, newest first
+       """
 
     url = 'https://finviz.com/quote.ashx?t={}'.format(ticker)
 
     # Headers are needed when making the GET request
     headers = {'User-Agent': 'Mozilla/5.0'}
-    resp = requests.get(url, headers=headers)
+    # The news table changes throughout the day, hence a cached page is only reused for a short time
+    resp = http_fetcher.get_fetcher().get(url, headers=headers, ttl=http_cache.LISTING_TTL)
+
+    return _parse_news_table(resp.content, ticker, watermark)
+
+
+def _parse_news_table(html, ticker, watermark=None):
+    """A function that walks the finviz news-table of a stock, newest article first, and stops as soon as it reaches an article of
+       another day or an article that was already ingested(see _is_new).
+
+       Params:
+       html: str/bytes - The finviz quote page
+       ticker: str - The stock's ticker
+       watermark: Watermark - The newest article ingested for the ticker. None to retrieve all articles of the day.
+
+       Returns:
+       articles: list - (headline, url, timestamp) tuples of the relevant articles, newest first
+       """
+
+    articles=[]
+    timestamp=None
 
     # Instantiate the BeutifulSoup scraper
-    soup = BeautifulSoup(resp.content, 'html.parser')
+    soup = BeautifulSoup(html, 'html.parser')
 
     # All articles are contained in an html table with id: news-table
     news_table = soup.find(id='news-table')
@@ -35,20 +71,102 @@ def get_stock_news(ticker):
     for article in news_table.find_all('tr'):
 
         # A boolean condition that will terminate the loop when all articles for the given day are scraped
-        if _check_date(article):
-            # Get the news headline contained in the anchor tag and check if it is relevant for the given stock ticker
-            headline = article.find('a').text
-            if _check_headline_relevancy(headline,ticker):
-                # Get the attribute href that contains the url in each anchor tag (a)
-                link = article.find('a', href=True)['href']
-                news[headline]=link
+        if not _check_date(article):
+            break
 
-        else:
+        # Get the news headline contained in the anchor tag and the attribute href that contains the url
+        headline = article.find('a').text
+        link = article.find('a', href=True)['href']
+        timestamp = _get_row_time(article, timestamp)
+
+        # The remaining rows are older, hence they were already ingested too
+        if not _is_new(watermark, timestamp, link):
             break
 
-    return news
+        # Check if the headline is relevant for the given stock ticker
+        if _check_headline_relevancy(headline,ticker):
+            articles.append((headline, link, timestamp))
+
+    return articles
+
+
+def _get_row_time(article_container, previous):
+    """A function that parses the timestamp of a news-table row. Only the first row of each day contains the date(see _check_date),
+       either as 'Mon-DD-YY hh:mmAM' or, for the current day, as 'Today hh:mmAM'. The other rows only contain the time and take the
+       date of the previous row.
+
+       Params:
+       article_container: bs4.element.Tag - a table row(tr) element containing the article
+       previous: datetime - The timestamp of the previous row, None for the first row.
+
+       Returns:
+       timestamp: datetime - The timestamp of the row. None if it cannot be parsed.
+       """
+    parts = article_container.find('td').text.split()
+    try:
+        if len(parts) > 1 and parts[0] == 'Today':
+            return datetime.combine(current_date.date(), datetime.strptime(parts[1], "%I:%M%p").time())
+        if len(parts) > 1:
+            return datetime.strptime(' '.join(parts[:2]), "%b-%d-%y %I:%M%p")
+        return datetime.combine(previous.date(), datetime.strptime(parts[0], "%I:%M%p").time())
+    except (ValueError, IndexError, AttributeError):
+        return None
+
+
+def _is_new(watermark, timestamp, url):
+    """A function that checks whether an article is newer than the high-water mark of its ticker. Timestamps only have a resolution of a
+       minute, hence an article published in the same minute as the newest ingested article is new unless its url was ingested.
+
+       Params:
+       watermark: Watermark - The newest article ingested for the ticker. None if no article was ingested.
+       timestamp: datetime - The time the article was published. None if unknown.
+       url: str - The article url
+
+       Returns:
+       boolean: True if the article was not ingested yet. False otherwise.
+       """
+    if watermark is None or watermark.last_seen is None or timestamp is None:
+        return True
+    if timestamp > watermark.last_seen:
+        return True
+    return timestamp == watermark.last_seen and url not in watermark.urls
 
 
+def advance_watermark(watermark, articles, failed_urls=frozenset()):
+    """A function that moves the high-water mark of a ticker to the newest of the given articles. The mark stops short of the oldest
+       article that could not be ingested, hence the next update scrapes it again. Only the articles published before the minute of that
+       article are covered, the timestamps having a resolution of a minute.
+
+       Params:
+       watermark: Watermark - The current high-water mark. None if no article was ingested.
+       articles: list - (headline, url, timestamp) tuples(see get_stock_articles and get_crypto_articles).
+       failed_urls: set - The urls of the articles that could not be downloaded, analysed or written.
+
+       Returns:
+       watermark: Watermark - The new high-water mark.
+       """
+    failed = [timestamp for _, url, timestamp in articles if url in failed_urls]
+    if None in failed:
+        # The position of the failed article relative to the mark is unknown
+        return watermark
+    if failed:
+        oldest_failed = min(failed)
+        articles = [article for article in articles if article[2] is not None and article[2] < oldest_failed]
+
+    timestamps = [timestamp for _, _, timestamp in articles if timestamp is not None]
+    if not timestamps:
+        return watermark
+
+    newest = max(timestamps)
+    if watermark is not None and watermark.last_seen is not None and newest < watermark.last_seen:
+        return watermark
+
+    urls = {url for _, url, timestamp in articles if timestamp == newest}
+    if watermark is not None and newest == watermark.last_seen:
+        urls |= watermark.urls
+
+    return Watermark(newest, frozenset(urls))
+
 
 def _check_date(article_container):
     """"A function that checks whether a table row(tr) containing an article is for the date required.
@@ -114,7 +232,8 @@ def _check_headline_relevancy(headline,ticker):
 
 def get_crypto_news(ticker):
     """A function that retrieves the news articles headlines and urls for a given crypto currency using its ticker. The
-       cryptonews API is used to get the described information. Only articles posted on the current day are considered.
+       cryptonews API is used to get the described information. Only articles posted on the current day are considered. The API is
+       requested through the shared fetch layer(see http_fetcher.Fetcher).
 
        Params:
        ticker: str - The cryptocurrency ticker
@@ -122,19 +241,36 @@ def get_crypto_news(ticker):
        Returns:
        news: dictionary - A dictionary containing the news headlines and their urls
        """
+    articles = get_crypto_articles(ticker)
+    if articles is None:
+        return False
+
+    return {headline: url for headline, url, _ in articles}
+
+
+def get_crypto_articles(ticker, watermark=None):
+    """A function that retrieves the news articles of a given crypto currency that are newer than its high-water mark(see get_crypto_news).
+
+       Params:
+       ticker: str - The cryptocurrency ticker
+       watermark: Watermark - The newest article ingested for the ticker. None to retrieve all articles of the day.
+
+       Returns:
+       articles: list - (headline, url, timestamp) tuples. None if the API did not respond with status code 200.
+       """
 
     # cryptonews API
     endpoint = 'https://cryptonews-api.com/api/v1?tickers={}&items=50&token=lkiy82hxgpzxkie77hzz5mwjyoeemst9abdb31xk'.format(
         ticker)
 
     # Get the API response and check if the status code is OK(200)
-    response = requests.get(endpoint)
+    response = http_fetcher.get_fetcher().get(endpoint, ttl=http_cache.LISTING_TTL)
     if response.status_code==200:
         pass
     else:
-        return False
+        return None
 
-    news = {}
+    articles = []
 
     # The response is converted to json format. The payload is contained in key data
     for item in response.json()['data']:
@@ -142,7 +278,25 @@ def get_crypto_news(ticker):
         str_date = item['date'][5:16]
         date = datetime.strptime(str_date, "%d %b %Y")
         if date.month==current_date.month and date.day==current_date.day:
-            # Add the headline - url pair to news
-            news[item['title']] = item['news_url']
+            # The API does not order the articles, hence every article is checked against the high-water mark
+            timestamp = _get_item_time(item['date'])
+            if _is_new(watermark, timestamp, item['news_url']):
+                articles.append((item['title'], item['news_url'], timestamp))
 
-    return news
+    return articles
+
+
+def _get_item_time(str_date):
+    """A function that parses the publication time of a crypto news API article(e.g 'Fri, 03 Sep 2021 10:25:00 -0400') to UTC.
+
+       Params:
+       str_date: str - The date of the article
+
+       Returns:
+       timestamp: datetime - The naive UTC timestamp. None if it cannot be parsed.
+       """
+    try:
+        timestamp = datetime.strptime(str_date, "%a, %d %b %Y %H:%M:%S %z")
+    except ValueError:
+        return None
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
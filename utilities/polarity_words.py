@@ -1,8 +1,9 @@
 import pandas as pd
+from types import MappingProxyType
+from collections.abc import Mapping
 from nltk.tokenize import TweetTokenizer
 from nltk.sentiment.vader import VaderConstants as vader
 import os
-import requests
 from newspaper import fulltext
 
 dir = os.path.dirname(__file__)
@@ -10,23 +11,37 @@ path=os.path.join(dir, '../project_datasets/sentiment_lexicon.csv')
 lexicon = pd.read_csv(path)
 
 
-def _neg_marking(text):
-    """A function that receives a document(news article) as a parameter and applies negation marking. Words preceded by a negation term
-       are marked with a _NEG tag. Negation terms are extracted from the Vader library. Based on literature the following rules are applied:
-       - A word is tagged with a _NEG tag if it is preceded within 3 words by a negation term and no punctuation separates them.
-       - Following a comma or a full stop, negation tagging is terminated.
-       Before marking, the text is tokenized using TweetTokenizer as after attempting numerous others tokenizers, TweetTokenizer
-       seemed to perform best at detecting punctuation and generating sensible tokens.
+def _compile_lexicon(lexicon_df):
+    """A function that compiles the lexicon dataframe into an immutable word -> sentiment hash map, so that looking up a word
+       takes constant time instead of scanning the dataframe.
 
        Params:
-       text: text - The the document(news article) to be marked.
+       lexicon_df: pandas.Dataframe - the dataframe containing the sentiment lexicon(columns word and sentiment).
 
        Returns:
-       neg_marked_tokens: list - A list of all tokens tokenized by TweetTokenizer marked for negation.
-
+       lexicon_index: types.MappingProxyType - a read-only mapping of each word in the lexicon to its sentiment.
        """
+    return MappingProxyType(dict(zip(lexicon_df.word, lexicon_df.sentiment)))
+
+# The lexicon compiled once when the module is imported
+lexicon_index = _compile_lexicon(lexicon)
+
+# A single tokenizer and the negation terms as a set are shared by all calls of _iter_neg_marking
+_tokenizer = TweetTokenizer()
+NEGATION_TERMS = frozenset(vader.NEGATE)
+
+
+def _iter_neg_marking(text):
+    """A function that tokenizes a document(news article) and lazily applies negation marking(see _neg_marking) in a single pass.
+       The tokens are yielded one at a time together with their negation tag, so they can be looked up in the lexicon without
+       building an intermediate list.
+
+       Params:
+       text: text - The the document(news article) to be marked.
 
-    tokens = TweetTokenizer().tokenize(text)
+       Returns:
+       marked_tokens: generator - (token, negated) pairs, negated being True for the tokens tagged for negation.
+       """
 
     #A boolean tag that is set to True whenever negation marking should be applied based on the rules described
     punct = False
@@ -34,71 +49,124 @@ def _neg_marking(text):
     #A variable tracking the word count as negation is applied only on words preceded within 3 words by a negation term
     count=0
 
-
-    for index, word in enumerate(tokens):
+    for word in _tokenizer.tokenize(text):
         # if a negation term is encountered set the boolean flag to True
-        if word in vader.NEGATE and not punct and count<3:
+        if word in NEGATION_TERMS and not punct and count<3:
             punct=True
+            yield word, False
             continue
         # Tag all words that are not negation terms themselves and increment count
-        if punct and word not in vader.NEGATE:
+        negated = punct and word not in NEGATION_TERMS
+        if negated:
             count+=1
-            tokens[index]=tokens[index]+"_NEG"
+        yield word, negated
         # When reaching the described punctuation or exceeding the window of 3 words set the flag back to False and reset the count
         if word ==',' or word =='.' or count==3:
             punct=False
             count=0
 
-    return tokens
+
+def _neg_marking(text):
+    """A function that receives a document(news article) as a parameter and applies negation marking. Words preceded by a negation term
+       are marked with a _NEG tag. Negation terms are extracted from the Vader library. Based on literature the following rules are applied:
+       - A word is tagged with a _NEG tag if it is preceded within 3 words by a negation term and no punctuation separates them.
+       - Following a comma or a full stop, negation tagging is terminated.
+       Before marking, the text is tokenized using TweetTokenizer as after attempting numerous others tokenizers, TweetTokenizer
+       seemed to perform best at detecting punctuation and generating sensible tokens.
+
+       Params:
+       text: text - The the document(news article) to be marked.
+
+       Returns:
+       neg_marked_tokens: list - A list of all tokens tokenized by TweetTokenizer marked for negation.
+
+       """
+    return [word+"_NEG" if negated else word for word, negated in _iter_neg_marking(text)]
+
+
+def _score_marked_tokens(marked_tokens, lexicon_map):
+    """A function that looks up (token, negated) pairs in the compiled lexicon(see get_sentiment_scores).
+
+       Params:
+       marked_tokens: iterable - (token, negated) pairs, e.g. as yielded by _iter_neg_marking.
+       lexicon_map: Mapping - the lexicon compiled by _compile_lexicon.
+
+       Returns:
+       words: list - The words that were present in the lexicon, negated words being prefixed with 'not'.
+       sentiment: list - The corresponding sentiment for each word in words.
+       """
+    words = []
+    sentiment = []
+
+    for token, negated in marked_tokens:
+        word = token.lower()
+        # Only the words present in the lexicon are considered
+        if word not in lexicon_map:
+            continue
+
+        # If the word is tagged for negation, prefix it with 'not'. The dataframe lookup this replaced compared the boolean returned by
+        # lexicon_df.query(...).sentiment.all() with 'positive', hence every negated word was tagged positive. The tag is kept so that
+        # the polarity words match the ones already stored in the database.
+        if negated:
+            sentiment.append('positive')
+            words.append('not ' + word)
+        else:
+            sentiment.append(lexicon_map[word])
+            words.append(word)
+
+    return words,sentiment
 
 
 def get_sentiment_scores(tokens,lexicon_df):
     """A function that looks up which words from the words processed by _neg_marking are present in the
-       lexicon dataframe and retrieves their sentiment tag. Based on literature, Loughran & McDonald (2011)
-       and Hu & Liu (2004) were the sentiment lexicons selected.
+       lexicon and retrieves their sentiment tag. Based on literature, Loughran & McDonald (2011)
+       and Hu & Liu (2004) were the sentiment lexicons selected. The tokens are processed in a single pass,
+       with each word looked up in the compiled lexicon(see _compile_lexicon).
 
        Params:
        tokens: list - The list of tokens marked for negation by _neg_marking.
-       lexicon_df: pandas.Dataframe - the dataframe containing the two lexicons (details on generating the csv file are
-                                                                                can be found in the 'Sentiment Lexicon Generation' notebook).
+       lexicon_df: pandas.Dataframe or Mapping - the dataframe containing the two lexicons (details on generating the csv file are
+                                                                                can be found in the 'Sentiment Lexicon Generation' notebook),
+                                                 or the lexicon already compiled by _compile_lexicon.
 
        Returns:
-       words: list - The words that were present in the lexicon dataframe. Words tagged for negation have the _NEG tag
+       words: list - The words that were present in the lexicon. Words tagged for negation have the _NEG tag
                      removed and replaced by 'not' before the word. E.g, token 'great_NEG' becomes 'not great'.
-       sentiment: list - The corresponding sentiment for each word in words.
+       sentiment: list - The corresponding sentiment for each word in words. Words tagged for negation are tagged positive.
 
        """
+    if isinstance(lexicon_df, Mapping):
+        lexicon_map = lexicon_df
+    else:
+        lexicon_map = _compile_lexicon(lexicon_df)
 
-    # Generate a list of all words from tokens that are present in the lexicon dataframe
-    words = [word.lower() for word in tokens if word.split("_NEG")[0].lower() in list(lexicon_df.word)]
-    sentiment = []
+    # Split the _NEG tag from each token
+    marked_tokens = ((token.split("_NEG")[0], "_NEG" in token) for token in tokens)
+    return _score_marked_tokens(marked_tokens, lexicon_map)
 
-    # Get the sentiment for each word in words
-    for index, word in enumerate(words):
-        # If the word has a _NEG tag, invert its sentiment
-        if '_neg' in word:
-            if lexicon_df.query('@word.split("_neg")[0] in word').sentiment.all() == 'positive':
-                sentiment.append('negative')
-            else:
-                sentiment.append('positive')
-        else:
-            sentiment.append(lexicon_df.query('@word in word').sentiment.values[0])
+def get_polarity_words(text):
+    """A function that retrieves all polarity words with negation being considered from a given news article"""
+    return _score_marked_tokens(_iter_neg_marking(text),lexicon_index)
 
-    # Replace the _NEG tags in words with 'not'
-    words = ['not ' + word.split("_neg")[0] if "_neg" in word else word for word in words]
 
+def get_polarity_words_batch(texts):
+    """A function that retrieves the polarity words of many news articles in one call(see get_polarity_words).
 
-    return words,sentiment
+       Params:
+       texts: iterable - the document texts(news articles)
 
-def get_polarity_words(text):
-    """A function that retrieves all polarity words with negation being considered from a given news article"""
-    return get_sentiment_scores(_neg_marking(text),lexicon)
+       Returns:
+       polarity_words: list - A (words, sentiment) tuple for each article in the order of texts.
+       """
+    return [_score_marked_tokens(_iter_neg_marking(text),lexicon_index) for text in texts]
 
 if __name__ =='__main__':
-    text = requests.get('https://finance.yahoo.com/news/5-tesla-surmounts-supply-chain-153950361.html').text
+    from utilities import http_cache, http_fetcher
+
+    # The article is only downloaded on the first run
+    http_cache.configure()
+    text = http_fetcher.get_fetcher().get('https://finance.yahoo.com/news/5-tesla-surmounts-supply-chain-153950361.html').text
     parsed = fulltext(text)
-    tokens = _neg_marking(parsed)
-    words = [word.lower() for word in tokens if word.split("_NEG")[0].lower() in list(lexicon.word)]
+    words, sentiment = get_polarity_words(parsed)
     print(words)
-    sentiment=[]
-    print(lexicon.query('@words[1] in word').sentiment.values[0])
\ No newline at end of file
+    print(sentiment)
\ No newline at end of file
@@ -1,20 +1,12 @@
 import numpy as np
-import torch
-from transformers import BertTokenizer, BertForSequenceClassification
 from scipy.special import softmax
-from utilities import key_phrases
-import os
+from utilities import key_phrases, encoder
 
 #BERT is limited to a 512 tokens input. A balance between being able to tokenize longer sequences and computational cost was struck at 300.
-MAX_TOKENS_LENGTH=300
-
-# The below will allow the script to be ran from different working directories
-dir = os.path.dirname(__file__)
-path=os.path.join(dir, 'BertModel')
-
-model = BertForSequenceClassification.from_pretrained(path)
-bert_tokenizer = BertTokenizer.from_pretrained('bert-base-cased')
+MAX_TOKENS_LENGTH=encoder.MAX_TOKENS_LENGTH
 
+# The sentiment classes in the order of the model output
+CLASSES=['negative','neutral','positive']
 
 
 def _split_input(text):
@@ -43,47 +35,52 @@ def get_sentiment(text):
         class_probabilities: list -A list of the probabilities for each class obtained by _get_class_probabilities
         """
 
-    classes=['negative','neutral','positive']
-
     #Split the document in topical paragraphs
     paragraphs = _split_input(text)
 
-    #Get all the encodings to be fed to the model
-    encodings =bert_tokenizer.batch_encode_plus(paragraphs,add_special_tokens=True,padding='max_length',max_length=300,
-                                                return_attention_mask=True,return_tensors='pt')
+    #Get the model output logits for each paragraph
+    logits, _ = encoder.encode_paragraphs(paragraphs)
 
-    #Get the model output. torch.no_grad() is used as there is not need to calculcate gradients which is otherwise automatically done by pytorch
-    with torch.no_grad():
-        output= model(encodings['input_ids'],encodings['attention_mask'])
+    return _get_prediction(logits)
+
+
+def _get_prediction(output_logits):
+    """A function that turns the output logits of the paragraphs of a document into the overall prediction and class probabilities
+       of the document. It is shared by get_sentiment and article_analysis.analyse_article.
+
+       Params:
+       output_logits: np.ndarray of shape (n,3) - the output logits for each paragraph
+
+       Returns:
+       overall_prediction: str - The class that has the overall highest probability for the article(on the ternary scale of negative/neutral/positive)
+       class_probabilities: list -A list of the probabilities for each class obtained by _get_class_probabilities
+       """
 
     #Get the probabilities for each class of the entire document
-    class_probabilities = _get_class_probabilities(output)
+    class_probabilities = _get_class_probabilities(output_logits)
 
     #Get the overall prediction for the document based on the index of the maximum probability obtained from np.argmax
-    overall_prediction = classes[np.argmax(class_probabilities)]
+    overall_prediction = CLASSES[np.argmax(class_probabilities)]
 
     return overall_prediction,class_probabilities
 
 
-def _get_class_probabilities(model_output):
+def _get_class_probabilities(output_logits):
     """A function that get the probabilities for each class of a document by averaging the probabilities for each paragraphs.
        First, the paragraph probabilities are obtained using a softmax function before averaging them to arrive at the final probabilities.
        Due to observations about the model's performance and the semantic structure of news articles, neutral probabilities are reduced
        by 50% to avoid misclassifications.
 
        Params:
-       model_output: transformers.modeling_outputs.SequenceClassifierOutput - the output of the BERT model
+       output_logits: np.ndarray of shape (n,3) - the output logits of the BERT model(output of the fully connected linear layer) for each paragraph
 
        Returns:
        class_probabilities: list - a list of len=3 where indexes 0,1,2 correspond to classes negative, neutral, and positive respectively
 
        """
 
-    #Get the model output logits(output of the fully connected linear layer)
-    output_logits = model_output[0]
-
     #Get the probabilities for each class of each paragraphs
-    paragraph_probabilities = softmax(output_logits.numpy(),axis=1)
+    paragraph_probabilities = softmax(output_logits,axis=1)
     paragraph_probabilities[:, 1] = paragraph_probabilities[:, 1] / 2
 
     #Get the average probability for each class of the entire document by summing each paragraph probability and dividing by the number of paragraphs